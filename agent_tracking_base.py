@@ -4,11 +4,15 @@ Langfuse 追踪基类
 """
 
 import os
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from functools import wraps
-from typing import Any, Dict, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable
 from datetime import datetime
 from langfuse import Langfuse
-from langfuse.decorators import observe
+from langfuse.decorators import langfuse_context, observe
 
 
 # ============= Langfuse 配置 =============
@@ -37,6 +41,67 @@ class LangfuseConfig:
         )
 
 
+# ============= 追踪上下文 =============
+@dataclass
+class SpanContext:
+    """当前动作的追踪上下文（W3C trace-context 格式的 ID）"""
+    trace_id: str                       # 32 位十六进制
+    span_id: str                        # 16 位十六进制
+    name: str
+    parent_span_id: Optional[str] = None
+    langfuse_trace_id: Optional[str] = None
+    langfuse_observation_id: Optional[str] = None
+    children: List[Dict[str, Any]] = field(default_factory=list)  # 子操作（如出站 HTTP 请求）的计时
+    
+    def add_child(self, child: Dict[str, Any]):
+        """记录一个子操作，动作结束时作为子 span 上报"""
+        self.children.append(child)
+
+
+CURRENT_SPAN: ContextVar[Optional[SpanContext]] = ContextVar("current_agent_span", default=None)
+
+
+def current_span() -> Optional[SpanContext]:
+    """获取当前动作的追踪上下文"""
+    return CURRENT_SPAN.get()
+
+
+# 动作结束时的回调（如指标导出），参数: (agent_type, action, 耗时秒数, 是否成功)
+ACTION_LISTENERS: List[Callable[[str, str, float, bool], None]] = []
+
+
+def _notify_action_listeners(agent: Any, action: str, duration: float, success: bool):
+    agent_type = getattr(agent, 'agent_type', agent.__class__.__name__)
+    for listener in ACTION_LISTENERS:
+        try:
+            listener(agent_type, action, duration, success)
+        except Exception:
+            # 回调失败不影响动作本身
+            pass
+
+
+def _report_child_spans(client: Optional[Langfuse], span: SpanContext):
+    """把子操作计时作为当前 observation 的子 span 上报到 Langfuse"""
+    if not client or not span.children or not span.langfuse_trace_id:
+        return
+    
+    try:
+        for child in span.children:
+            client.span(
+                # 与出站请求 traceparent 中的 span-id 一致
+                id=child.get("span_id"),
+                trace_id=span.langfuse_trace_id,
+                parent_observation_id=span.langfuse_observation_id,
+                name=child.get("name", "child"),
+                start_time=child.get("start_time"),
+                end_time=child.get("end_time"),
+                metadata=child
+            )
+    except Exception:
+        # 静默处理追踪错误
+        pass
+
+
 # ============= 追踪装饰器 =============
 def track_agent_action(action_name: Optional[str] = None):
     """
@@ -50,22 +115,54 @@ def track_agent_action(action_name: Optional[str] = None):
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            # 如果 Langfuse 未启用，直接执行原函数
-            if not LangfuseConfig.is_enabled():
-                return func(self, *args, **kwargs)
-            
-            # 获取 agent 信息
-            agent_name = getattr(self, 'agent_name', self.__class__.__name__)
-            agent_id = getattr(self, 'agent_id', 'unknown')
-            
-            # 使用 Langfuse observe 装饰器
+            # 建立追踪上下文（未启用 Langfuse 时也会生成，供出站请求传播）
             name = action_name or func.__name__
+            parent = CURRENT_SPAN.get()
+            span = SpanContext(
+                trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+                span_id=os.urandom(8).hex(),
+                name=name,
+                parent_span_id=parent.span_id if parent else None
+            )
+            token = CURRENT_SPAN.set(span)
+            started = time.perf_counter()
+            success = False
             
-            @observe(name=f"{agent_name}.{name}")
-            def traced_func():
-                return func(self, *args, **kwargs)
-            
-            return traced_func()
+            try:
+                # 如果 Langfuse 未启用，直接执行原函数
+                if not LangfuseConfig.is_enabled():
+                    result = func(self, *args, **kwargs)
+                    success = True
+                    return result
+                
+                # 获取 agent 信息
+                agent_name = getattr(self, 'agent_name', self.__class__.__name__)
+                agent_id = getattr(self, 'agent_id', 'unknown')
+                
+                # 使用 Langfuse observe 装饰器
+                @observe(name=f"{agent_name}.{name}")
+                def traced_func():
+                    # 与 Langfuse 的 trace / observation ID 对齐，上游日志可直接关联
+                    trace_id = langfuse_context.get_current_trace_id()
+                    observation_id = langfuse_context.get_current_observation_id()
+                    if trace_id:
+                        span.langfuse_trace_id = trace_id
+                        span.trace_id = trace_id.replace("-", "")[:32].rjust(32, "0")
+                    if observation_id:
+                        span.langfuse_observation_id = observation_id
+                        span.span_id = observation_id.replace("-", "")[:16].rjust(16, "0")
+                    try:
+                        return func(self, *args, **kwargs)
+                    finally:
+                        _report_child_spans(getattr(self, 'langfuse_client', None), span)
+                
+                result = traced_func()
+                success = True
+                return result
+            finally:
+                CURRENT_SPAN.reset(token)
+                if ACTION_LISTENERS:
+                    _notify_action_listeners(self, name, time.perf_counter() - started, success)
         
         return wrapper
     return decorator
@@ -0,0 +1,494 @@
+"""
+流式告警引擎
+声明式规则（阈值、变化率、错误预算消耗速率、数据缺失）在每个新指标点到达时增量求值；
+带滞回与去重，告警由单独的分发线程送往可插拔的本地 sink
+"""
+
+import json
+import logging
+import operator
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+class RuleKind(Enum):
+    THRESHOLD = "threshold"            # 当前值越过阈值
+    RATE_OF_CHANGE = "rate_of_change"  # 窗口内相对变化 (当前值 - 窗口首值) / |窗口首值|
+    BURN_RATE = "burn_rate"            # 窗口内平均错误率 / 错误预算 (1 - slo_target)
+    ABSENCE = "absence"                # 超过窗口时长没有新数据
+
+
+class AlertState(Enum):
+    PENDING = "pending"
+    FIRING = "firing"
+    RESOLVED = "resolved"
+
+
+_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# 滞回：恢复条件取反方向的比较
+_CLEAR_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.le,
+    ">=": operator.lt,
+    "<": operator.ge,
+    "<=": operator.gt,
+}
+
+ANY_SYSTEM = "*"
+
+
+# ============= 规则与告警 =============
+@dataclass(frozen=True)
+class AlertRule:
+    """
+    告警规则
+
+    Args:
+        name: 规则名（同一系统内唯一，用作去重键）
+        metric: 指标列名（response_time_ms, error_rate, throughput, cpu_usage, memory_usage）
+        kind: 规则类型
+        threshold: 触发阈值（ABSENCE 规则为静默秒数）
+        op: 比较方向
+        clear_threshold: 恢复阈值；None 时与 threshold 相同（无滞回）
+        system: 适用的系统，"*" 表示所有系统
+        window_seconds: RATE_OF_CHANGE / BURN_RATE 的计算窗口；ABSENCE 未设阈值时的静默时长
+        for_seconds: 条件需持续满足多久才进入 FIRING
+        slo_target: BURN_RATE 规则的可用性目标（如 0.999）
+        repeat_seconds: FIRING 期间重复通知的间隔；None 表示只通知一次
+    """
+    name: str
+    metric: str
+    kind: RuleKind = RuleKind.THRESHOLD
+    threshold: float = 0.0
+    op: str = ">"
+    clear_threshold: Optional[float] = None
+    system: str = ANY_SYSTEM
+    window_seconds: float = 300.0
+    for_seconds: float = 0.0
+    slo_target: float = 0.999
+    severity: str = "warning"
+    repeat_seconds: Optional[float] = None
+    labels: Tuple[Tuple[str, str], ...] = ()
+
+    def __post_init__(self):
+        if self.op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {self.op}")
+        if self.kind is RuleKind.BURN_RATE and not 0 < self.slo_target < 1:
+            raise ValueError("slo_target must be in (0, 1)")
+        if self.kind is RuleKind.ABSENCE and not self.threshold:
+            # 数据缺失规则的观测值是静默时长，默认超过窗口时长即触发
+            object.__setattr__(self, "threshold", self.window_seconds)
+
+
+@dataclass
+class Alert:
+    """一次告警通知"""
+    rule: str
+    system: str
+    metric: str
+    state: AlertState
+    severity: str
+    value: Optional[float]
+    threshold: float
+    started_at: float                # 进入 PENDING 的指标时间
+    timestamp: float                 # 本次状态变化的指标时间
+    message: str
+    latency_ms: Optional[float] = None  # 从指标点到达到 sink 收到
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rule": self.rule,
+            "system": self.system,
+            "metric": self.metric,
+            "state": self.state.value,
+            "severity": self.severity,
+            "value": self.value,
+            "threshold": self.threshold,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "message": self.message,
+            "latency_ms": self.latency_ms,
+            "labels": self.labels
+        }
+
+
+# ============= Sink =============
+class AlertSink:
+    """告警接收方；send 在分发线程中调用"""
+
+    def send(self, alert: Alert):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LoggingSink(AlertSink):
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger("alerts")
+
+    def send(self, alert: Alert):
+        level = logging.INFO if alert.state is AlertState.RESOLVED else logging.WARNING
+        self.logger.log(level, f"[{alert.state.value}] {alert.system}/{alert.rule}: {alert.message}")
+
+
+class JsonlSink(AlertSink):
+    """追加写入 JSONL 文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, alert: Alert):
+        self._file.write(json.dumps(alert.to_dict(), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CallbackSink(AlertSink):
+    def __init__(self, callback: Callable[[Alert], None]):
+        self.callback = callback
+
+    def send(self, alert: Alert):
+        self.callback(alert)
+
+
+# ============= 增量状态 =============
+class _SeriesWindow:
+    """单个 (系统, 指标) 在固定时长内的点，维护滚动和"""
+
+    __slots__ = ("seconds", "points", "total")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.points: Deque[Tuple[float, float]] = deque()
+        self.total = 0.0
+
+    def add(self, timestamp: float, value: float):
+        self.points.append((timestamp, value))
+        self.total += value
+        cutoff = timestamp - self.seconds
+        points = self.points
+        while points and points[0][0] < cutoff:
+            self.total -= points.popleft()[1]
+
+    def mean(self) -> float:
+        return self.total / len(self.points)
+
+    def first(self) -> float:
+        return self.points[0][1]
+
+
+@dataclass
+class _RuleState:
+    state: Optional[AlertState] = None  # None 表示未激活
+    started_at: float = 0.0
+    notified_at: float = 0.0
+
+
+class AlertEngine:
+    """
+    告警引擎
+
+    使用方法:
+    engine = AlertEngine(rules=DEFAULT_ALERT_RULES, sinks=[LoggingSink()])
+    engine.observe_metrics(metrics)   # 每个新的 PerformanceMetrics
+    engine.start()                    # 后台检查数据缺失规则
+
+    规则按 (系统, 指标) 建索引，每个点只求值与之相关的规则；
+    通知只在状态变化时产生（去重），送入队列后由分发线程调用 sink，不阻塞求值
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[AlertRule] = (),
+        sinks: Iterable[AlertSink] = (),
+        absence_check_interval: float = 10.0
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.absence_check_interval = absence_check_interval
+        self.sinks: List[AlertSink] = list(sinks)
+
+        self._rules: Dict[str, List[AlertRule]] = {}
+        self._index: Dict[Tuple[str, str], List[AlertRule]] = {}
+        self._absence_rules: List[AlertRule] = []
+        self._windows: Dict[Tuple[str, str, float], _SeriesWindow] = {}
+        self._states: Dict[Tuple[str, str], _RuleState] = {}
+        self._last_seen: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._dispatcher_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._absence_thread: Optional[threading.Thread] = None
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+        for rule in rules:
+            self.add_rule(rule)
+
+    # ----- 规则管理 -----
+    def add_rule(self, rule: AlertRule):
+        with self._lock:
+            self._remove_locked(rule.name, rule.system)
+            self._rules.setdefault(rule.name, []).append(rule)
+            if rule.kind is RuleKind.ABSENCE:
+                self._absence_rules.append(rule)
+            else:
+                self._index.setdefault((rule.system, rule.metric), []).append(rule)
+
+    def remove_rule(self, name: str, system: Optional[str] = None):
+        with self._lock:
+            self._remove_locked(name, system)
+
+    def _remove_locked(self, name: str, system: Optional[str]):
+        for rule in list(self._rules.get(name, ())):
+            if system is not None and rule.system != system:
+                continue
+            self._rules[name].remove(rule)
+            if rule.kind is RuleKind.ABSENCE:
+                self._absence_rules.remove(rule)
+            else:
+                self._index[(rule.system, rule.metric)].remove(rule)
+        if not self._rules.get(name):
+            self._rules.pop(name, None)
+
+    def rules(self) -> List[AlertRule]:
+        with self._lock:
+            return [rule for rules in self._rules.values() for rule in rules]
+
+    # ----- 求值 -----
+    def observe(self, system: str, metric: str, timestamp: float, value: Optional[float], arrived: Optional[float] = None):
+        """处理一个新指标点"""
+        if value is None or value != value:
+            return
+        arrived = arrived if arrived is not None else time.perf_counter()
+        with self._lock:
+            self._last_seen[(system, metric)] = timestamp
+            rules = self._index.get((system, metric), []) + self._index.get((ANY_SYSTEM, metric), [])
+            if not rules:
+                return
+
+            # 同一 (系统, 指标, 窗口) 的窗口在多条规则间共享，每个点只更新一次
+            windows: Dict[float, _SeriesWindow] = {}
+            for rule in rules:
+                if rule.kind is RuleKind.THRESHOLD or rule.window_seconds in windows:
+                    continue
+                key = (system, metric, rule.window_seconds)
+                window = self._windows.get(key)
+                if window is None:
+                    window = self._windows[key] = _SeriesWindow(rule.window_seconds)
+                window.add(timestamp, value)
+                windows[rule.window_seconds] = window
+
+            for rule in rules:
+                observed = self._observed_value(rule, value, windows.get(rule.window_seconds))
+                if observed is not None:
+                    self._transition(rule, system, timestamp, observed, arrived)
+
+    def observe_metrics(self, metrics: Any):
+        """处理一条 PerformanceMetrics 的所有指标列"""
+        arrived = time.perf_counter()
+        timestamp = metrics.timestamp.timestamp()
+        for metric in ("response_time_ms", "error_rate", "throughput", "cpu_usage", "memory_usage"):
+            self.observe(metrics.system, metric, timestamp, getattr(metrics, metric), arrived)
+
+    @staticmethod
+    def _observed_value(rule: AlertRule, value: float, window: Optional[_SeriesWindow]) -> Optional[float]:
+        if rule.kind is RuleKind.THRESHOLD:
+            return value
+        if rule.kind is RuleKind.RATE_OF_CHANGE:
+            first = window.first()
+            if len(window.points) < 2 or first == 0:
+                return None
+            return (value - first) / abs(first)
+        if rule.kind is RuleKind.BURN_RATE:
+            return window.mean() / (1.0 - rule.slo_target)
+        return None
+
+    def _transition(self, rule: AlertRule, system: str, timestamp: float, observed: float, arrived: float):
+        key = (rule.name, system)
+        state = self._states.get(key)
+        breached = _OPERATORS[rule.op](observed, rule.threshold)
+        clear_threshold = rule.threshold if rule.clear_threshold is None else rule.clear_threshold
+        cleared = _CLEAR_OPERATORS[rule.op](observed, clear_threshold)
+
+        if state is None or state.state is None:
+            if not breached:
+                return
+            state = self._states[key] = _RuleState(state=AlertState.PENDING, started_at=timestamp)
+
+        if state.state is AlertState.PENDING:
+            if cleared:
+                state.state = None
+            elif timestamp - state.started_at >= rule.for_seconds:
+                state.state = AlertState.FIRING
+                state.notified_at = timestamp
+                self._emit(rule, system, AlertState.FIRING, observed, state, timestamp, arrived)
+            return
+
+        # FIRING：恢复条件满足才解除，处于阈值与恢复阈值之间时保持
+        if cleared:
+            self._emit(rule, system, AlertState.RESOLVED, observed, state, timestamp, arrived)
+            state.state = None
+        elif rule.repeat_seconds is not None and timestamp - state.notified_at >= rule.repeat_seconds:
+            state.notified_at = timestamp
+            self._emit(rule, system, AlertState.FIRING, observed, state, timestamp, arrived)
+
+    def check_absence(self, now: Optional[float] = None):
+        """检查数据缺失规则；后台线程定期调用，也可手动调用"""
+        now = now if now is not None else time.time()
+        arrived = time.perf_counter()
+        with self._lock:
+            for rule in self._absence_rules:
+                if rule.system == ANY_SYSTEM:
+                    systems = [system for system, metric in self._last_seen if metric == rule.metric]
+                else:
+                    systems = [rule.system]
+                for system in systems:
+                    last_seen = self._last_seen.get((system, rule.metric), self._started_at)
+                    self._transition(rule, system, now, now - last_seen, arrived)
+
+    def _emit(
+        self,
+        rule: AlertRule,
+        system: str,
+        alert_state: AlertState,
+        observed: float,
+        state: _RuleState,
+        timestamp: float,
+        arrived: float
+    ):
+        if alert_state is AlertState.RESOLVED:
+            message = f"{rule.metric} 已恢复 ({observed:.4g})"
+        elif rule.kind is RuleKind.ABSENCE:
+            message = f"{rule.metric} 已 {observed:.0f}s 没有数据"
+        else:
+            message = f"{rule.kind.value} {rule.metric} = {observed:.4g} {rule.op} {rule.threshold:.4g}"
+        alert = Alert(
+            rule=rule.name,
+            system=system,
+            metric=rule.metric,
+            state=alert_state,
+            severity=rule.severity,
+            value=observed,
+            threshold=rule.threshold,
+            started_at=state.started_at,
+            timestamp=timestamp,
+            message=message,
+            labels=dict(rule.labels)
+        )
+        self._ensure_dispatcher()
+        self._queue.put((alert, arrived))
+
+    # ----- 分发 -----
+    def _ensure_dispatcher(self):
+        if self._dispatcher is not None:
+            return
+        with self._dispatcher_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="alert-dispatcher", daemon=True)
+                self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            alert, arrived = item
+            alert.latency_ms = (time.perf_counter() - arrived) * 1000
+            self._latencies.append(alert.latency_ms)
+            for sink in self.sinks:
+                try:
+                    sink.send(alert)
+                except Exception as e:
+                    self.logger.error(f"Alert sink {type(sink).__name__} failed: {e}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已产生的告警全部送达 sink"""
+        if self._dispatcher is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # ----- 查询 -----
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"rule": name, "system": system, "state": state.state.value, "started_at": state.started_at}
+                for (name, system), state in self._states.items()
+                if state.state is not None
+            ]
+
+    def latency_stats(self) -> Dict[str, Optional[float]]:
+        """最近告警从指标点到达到送达 sink 的延迟（毫秒）"""
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return {"count": 0, "p50": None, "p99": None, "max": None}
+        return {
+            "count": len(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            "max": latencies[-1]
+        }
+
+    # ----- 生命周期 -----
+    def start(self):
+        """启动后台数据缺失检查（重复调用无副作用）"""
+        def run():
+            while not self._stop_event.wait(self.absence_check_interval):
+                try:
+                    self.check_absence()
+                except Exception as e:
+                    self.logger.error(f"Absence check failed: {e}")
+
+        with self._dispatcher_lock:
+            if self._absence_thread is not None:
+                return
+            self._absence_thread = threading.Thread(target=run, name="alert-absence-check", daemon=True)
+            self._absence_thread.start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._absence_thread is not None:
+            self._absence_thread.join()
+            self._absence_thread = None
+        if self._dispatcher is not None:
+            self._queue.put(None)
+            self._dispatcher.join()
+            self._dispatcher = None
+        for sink in self.sinks:
+            sink.close()
+
+
+# 与健康报告阈值一致的默认规则
+DEFAULT_ALERT_RULES = [
+    AlertRule("response_time_critical", "response_time_ms", threshold=1000, clear_threshold=800, severity="critical"),
+    AlertRule("response_time_slow", "response_time_ms", threshold=500, clear_threshold=400, for_seconds=300),
+    AlertRule("error_rate_critical", "error_rate", threshold=0.05, clear_threshold=0.03, severity="critical"),
+    AlertRule("error_budget_burn", "error_rate", kind=RuleKind.BURN_RATE, threshold=14.4, clear_threshold=10,
+              window_seconds=3600, slo_target=0.999, severity="critical"),
+    AlertRule("cpu_high", "cpu_usage", threshold=80, clear_threshold=70, for_seconds=300),
+    AlertRule("memory_high", "memory_usage", threshold=85, clear_threshold=75, for_seconds=300),
+    AlertRule("throughput_drop", "throughput", kind=RuleKind.RATE_OF_CHANGE, threshold=-0.5, op="<",
+              clear_threshold=-0.2, window_seconds=900),
+]
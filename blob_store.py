@@ -0,0 +1,57 @@
+"""
+内容寻址 blob 存储
+按内容的 SHA-256 存放大响应体，相同内容只写一次；日志中只保留哈希
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from typing import Optional, Set
+
+
+class BlobStore:
+    """
+    磁盘上的内容寻址存储
+    
+    布局: <root>/<hash[:2]>/<hash>.gz
+    """
+    
+    def __init__(self, root: str, compress: bool = True):
+        self.root = root
+        self.compress = compress
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+    
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + (".gz" if self.compress else ""))
+    
+    def put(self, data: bytes) -> str:
+        """写入内容并返回其哈希；已存在的内容不会重复写入"""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._known:
+            return digest
+        
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=5) if self.compress else data)
+            os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._known.add(digest)
+        return digest
+    
+    def get(self, digest: str) -> Optional[bytes]:
+        """按哈希读取内容，不存在时返回 None"""
+        path = self.path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        return gzip.decompress(data) if self.compress else data
+    
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._known or os.path.exists(self.path(digest))
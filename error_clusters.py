@@ -0,0 +1,342 @@
+"""
+错误日志增量同步与聚类
+按游标只拉取新的错误 observation（自动翻页），按归一化消息与调用栈形状生成指纹，
+本地保存每类错误的计数与首末次出现时间
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import requests
+
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SYNC_INTERVAL_SECONDS = 30.0
+
+# 每个级别分别同步；get_error_logs 的 severity 映射到 Langfuse 的 level
+SYNC_LEVELS = ("ERROR", "WARNING")
+SEVERITY_LEVELS = {"critical": "ERROR", "error": "ERROR", "warning": "WARNING"}
+
+_MAX_STACK_FRAMES = 12
+_SEEN_IDS_LIMIT = 10000
+_SAMPLE_TEXT_LIMIT = 2000
+
+
+# ============= 指纹 =============
+_NORMALIZERS = [
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<uuid>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"(?:/[\w.\-]+){2,}"), "<path>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.I), "<hex>"),
+    (re.compile(r"\b[0-9a-f]{16,}\b", re.I), "<hex>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "<num>"),
+    (re.compile(r"\s+"), " "),
+]
+
+# Python: File "x.py", line 12, in func    JS/Java: at func (file.js:12:3) / at pkg.Class.method(File.java:12)
+_PY_FRAME = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+_AT_FRAME = re.compile(r"^\s*at\s+([\w.$<>\[\]]+)\s*\(?([^():\s]*)", re.M)
+
+
+def normalize_message(message: str) -> str:
+    """去掉消息中随实例变化的部分（ID、数字、路径、引号内容等）"""
+    text = message.strip()
+    for pattern, replacement in _NORMALIZERS:
+        text = pattern.sub(replacement, text)
+    return text[:500]
+
+
+def stack_shape(stack: Optional[str]) -> str:
+    """调用栈形状：只保留 (文件名, 函数) 序列，忽略行号"""
+    if not stack:
+        return ""
+    frames = [f"{os.path.basename(path)}:{func}" for path, func in _PY_FRAME.findall(stack)]
+    if not frames:
+        frames = [f"{os.path.basename(path)}:{func}" for func, path in _AT_FRAME.findall(stack)]
+    return ">".join(frames[-_MAX_STACK_FRAMES:])
+
+
+def fingerprint(message: str, stack: Optional[str] = None) -> str:
+    key = f"{normalize_message(message)}|{stack_shape(stack)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def extract_error(observation: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """从 observation 中取出错误消息与调用栈"""
+    metadata = observation.get("metadata") or {}
+    output = observation.get("output")
+    status_message = observation.get("statusMessage") or ""
+
+    stack = None
+    if isinstance(metadata, dict):
+        stack = metadata.get("stack") or metadata.get("traceback")
+    if not stack and isinstance(output, dict):
+        stack = output.get("stack") or output.get("traceback")
+    if not stack and "Traceback (most recent call last)" in status_message:
+        stack = status_message
+
+    message = status_message
+    if stack and message == stack:
+        # 完整 traceback 的最后一行才是异常消息
+        message = stack.strip().splitlines()[-1]
+    if not message and isinstance(output, dict):
+        message = str(output.get("error") or output.get("message") or "")
+    return {"message": message or observation.get("name") or "unknown error", "stack": stack}
+
+
+# ============= 聚类索引 =============
+@dataclass
+class ErrorCluster:
+    """一类错误（相同指纹）"""
+    fingerprint: str
+    system: str
+    level: str
+    message: str                 # 归一化后的消息
+    count: int = 0
+    first_seen: str = ""         # ISO 时间（observation 的 startTime）
+    last_seen: str = ""
+    sample: Dict[str, Any] = field(default_factory=dict)  # 最近一次出现的精简记录
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "system": self.system,
+            "level": self.level,
+            "message": self.message,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "sample": self.sample
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ErrorCluster":
+        return cls(**data)
+
+
+class ErrorClusterIndex:
+    """
+    本地错误聚类索引
+
+    observation 按 id 去重（保留最近的若干 id），同步游标与聚类一起持久化
+    """
+
+    def __init__(self):
+        self.clusters: Dict[str, ErrorCluster] = {}
+        self.cursors: Dict[str, Dict[str, Any]] = {}  # level -> {"start_time", "ids"}
+        self._seen: Set[str] = set()
+        self._seen_order: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def add(self, system: str, observation: Dict[str, Any]) -> bool:
+        """加入一条 observation；重复的返回 False"""
+        observation_id = observation.get("id")
+        with self._lock:
+            if observation_id:
+                if observation_id in self._seen:
+                    return False
+                self._remember(observation_id)
+
+            error = extract_error(observation)
+            level = (observation.get("level") or "ERROR").upper()
+            key = fingerprint(error["message"], error["stack"])
+            started = observation.get("startTime") or ""
+
+            cluster = self.clusters.get(key)
+            if cluster is None:
+                cluster = self.clusters[key] = ErrorCluster(
+                    fingerprint=key,
+                    system=system,
+                    level=level,
+                    message=normalize_message(error["message"]),
+                    first_seen=started,
+                    last_seen=started
+                )
+            cluster.count += 1
+            # ISO 8601 同一时区下字符串比较即时间比较
+            if started and (not cluster.first_seen or started < cluster.first_seen):
+                cluster.first_seen = started
+            if started >= cluster.last_seen:
+                cluster.last_seen = started
+                cluster.sample = {
+                    "id": observation_id,
+                    "trace_id": observation.get("traceId"),
+                    "name": observation.get("name"),
+                    "start_time": started,
+                    "message": error["message"][:_SAMPLE_TEXT_LIMIT],
+                    "stack": error["stack"][:_SAMPLE_TEXT_LIMIT] if error["stack"] else None
+                }
+            self._dirty = True
+            return True
+
+    def _remember(self, observation_id: str):
+        self._seen.add(observation_id)
+        self._seen_order.append(observation_id)
+        if len(self._seen_order) > _SEEN_IDS_LIMIT:
+            self._seen.discard(self._seen_order.popleft())
+
+    def query(
+        self,
+        system: Optional[str] = None,
+        level: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """按最近出现时间倒序返回聚类"""
+        with self._lock:
+            clusters = [
+                cluster for cluster in self.clusters.values()
+                if (system is None or cluster.system == system) and (level is None or cluster.level == level)
+            ]
+        clusters.sort(key=lambda cluster: cluster.last_seen, reverse=True)
+        return [cluster.to_dict() for cluster in clusters[:limit]]
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    # ----- 持久化 -----
+    def save(self, path: str):
+        """原子写入索引文件"""
+        with self._lock:
+            data = {
+                "clusters": [cluster.to_dict() for cluster in self.clusters.values()],
+                "cursors": self.cursors,
+                "seen": list(self._seen_order)
+            }
+            self._dirty = False
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ErrorClusterIndex":
+        """读取索引文件，不存在时返回空索引"""
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data.get("clusters", []):
+            cluster = ErrorCluster.from_dict(item)
+            index.clusters[cluster.fingerprint] = cluster
+        index.cursors = data.get("cursors", {})
+        for observation_id in data.get("seen", []):
+            index._remember(observation_id)
+        return index
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+
+# ============= 增量同步 =============
+class LangfuseErrorSync:
+    """
+    从 Langfuse /api/public/observations 增量同步错误
+
+    每个级别维护一个游标（已见过的最新 startTime 及该时刻的 id），
+    下次同步用 fromStartTime 只取游标之后的数据，并翻完所有页
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        index: ErrorClusterIndex,
+        system: str = "langfuse",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        timeout: float = 10.0,
+        index_file: Optional[str] = None
+    ):
+        self.config = config
+        self.index = index
+        self.system = system
+        self.page_size = page_size
+        self.timeout = timeout
+        self.index_file = index_file
+        self.logger = logging.getLogger(__name__)
+        self.session = requests.Session()
+        self.last_synced: Optional[float] = None
+        self._sync_lock = threading.Lock()
+
+    def _fetch_page(self, level: str, page: int, from_start_time: Optional[str]) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"level": level, "page": page, "limit": self.page_size}
+        if from_start_time:
+            params["fromStartTime"] = from_start_time
+        response = self.session.get(
+            f"{self.config['host']}/api/public/observations",
+            headers={
+                "Authorization": f"Bearer {self.config['public_key']}:{self.config['secret_key']}"
+            },
+            params=params,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def sync_level(self, level: str) -> int:
+        """同步一个级别，返回新增的 observation 数"""
+        cursor = self.index.cursors.get(level, {})
+        from_start_time = cursor.get("start_time")
+        boundary_ids = set(cursor.get("ids", []))
+
+        newest = from_start_time or ""
+        newest_ids: Set[str] = set(boundary_ids)
+        added = 0
+        page = 1
+        while True:
+            payload = self._fetch_page(level, page, from_start_time)
+            observations = payload.get("data", [])
+            for observation in observations:
+                # fromStartTime 是闭区间，游标时刻已处理过的 id 会再次出现
+                if observation.get("id") in boundary_ids:
+                    continue
+                if self.index.add(self.system, observation):
+                    added += 1
+                started = observation.get("startTime") or ""
+                if started > newest:
+                    newest, newest_ids = started, {observation.get("id")}
+                elif started == newest:
+                    newest_ids.add(observation.get("id"))
+
+            total_pages = (payload.get("meta") or {}).get("totalPages")
+            if not observations or len(observations) < self.page_size:
+                break
+            if total_pages is not None and page >= total_pages:
+                break
+            page += 1
+
+        if newest:
+            self.index.cursors[level] = {"start_time": newest, "ids": sorted(filter(None, newest_ids))}
+        return added
+
+    def sync(self) -> int:
+        """同步所有级别；并发调用时只有一个真正执行"""
+        if not self._sync_lock.acquire(blocking=False):
+            with self._sync_lock:
+                return 0
+        try:
+            added = sum(self.sync_level(level) for level in SYNC_LEVELS)
+            self.last_synced = time.monotonic()
+            if self.index_file and self.index.dirty:
+                self.index.save(self.index_file)
+            return added
+        finally:
+            self._sync_lock.release()
+
+    def sync_if_stale(self, interval: float = DEFAULT_SYNC_INTERVAL_SECONDS) -> int:
+        if self.last_synced is not None and time.monotonic() - self.last_synced < interval:
+            return 0
+        return self.sync()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,363 @@
+"""
+健康评分引擎
+声明式的扣分规则编译为 NumPy 数组，一次向量化求值即可为上万个系统打分；
+HealthReport 按需生成，只针对状态发生变化或被请求的系统
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+# 分数 >= 第一个阈值为 healthy，>= 第二个为 warning，否则 critical
+DEFAULT_STATUS_THRESHOLDS = (80, 60)
+
+STATUS_NAMES = ("healthy", "warning", "critical", "unknown")
+_UNKNOWN = 3
+
+_OK, _WARNING, _CRITICAL = range(3)
+
+
+@dataclass(frozen=True)
+class HealthRule:
+    """
+    一条扣分规则
+
+    指标超过 warning 扣 warning_penalty，超过 critical 扣 critical_penalty；
+    warning 为 None 时只有一级。同一 group 的规则只按其中最严重的一条扣分（如 p95 与 p99）。
+    指标缺失时使用 fallback 指标；两者都缺失则不扣分。
+    问题描述模板可用 {value}（乘以 scale 之后）与 {label}（使用 fallback 时为空）
+    """
+    name: str
+    metric: str
+    critical: float
+    critical_penalty: float
+    critical_issue: str
+    warning: Optional[float] = None
+    warning_penalty: float = 0.0
+    warning_issue: Optional[str] = None
+    op: str = ">"                            # ">" 越大越差，"<" 越小越差
+    fallback: Optional[str] = None
+    label: str = ""
+    scale: float = 1.0
+    recommendation: Optional[str] = None     # 达到 critical 时给出
+    group: Optional[str] = None
+
+
+DEFAULT_HEALTH_RULES = (
+    HealthRule(
+        name="latency_p95", metric="response_time_p95_ms", fallback="response_time_ms", label="P95 ",
+        warning=500, warning_penalty=10, warning_issue="响应时间较慢: {label}{value:.2f}ms",
+        critical=1000, critical_penalty=20, critical_issue="响应时间过长: {label}{value:.2f}ms",
+        recommendation="优化查询性能，考虑添加缓存", group="latency"
+    ),
+    HealthRule(
+        name="latency_p99", metric="response_time_p99_ms", fallback="response_time_ms", label="P99 ",
+        warning=1000, warning_penalty=10, warning_issue="响应时间较慢: {label}{value:.2f}ms",
+        critical=2000, critical_penalty=20, critical_issue="响应时间过长: {label}{value:.2f}ms",
+        recommendation="优化查询性能，考虑添加缓存", group="latency"
+    ),
+    HealthRule(
+        name="error_rate", metric="error_rate", scale=100,
+        warning=0.01, warning_penalty=15, warning_issue="错误率偏高: {value:.2f}%",
+        critical=0.05, critical_penalty=30, critical_issue="错误率过高: {value:.2f}%",
+        recommendation="检查错误日志，修复关键问题"
+    ),
+    HealthRule(
+        name="cpu", metric="cpu_usage",
+        critical=80, critical_penalty=15, critical_issue="CPU 使用率过高: {value:.1f}%",
+        recommendation="考虑扩展计算资源"
+    ),
+    HealthRule(
+        name="memory", metric="memory_usage",
+        critical=85, critical_penalty=15, critical_issue="内存使用率过高: {value:.1f}%",
+        recommendation="检查内存泄漏，优化内存使用"
+    ),
+)
+
+
+# ============= 编译后的规则 =============
+class CompiledRules:
+    """规则集的数组形式；columns 是求值时指标矩阵的列顺序"""
+
+    def __init__(self, rules: Sequence[HealthRule]):
+        if not rules:
+            raise ValueError("At least one health rule is required")
+        for rule in rules:
+            if rule.op not in (">", "<"):
+                raise ValueError(f"Unsupported operator in rule {rule.name}: {rule.op}")
+
+        # 同组规则排在一起，扣分可以用 reduceat 按组取最大
+        group_keys = [rule.group or f"#{rule.name}" for rule in rules]
+        first_seen = {key: i for i, key in reversed(list(enumerate(group_keys)))}
+        order = sorted(range(len(rules)), key=lambda i: (first_seen[group_keys[i]], i))
+        self.rules = [rules[i] for i in order]
+        keys = [group_keys[i] for i in order]
+        self.group_starts = np.flatnonzero([i == 0 or keys[i] != keys[i - 1] for i in range(len(keys))])
+
+        self.columns: List[str] = []
+        for rule in self.rules:
+            for name in (rule.metric, rule.fallback):
+                if name is not None and name not in self.columns:
+                    self.columns.append(name)
+        self.metric_index = np.array([self.columns.index(rule.metric) for rule in self.rules])
+        self.fallback_index = np.array([
+            self.columns.index(rule.fallback) if rule.fallback else -1 for rule in self.rules
+        ])
+        self.has_fallback = self.fallback_index >= 0
+
+        # "<" 规则取负后与 ">" 规则统一比较
+        self.sign = np.array([1.0 if rule.op == ">" else -1.0 for rule in self.rules])
+        critical = np.array([rule.critical for rule in self.rules], dtype=np.float64)
+        warning = np.array([
+            rule.warning if rule.warning is not None else rule.critical for rule in self.rules
+        ], dtype=np.float64)
+        self.critical = self.sign * critical
+        self.warning = self.sign * warning
+        self.penalties = np.array([
+            [0.0, rule.warning_penalty if rule.warning is not None else rule.critical_penalty, rule.critical_penalty]
+            for rule in self.rules
+        ])
+
+
+@dataclass
+class HealthScores:
+    """
+    一次评分的结果
+
+    scores / statuses 是整批数组（statuses 为 STATUS_NAMES 的下标），
+    单个系统的 HealthReport 只在调用 report() 时生成
+    """
+    systems: List[str]
+    scores: np.ndarray          # (N,)
+    statuses: np.ndarray        # (N,) int8
+    changed: np.ndarray         # (N,) bool，与上一次评分相比状态发生变化
+    values: np.ndarray          # (N, 规则数) 规则使用的指标值（已代入 fallback）
+    used_fallback: np.ndarray   # (N, 规则数) bool
+    levels: np.ndarray          # (N, 规则数) 0/1/2
+    failures: Dict[str, str]
+    compiled: CompiledRules
+    make_report: Callable[..., Any]
+    timestamp: datetime
+
+    def __post_init__(self):
+        self._index = {system: i for i, system in enumerate(self.systems)}
+
+    def __len__(self) -> int:
+        return len(self.systems)
+
+    def status(self, system: str) -> str:
+        return STATUS_NAMES[self.statuses[self._index[system]]]
+
+    def changed_systems(self) -> List[str]:
+        return [self.systems[i] for i in np.flatnonzero(self.changed)]
+
+    def report(self, system: str) -> Any:
+        i = self._index[system]
+        if self.statuses[i] == _UNKNOWN:
+            reason = self.failures.get(system)
+            return self.make_report(
+                system=system,
+                status=STATUS_NAMES[_UNKNOWN],
+                score=0,
+                issues=[f"无法获取系统指标: {reason}" if reason else "无法获取系统指标"],
+                recommendations=["检查系统连接"],
+                timestamp=self.timestamp
+            )
+
+        issues: List[str] = []
+        recommendations: List[str] = []
+        starts = list(self.compiled.group_starts) + [len(self.compiled.rules)]
+        for start, end in zip(starts[:-1], starts[1:]):
+            levels = self.levels[i, start:end]
+            worst = int(levels.max())
+            if worst == _OK:
+                continue
+            # 每组只描述最严重的一条（并列时取规则顺序靠前的）
+            j = start + int(np.argmax(levels))
+            rule = self.compiled.rules[j]
+            template = rule.critical_issue if worst == _CRITICAL else (rule.warning_issue or rule.critical_issue)
+            label = "" if self.used_fallback[i, j] else rule.label
+            issues.append(template.format(value=self.values[i, j] * rule.scale, label=label))
+            if worst == _CRITICAL and rule.recommendation:
+                recommendations.append(rule.recommendation)
+
+        return self.make_report(
+            system=system,
+            status=STATUS_NAMES[self.statuses[i]],
+            score=max(0, int(self.scores[i])),
+            issues=issues if issues else ["系统运行正常"],
+            recommendations=recommendations if recommendations else ["保持当前配置"],
+            timestamp=self.timestamp
+        )
+
+    def reports(self, systems: Optional[Iterable[str]] = None, include_changed: bool = False) -> Dict[str, Any]:
+        """
+        生成报告
+
+        Args:
+            systems: 需要报告的系统（None 且 include_changed 为 False 时为全部）
+            include_changed: 额外包含状态发生变化的系统
+        """
+        wanted = list(systems) if systems is not None else ([] if include_changed else list(self.systems))
+        if include_changed:
+            wanted.extend(self.changed_systems())
+        return {system: self.report(system) for system in dict.fromkeys(wanted)}
+
+
+# ============= 评分引擎 =============
+class HealthScorer:
+    """
+    向量化健康评分
+
+    使用方法:
+    scorer = HealthScorer(make_report=lambda **fields: fields)
+    scores = scorer.evaluate(systems, metrics_list)          # 每个元素是 PerformanceMetrics 或 None
+    scores.reports(include_changed=True, systems=["api"])    # 只为变化的与请求的系统生成报告
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[HealthRule] = DEFAULT_HEALTH_RULES,
+        make_report: Callable[..., Any] = dict,
+        status_thresholds: Sequence[float] = DEFAULT_STATUS_THRESHOLDS
+    ):
+        self.make_report = make_report
+        self.status_thresholds = tuple(status_thresholds)
+        self._lock = threading.Lock()
+        self._last_status: Dict[str, int] = {}
+        self.set_rules(rules)
+
+    def set_rules(self, rules: Sequence[HealthRule]):
+        compiled = CompiledRules(list(rules))
+        self.compiled = compiled
+
+    @property
+    def rules(self) -> List[HealthRule]:
+        return list(self.compiled.rules)
+
+    def add_rule(self, rule: HealthRule):
+        """添加或替换同名规则"""
+        rules = [existing for existing in self.compiled.rules if existing.name != rule.name]
+        self.set_rules(rules + [rule])
+
+    def metrics_matrix(self, metrics: Sequence[Any], compiled: Optional[CompiledRules] = None) -> np.ndarray:
+        """按 columns 顺序取出指标对象的属性，缺失为 NaN"""
+        columns = (compiled or self.compiled).columns
+        matrix = np.full((len(metrics), len(columns)), np.nan, dtype=np.float64)
+        for i, item in enumerate(metrics):
+            if item is None:
+                continue
+            for j, column in enumerate(columns):
+                value = getattr(item, column, None)
+                if value is not None:
+                    matrix[i, j] = value
+        return matrix
+
+    def evaluate(
+        self,
+        systems: Sequence[str],
+        metrics: Sequence[Any],
+        failures: Optional[Dict[str, str]] = None
+    ) -> HealthScores:
+        """为一批系统打分；metrics 中为 None 的系统状态为 unknown"""
+        compiled = self.compiled
+        present = np.array([item is not None for item in metrics], dtype=bool)
+        return self.evaluate_matrix(systems, self.metrics_matrix(metrics, compiled), present, failures, compiled)
+
+    def evaluate_matrix(
+        self,
+        systems: Sequence[str],
+        matrix: np.ndarray,
+        present: Optional[np.ndarray] = None,
+        failures: Optional[Dict[str, str]] = None,
+        compiled: Optional[CompiledRules] = None
+    ) -> HealthScores:
+        """
+        对指标矩阵（shape (N, len(columns))）一次性求值
+
+        所有规则的比较、扣分与按组取最大都在整批数组上完成
+        """
+        compiled = compiled or self.compiled
+        systems = list(systems)
+        if present is None:
+            present = np.ones(len(systems), dtype=bool)
+
+        values = matrix[:, compiled.metric_index]
+        fallback_values = matrix[:, np.where(compiled.has_fallback, compiled.fallback_index, 0)]
+        used_fallback = np.isnan(values) & compiled.has_fallback
+        values = np.where(used_fallback, fallback_values, values)
+
+        # NaN 的比较恒为 False，缺失的指标不扣分
+        signed = values * compiled.sign
+        with np.errstate(invalid="ignore"):
+            levels = (signed > compiled.warning).astype(np.int8) + (signed > compiled.critical)
+        penalties = compiled.penalties[np.arange(len(compiled.rules)), levels]
+        group_penalty = np.maximum.reduceat(penalties, compiled.group_starts, axis=1)
+        scores = 100.0 - group_penalty.sum(axis=1)
+
+        healthy, warning = self.status_thresholds
+        statuses = np.select([scores >= healthy, scores >= warning], [0, 1], default=2).astype(np.int8)
+        statuses[~present] = _UNKNOWN
+
+        with self._lock:
+            previous = np.array([self._last_status.get(system, -1) for system in systems], dtype=np.int8)
+            self._last_status.update(zip(systems, statuses.tolist()))
+
+        return HealthScores(
+            systems=systems,
+            scores=scores,
+            statuses=statuses,
+            changed=previous != statuses,
+            values=values,
+            used_fallback=used_fallback,
+            levels=levels,
+            failures=failures or {},
+            compiled=compiled,
+            make_report=self.make_report,
+            timestamp=datetime.now()
+        )
+
+    def forget(self, systems: Optional[Iterable[str]] = None):
+        """清除记住的状态（下次评分视为全部变化）"""
+        with self._lock:
+            if systems is None:
+                self._last_status.clear()
+            else:
+                for system in systems:
+                    self._last_status.pop(system, None)
+
+
+if __name__ == "__main__":
+    import time
+
+    scorer = HealthScorer()
+    print(f"\n🩺 健康评分测试: {len(scorer.rules)} 条规则，指标列 {scorer.compiled.columns}")
+
+    rng = np.random.default_rng(0)
+    n = 50000
+    systems = [f"service-{i}" for i in range(n)]
+    columns = scorer.compiled.columns
+    matrix = np.empty((n, len(columns)))
+    matrix[:, columns.index("response_time_ms")] = rng.gamma(2, 80, n)
+    matrix[:, columns.index("response_time_p95_ms")] = matrix[:, columns.index("response_time_ms")] * 3
+    matrix[:, columns.index("response_time_p99_ms")] = matrix[:, columns.index("response_time_ms")] * 6
+    matrix[:, columns.index("error_rate")] = rng.exponential(0.01, n)
+    matrix[:, columns.index("cpu_usage")] = rng.uniform(10, 95, n)
+    matrix[:, columns.index("memory_usage")] = rng.uniform(10, 95, n)
+    matrix[rng.random(n) < 0.3, columns.index("response_time_p95_ms")] = np.nan  # 部分系统只有均值
+
+    started = time.perf_counter()
+    scores = scorer.evaluate_matrix(systems, matrix)
+    elapsed = time.perf_counter() - started
+    counts = np.bincount(scores.statuses, minlength=4)
+    print(f"  {n} 个系统评分: {elapsed * 1000:.1f}ms，" + "，".join(f"{name} {count}" for name, count in zip(STATUS_NAMES, counts)))
+
+    matrix[:100, columns.index("error_rate")] = 0.2
+    scores = scorer.evaluate_matrix(systems, matrix)
+    reports = scores.reports(["service-42"], include_changed=True)
+    print(f"  再次评分: {int(scores.changed.sum())} 个系统状态变化，生成 {len(reports)} 份报告")
+    print(f"  service-0: {reports['service-0']}")
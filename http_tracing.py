@@ -0,0 +1,205 @@
+"""
+出站 HTTP 请求追踪
+为工具适配器的每个请求注入 W3C traceparent 头，并把客户端耗时拆分为
+DNS / 建连 / TLS / 首字节 / 响应体，作为当前 track_agent_action span 的子 span 上报
+"""
+
+import os
+import socket
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from agent_tracking_base import current_span
+
+
+# 当前请求的计时点（perf_counter 秒），由连接类写入
+_CURRENT_TIMING: ContextVar[Optional[Dict[str, float]]] = ContextVar("http_request_timing", default=None)
+
+# collect_http_timings() 打开的收集列表
+_COLLECTOR: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("http_timing_collector", default=None)
+
+# 每个请求完成后调用的监听器（如指标导出）
+TIMING_LISTENERS: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def new_span_id() -> str:
+    """生成 16 位十六进制的子 span ID"""
+    return os.urandom(8).hex()
+
+
+def build_traceparent(span_id: str) -> Optional[str]:
+    """
+    基于当前 span 生成 traceparent
+    
+    span_id 是出站请求对应子 span 的 ID，上报 Langfuse 时使用同一个 ID，上游服务可据此关联
+    """
+    span = current_span()
+    if span is None:
+        return None
+    return f"00-{span.trace_id}-{span_id}-01"
+
+
+@contextmanager
+def collect_http_timings() -> Iterator[List[Dict[str, Any]]]:
+    """收集代码块内所有出站请求的计时"""
+    timings: List[Dict[str, Any]] = []
+    token = _COLLECTOR.set(timings)
+    try:
+        yield timings
+    finally:
+        _COLLECTOR.reset(token)
+
+
+# ============= 带计时的连接 =============
+class _TimedConnectionMixin:
+    """在建立新连接时记录 DNS、TCP 建连与 TLS 握手的时间点"""
+    
+    def _new_conn(self):
+        timing = _CURRENT_TIMING.get()
+        if timing is None:
+            return super()._new_conn()
+        
+        timing["dns_start"] = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # 交给 urllib3 自己解析并抛出 NameResolutionError
+            return super()._new_conn()
+        timing["dns_end"] = time.perf_counter()
+        
+        # 逐个尝试解析出的地址，行为与 create_connection 一致
+        host = self._dns_host
+        last_error: Optional[Exception] = None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    sock = super()._new_conn()
+                    timing["connect_end"] = time.perf_counter()
+                    return sock
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    last_error = e
+        finally:
+            self._dns_host = host
+        raise last_error
+    
+    def connect(self):
+        super().connect()
+        timing = _CURRENT_TIMING.get()
+        if timing is not None and isinstance(self, HTTPSConnection):
+            timing["tls_end"] = time.perf_counter()
+    
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        timing = _CURRENT_TIMING.get()
+        if timing is not None:
+            timing["first_byte"] = time.perf_counter()
+        return response
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+def _phases(timing: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """把时间点换算为各阶段耗时（毫秒）；复用连接时 DNS / 建连 / TLS 为 None"""
+    def ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+        if start is None or end is None:
+            return None
+        return (end - start) * 1000
+    
+    ready = timing.get("tls_end") or timing.get("connect_end") or timing["start"]
+    return {
+        "dns_ms": ms(timing.get("dns_start"), timing.get("dns_end")),
+        "connect_ms": ms(timing.get("dns_end"), timing.get("connect_end")),
+        "tls_ms": ms(timing.get("connect_end"), timing.get("tls_end")),
+        "ttfb_ms": ms(ready, timing.get("first_byte")),
+        "body_ms": ms(timing.get("first_byte"), timing.get("body_end")),
+        "total_ms": ms(timing["start"], timing.get("body_end"))
+    }
+
+
+# ============= 传输层 =============
+class TracingTransport(HTTPAdapter):
+    """注入 traceparent 并记录分阶段耗时的传输层"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+    
+    def send(self, request, **kwargs):
+        span_id = new_span_id()
+        traceparent = build_traceparent(span_id)
+        if traceparent and "traceparent" not in request.headers:
+            request.headers["traceparent"] = traceparent
+        
+        timing: Dict[str, float] = {"start": time.perf_counter()}
+        started_at = datetime.now()
+        token = _CURRENT_TIMING.set(timing)
+        status = None
+        error = None
+        try:
+            response = super().send(request, **kwargs)
+            status = response.status_code
+            response.content  # 读取响应体以计时
+            timing["body_end"] = time.perf_counter()
+            return response
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _CURRENT_TIMING.reset(token)
+            self._report(request, timing, started_at, status, error, span_id, traceparent)
+    
+    def _report(self, request, timing, started_at, status, error, span_id, traceparent):
+        url = urlsplit(request.url)
+        entry: Dict[str, Any] = {
+            "name": f"HTTP {request.method} {url.hostname}",
+            "span_id": span_id,
+            "method": request.method,
+            "host": url.hostname,
+            "path": url.path,
+            "status": status,
+            "error": error,
+            "traceparent": traceparent,
+            "reused_connection": "connect_end" not in timing,
+            "start_time": started_at,
+            "end_time": datetime.now(),
+            **_phases(timing)
+        }
+        
+        span = current_span()
+        if span is not None:
+            span.add_child(entry)
+        collector = _COLLECTOR.get()
+        if collector is not None:
+            collector.append(entry)
+        for listener in TIMING_LISTENERS:
+            try:
+                listener(entry)
+            except Exception:
+                pass
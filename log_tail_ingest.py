@@ -0,0 +1,514 @@
+"""
+本地日志尾随采集
+持续读取 OperationLogger 的 tool_operations*.jsonl 与 LocalLangfuseTracker 的 langfuse_traces_*.jsonl 中新追加的行，
+处理轮转与截断；每行只解析一次，按系统和时间桶汇总为延迟、错误率、吞吐量时序写入 MetricsStore / MetricsRollup，
+使没有 Langfuse 服务时监控也有数据
+
+使用方法:
+ingester = LogTailIngester(agent.metrics_store, agent.metrics_rollup, directory=".", state_file="log_tail_state.json")
+ingester.start()                  # 后台线程每 poll_interval 秒读取一次
+...
+ingester.stop()
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from operation_serializer import decode_record
+from quantile_sketch import DDSketch
+
+
+DEFAULT_PATTERNS = (
+    "tool_operations.jsonl",
+    "tool_operations.*.jsonl",      # 按进程分段的日志
+    "langfuse_traces_*.jsonl",
+)
+
+DEFAULT_BUCKET_SECONDS = 0.5
+DEFAULT_POLL_INTERVAL_SECONDS = 0.1
+DEFAULT_RESCAN_INTERVAL_SECONDS = 0.5
+DEFAULT_SAVE_INTERVAL_SECONDS = 5.0
+DEFAULT_READ_LIMIT_BYTES = 8 * 1024 * 1024
+
+TOOL_SYSTEM_PREFIX = "tool-"
+TRACE_SYSTEM_PREFIX = "traces-"
+
+# 与 operation_stats 一致：只有终态计入错误率与吞吐
+_TERMINAL_STATUSES = ("success", "failed")
+_TRACE_ERROR_STATUSES = ("error", "failed")
+
+# (系统, 时间戳, 耗时毫秒或 nan, 是否错误)
+Event = Tuple[str, float, float, bool]
+
+
+# ============= 行解析 =============
+def _timestamp(value: Any) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_operation(record: Dict[str, Any]) -> Optional[Event]:
+    """OperationRecord 日志行 -> 事件；非终态的行返回 None"""
+    status = record.get("status")
+    if status not in _TERMINAL_STATUSES:
+        return None
+    ts = _timestamp(record.get("end_time")) or _timestamp(record.get("start_time"))
+    if ts is None:
+        return None
+    duration = record.get("duration_ms")
+    return (
+        TOOL_SYSTEM_PREFIX + (record.get("tool_name") or "unknown"),
+        ts,
+        np.nan if duration is None else float(duration),
+        status == "failed"
+    )
+
+
+def parse_trace(record: Dict[str, Any], project: str) -> Optional[Event]:
+    """LocalLangfuseTracker 追踪行 -> 事件（只有带耗时字段的行才有延迟）"""
+    ts = _timestamp(record.get("timestamp"))
+    if ts is None:
+        return None
+    duration = record.get("duration_ms", record.get("latency_ms"))
+    return (
+        TRACE_SYSTEM_PREFIX + (record.get("project") or project),
+        ts,
+        np.nan if duration is None else float(duration),
+        record.get("status") in _TRACE_ERROR_STATUSES or bool(record.get("error"))
+    )
+
+
+def _trace_project(path: str) -> Optional[str]:
+    """langfuse_traces_<project>.jsonl -> project；其他文件返回 None"""
+    name = os.path.basename(path)
+    if name.startswith("langfuse_traces_") and name.endswith(".jsonl"):
+        return name[len("langfuse_traces_"):-len(".jsonl")]
+    return None
+
+
+# ============= 单文件尾随 =============
+class FileTailer:
+    """
+    跟随一个不断追加的文件
+
+    - 轮转（路径指向了新的 inode）：先把旧文件读完，再从头读新文件
+    - 截断（文件变短，如 copytruncate）：从头重新读
+    - 末尾不完整的行保留到下次读取；检查点偏移不包含它，重启后会重新读到
+    """
+
+    def __init__(
+        self,
+        path: str,
+        checkpoint: Optional[Dict[str, int]] = None,
+        from_start: bool = True,
+        read_limit: int = DEFAULT_READ_LIMIT_BYTES
+    ):
+        self.path = path
+        self.read_limit = read_limit
+        self.rotations = 0
+        self.truncations = 0
+        self.pending = False          # 上次读满了上限，还有数据没读
+        self._checkpoint = checkpoint
+        self._from_start = from_start
+        self._file = None
+        self._identity: Optional[Tuple[int, int]] = None
+        self._offset = 0
+        self._partial = b""
+
+    def _open(self, resume: bool) -> bool:
+        try:
+            f = open(self.path, "rb", buffering=0)
+        except FileNotFoundError:
+            return False
+        st = os.fstat(f.fileno())
+        self._file = f
+        self._identity = (st.st_dev, st.st_ino)
+        self._partial = b""
+        self._offset = 0
+        if resume:
+            checkpoint = self._checkpoint
+            if checkpoint and (checkpoint["dev"], checkpoint["ino"]) == self._identity and checkpoint["offset"] <= st.st_size:
+                self._offset = checkpoint["offset"]
+            elif not checkpoint and not self._from_start:
+                self._offset = st.st_size
+            f.seek(self._offset)
+        return True
+
+    def _read(self) -> List[bytes]:
+        data = self._file.read(self.read_limit) or b""
+        self.pending = len(data) == self.read_limit
+        self._offset += len(data)
+        if not data:
+            return []
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return lines
+
+    def read_lines(self) -> List[bytes]:
+        """读取自上次以来新增的完整行"""
+        if self._file is None and not self._open(resume=self._identity is None):
+            return []
+        lines = self._read()
+        if self.pending:
+            return lines
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # 已被移走、新文件还没创建：继续持有旧文件
+            return lines
+
+        if (st.st_dev, st.st_ino) != self._identity:
+            if self._partial.strip():
+                lines.append(self._partial)
+            self._file.close()
+            self._file = None
+            self.rotations += 1
+            if self._open(resume=False):
+                lines.extend(self._read())
+        elif st.st_size < self._offset:
+            self._file.seek(0)
+            self._offset = 0
+            self._partial = b""
+            self.truncations += 1
+            lines.extend(self._read())
+        return lines
+
+    def checkpoint(self) -> Optional[Dict[str, int]]:
+        if self._identity is None:
+            return self._checkpoint
+        return {"dev": self._identity[0], "ino": self._identity[1], "offset": self._offset - len(self._partial)}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# ============= 时间桶 =============
+class _Bucket:
+    __slots__ = ("count", "errors", "duration_sum", "duration_count", "sketch", "newest")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.sketch = DDSketch()
+        self.newest = 0.0
+
+
+# ============= 采集器 =============
+class LogTailIngester:
+    """
+    把本地 JSONL 日志流式汇总为各系统的指标序列
+
+    每个系统按 bucket_seconds 切分时间桶，桶结束后写出一个点：
+    response_time_ms 为平均耗时（同时把耗时分布合并进汇总层的分位数草图），
+    error_rate 为失败占比，throughput 为每秒次数。
+    晚到的行（其时间桶已写出）计入该系统下一个桶，保证写入的时间戳单调递增
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        rollup: Any = None,
+        directory: str = ".",
+        patterns: Sequence[str] = DEFAULT_PATTERNS,
+        bucket_seconds: float = DEFAULT_BUCKET_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        rescan_interval: float = DEFAULT_RESCAN_INTERVAL_SECONDS,
+        state_file: Optional[str] = None,
+        save_interval: float = DEFAULT_SAVE_INTERVAL_SECONDS,
+        from_start: bool = True
+    ):
+        self.store = store
+        self.rollup = rollup
+        self.directory = directory
+        self.patterns = tuple(patterns)
+        self.bucket_seconds = bucket_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.state_file = state_file
+        self.save_interval = save_interval
+        self.from_start = from_start
+        self.logger = logging.getLogger(__name__)
+
+        self.tailers: Dict[str, FileTailer] = {}
+        self._checkpoints = self._load_state()
+        self._buckets: Dict[str, Dict[int, _Bucket]] = {}
+        self._last_emitted: Dict[str, int] = {}
+        self._rejected_systems = set()
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.lines = 0
+        self.skipped = 0
+        self.points = 0
+        self.last_lag_ms: Optional[float] = None
+        self.max_lag_ms = 0.0
+
+    # ----- 文件发现 -----
+    def scan(self):
+        """按 patterns 发现新文件"""
+        self._last_scan = time.time()
+        for pattern in self.patterns:
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                path = os.path.abspath(path)
+                if path not in self.tailers:
+                    self.tailers[path] = FileTailer(path, self._checkpoints.get(path), self.from_start)
+
+    # ----- 读取 -----
+    def _parse(self, path: str, lines: List[bytes], events: List[Event]):
+        project = _trace_project(path)
+        for line in lines:
+            if not line.strip():
+                continue
+            self.lines += 1
+            try:
+                record = decode_record(line)
+                event = parse_trace(record, project) if project is not None else parse_operation(record)
+            except (ValueError, TypeError, AttributeError):
+                event = None
+            if event is None:
+                self.skipped += 1
+            else:
+                events.append(event)
+
+    def poll(self, now: Optional[float] = None) -> int:
+        """
+        读取所有文件的新行并写出已结束的时间桶
+
+        Returns:
+            本次读取的行数
+        """
+        with self._lock:
+            if time.time() - self._last_scan >= self.rescan_interval:
+                self.scan()
+
+            events: List[Event] = []
+            for path, tailer in self.tailers.items():
+                try:
+                    lines = tailer.read_lines()
+                except OSError as e:
+                    self.logger.error(f"Failed to read {path}: {e}")
+                    continue
+                self._parse(path, lines, events)
+
+            self._add_events(events)
+            self._emit(time.time() if now is None else now)
+            return len(events)
+
+    def _add_events(self, events: List[Event]):
+        if not events:
+            return
+        systems, timestamps, durations, errors = zip(*events)
+        timestamps = np.array(timestamps, dtype=np.float64)
+        durations = np.array(durations, dtype=np.float64)
+        errors = np.array(errors, dtype=bool)
+        bucket_ids = np.floor(timestamps / self.bucket_seconds).astype(np.int64)
+
+        names = sorted(set(systems))
+        index = {name: i for i, name in enumerate(names)}
+        codes = np.array([index[s] for s in systems], dtype=np.int64)
+        # 晚到的事件并入下一个未写出的桶
+        floors = np.array([self._last_emitted.get(name, np.iinfo(np.int64).min + 1) + 1 for name in names])
+        bucket_ids = np.maximum(bucket_ids, floors[codes])
+
+        groups, inverse = np.unique(np.stack([codes, bucket_ids]), axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        has_duration = ~np.isnan(durations)
+        counts = np.bincount(inverse)
+        error_counts = np.bincount(inverse, weights=errors)
+        duration_sums = np.bincount(inverse, weights=np.where(has_duration, durations, 0.0))
+        duration_counts = np.bincount(inverse, weights=has_duration)
+        newest = np.full(len(counts), -np.inf)
+        np.maximum.at(newest, inverse, timestamps)
+
+        order = np.argsort(inverse, kind="stable")
+        splits = np.split(durations[order], np.cumsum(counts)[:-1])
+        for g, (code, bucket_id) in enumerate(groups.T):
+            bucket = self._buckets.setdefault(names[code], {}).get(int(bucket_id))
+            if bucket is None:
+                bucket = self._buckets[names[code]][int(bucket_id)] = _Bucket()
+            bucket.count += int(counts[g])
+            bucket.errors += int(error_counts[g])
+            bucket.duration_sum += float(duration_sums[g])
+            bucket.duration_count += int(duration_counts[g])
+            bucket.sketch.extend(splits[g][~np.isnan(splits[g])].tolist())
+            bucket.newest = max(bucket.newest, float(newest[g]))
+
+    def _emit(self, now: float, force: bool = False):
+        closed_before = int(np.floor(now / self.bucket_seconds))
+        for system, buckets in self._buckets.items():
+            for bucket_id in sorted(buckets):
+                if bucket_id >= closed_before and not force:
+                    break
+                self._write(system, bucket_id, buckets.pop(bucket_id), now)
+
+    def _write(self, system: str, bucket_id: int, bucket: _Bucket, now: float):
+        ts = bucket_id * self.bucket_seconds
+        values = {
+            "response_time_ms": bucket.duration_sum / bucket.duration_count if bucket.duration_count else np.nan,
+            "error_rate": bucket.errors / bucket.count,
+            "throughput": bucket.count / self.bucket_seconds
+        }
+        try:
+            self.store.append(system, ts, **values)
+            if self.rollup is not None:
+                self.rollup.append(system, ts, response_time_sketch=bucket.sketch if bucket.duration_count else None, **values)
+        except ValueError as e:
+            # 超出存储上限的系统只提示一次
+            if system not in self._rejected_systems:
+                self._rejected_systems.add(system)
+                self.logger.warning(f"Not recording {system}: {e}")
+            return
+        # 只有写入成功的系统才出现在 systems() 中
+        self._last_emitted[system] = bucket_id
+        self.points += 1
+        self.last_lag_ms = (now - bucket.newest) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def flush(self):
+        """写出所有未结束的时间桶（停止前调用）"""
+        with self._lock:
+            self._emit(time.time(), force=True)
+
+    def systems(self) -> List[str]:
+        """已有数据写入存储的系统"""
+        return sorted(self._last_emitted)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.tailers),
+            "lines": self.lines,
+            "skipped": self.skipped,
+            "points": self.points,
+            "systems": self.systems(),
+            "rotations": sum(t.rotations for t in self.tailers.values()),
+            "truncations": sum(t.truncations for t in self.tailers.values()),
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms
+        }
+
+    # ----- 后台线程 -----
+    def start(self) -> "LogTailIngester":
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+
+        def loop():
+            last_save = time.time()
+            while not self._stop.is_set():
+                try:
+                    self.poll()
+                    if self.state_file and time.time() - last_save >= self.save_interval:
+                        self.save_state()
+                        last_save = time.time()
+                except Exception as e:
+                    self.logger.error(f"Log tail ingestion failed: {e}")
+                # 有文件没读完时立即继续
+                if not any(t.pending for t in self.tailers.values()):
+                    self._stop.wait(self.poll_interval)
+
+        self._thread = threading.Thread(target=loop, name="log-tail-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.save_state()
+        for tailer in self.tailers.values():
+            tailer.close()
+
+    # ----- 检查点 -----
+    def _load_state(self) -> Dict[str, Dict[str, int]]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable tail state {self.state_file}: {e}")
+            return {}
+
+    def save_state(self):
+        """原子写入每个文件的读取位置"""
+        if not self.state_file:
+            return
+        with self._lock:
+            files = {path: tailer.checkpoint() for path, tailer in self.tailers.items() if tailer.checkpoint()}
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "files": files}, f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            self.logger.error(f"Failed to save tail state: {e}")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from metrics_rollup import MetricsRollup
+    from metrics_store import MetricsStore
+
+    def op_line(tool, status, duration):
+        now = datetime.now().isoformat()
+        return json.dumps({
+            "tool_name": tool, "command": "run", "status": status,
+            "start_time": now, "end_time": now, "duration_ms": duration, "retry_count": 0
+        }) + "\n"
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = os.path.join(directory, "tool_operations.jsonl")
+        trace_file = os.path.join(directory, "langfuse_traces_demo.jsonl")
+        store = MetricsStore()
+        rollup = MetricsRollup(store)
+        ingester = LogTailIngester(store, rollup, directory=directory).start()
+
+        print("\n📥 本地日志尾随采集测试")
+        with open(log_file, "a") as f:
+            for i in range(200):
+                f.write(op_line("github", "failed" if i % 20 == 0 else "success", 50 + i % 100))
+                f.flush()
+                time.sleep(0.005)
+        with open(trace_file, "a") as f:
+            f.write(json.dumps({"name": "process_node", "status": "processing", "timestamp": datetime.now().isoformat()}) + "\n")
+
+        # 轮转：移走旧文件、创建新文件
+        os.replace(log_file, log_file + ".1")
+        with open(log_file, "a") as f:
+            f.write(op_line("github", "success", 80))
+            f.write(op_line("slack", "success", 30))
+        # 截断
+        time.sleep(0.5)
+        with open(log_file, "w") as f:
+            f.write(op_line("slack", "failed", 40))
+        time.sleep(1.5)
+        ingester.stop()
+
+        stats = ingester.stats()
+        print(f"  {stats['lines']} 行 -> {stats['points']} 个点，系统: {stats['systems']}")
+        print(f"  轮转 {stats['rotations']} 次，截断 {stats['truncations']} 次，最大延迟 {stats['max_lag_ms']:.0f}ms")
+        window = store.window("tool-github")
+        print(f"  tool-github: {int((window['throughput'] * ingester.bucket_seconds).sum())} 次操作，"
+              f"错误率 {np.average(window['error_rate'], weights=window['throughput']):.1%}")
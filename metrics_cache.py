@@ -0,0 +1,176 @@
+"""
+指标缓存（stale-while-revalidate）
+按 (系统, 时间范围) 缓存指标；过期后先返回旧值，同时由单个后台任务刷新
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from prometheus_query import parse_duration
+
+
+# 时间范围 -> 新鲜期（秒）；范围越长，数据变化越慢
+RANGE_TTL_SECONDS = {
+    "5m": 15,
+    "15m": 30,
+    "1h": 60,
+    "6h": 300,
+    "24h": 600,
+    "7d": 1800,
+    "30d": 3600,
+}
+
+_MIN_TTL_SECONDS = 15
+_MAX_TTL_SECONDS = 3600
+
+# 过期超过 TTL 的这个倍数后不再返回旧值，改为同步加载
+DEFAULT_MAX_STALE_FACTOR = 10.0
+
+# 后台刷新失败后的重试间隔
+_FAILURE_BACKOFF_SECONDS = 5.0
+
+
+def ttl_for_range(time_range: str) -> float:
+    """时间范围对应的新鲜期：映射表优先，否则取范围的 1/60 并限制在 [15s, 1h]"""
+    if time_range in RANGE_TTL_SECONDS:
+        return RANGE_TTL_SECONDS[time_range]
+    try:
+        seconds = parse_duration(time_range)
+    except ValueError:
+        return _MIN_TTL_SECONDS
+    return min(max(seconds / 60, _MIN_TTL_SECONDS), _MAX_TTL_SECONDS)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float        # time.monotonic()
+    ttl: float
+    retry_at: float = 0.0    # 刷新失败后，在此之前不再尝试
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now if now is not None else time.monotonic()) - self.fetched_at
+
+    def is_fresh(self, now: float) -> bool:
+        return self.age(now) < self.ttl
+
+
+class MetricsCache:
+    """
+    stale-while-revalidate 缓存
+
+    使用方法:
+    cache = MetricsCache(loader=lambda key: fetch(*key), ttl_for=lambda key: ttl_for_range(key[1]))
+    cache.get(("langfuse", "1h"))
+
+    - 新鲜: 直接返回
+    - 过期但未超过 max_stale_factor * ttl: 返回旧值，并提交一次后台刷新（同一键同时只有一个）
+    - 不存在或过期太久: 同步加载；并发的调用者共享同一次加载
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Any],
+        ttl_for: Callable[[Hashable], float],
+        max_stale_factor: float = DEFAULT_MAX_STALE_FACTOR,
+        max_workers: int = 4
+    ):
+        self.loader = loader
+        self.ttl_for = ttl_for
+        self.max_stale_factor = max_stale_factor
+        self.max_workers = max_workers
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_fresh(now):
+                self._counters["hits"] += 1
+                return entry.value
+
+            if entry is not None and entry.age(now) < entry.ttl * self.max_stale_factor:
+                self._counters["stale_hits"] += 1
+                if key not in self._inflight and now >= entry.retry_at:
+                    self._start_refresh(key)
+                return entry.value
+
+            self._counters["misses"] += 1
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            self._load(key, future)
+        return future.result()
+
+    def _start_refresh(self, key: Hashable):
+        # 调用方持有 self._lock
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="metrics-cache")
+        future: Future = Future()
+        self._inflight[key] = future
+        self._counters["refreshes"] += 1
+        self._executor.submit(self._load, key, future)
+
+    def _load(self, key: Hashable, future: Future):
+        try:
+            value = self.loader(key)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    # 保留旧值，稍后再试
+                    self._counters["refresh_errors"] += 1
+                    entry.retry_at = time.monotonic() + min(entry.ttl, _FAILURE_BACKOFF_SECONDS)
+                    self.logger.warning(f"Metrics refresh failed for {key}: {e}")
+            future.set_exception(e)
+            return
+
+        entry = CacheEntry(value=value, fetched_at=time.monotonic(), ttl=self.ttl_for(key))
+        with self._lock:
+            self._entries[key] = entry
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中计数与每个条目的年龄（秒）"""
+        now = time.monotonic()
+        with self._lock:
+            entries: Dict[str, Dict[str, Any]] = {}
+            for key, entry in self._entries.items():
+                label = ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+                entries[label] = {
+                    "age_seconds": round(entry.age(now), 3),
+                    "ttl_seconds": entry.ttl,
+                    "fresh": entry.is_fresh(now),
+                    "refreshing": key in self._inflight
+                }
+            return {**self._counters, "entries": entries}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
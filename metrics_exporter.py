@@ -0,0 +1,718 @@
+"""
+Prometheus 文本格式指标导出
+内置计数器 / 仪表 / 直方图与 /metrics HTTP 端点；抓取时不获取写入方的锁。
+设置 METRICS_MULTIPROC_DIR 后进入多进程模式：每个进程把数值写入各自的内存映射文件，抓取时汇总
+"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 抓取时回调返回的样本: (指标名, 类型, 帮助文本, [(标签, 值), ...])
+CollectedMetric = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# ============= 多进程存储 =============
+class _MmapFile:
+    """
+    单个进程的数值文件
+
+    布局: [已用字节数 uint32][填充 4 字节] 之后是若干条目
+    条目: [键长度 uint32][键 (UTF-8，补齐到 8 字节)][值 float64]
+    只有所属进程写入；值按 8 字节对齐写入，读取方不会读到撕裂的浮点数
+    """
+
+    _INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._retired: List[mmap.mmap] = []
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self._INITIAL_SIZE)
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), self._size)
+        self._used = struct.unpack_from("I", self._mm, 0)[0] or 8
+        for key, _, offset in _read_entries(self._mm, self._used):
+            self._offsets[key] = offset
+
+    def offset(self, key: str) -> int:
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+        return offset
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        entry_size = 4 + padded + 8
+        if self._used + entry_size > self._size:
+            self._grow(self._used + entry_size)
+        struct.pack_into(f"I{padded}sd", self._mm, self._used, len(encoded), encoded, 0.0)
+        value_offset = self._used + 4 + padded
+        self._used += entry_size
+        struct.pack_into("I", self._mm, 0, self._used)
+        self._offsets[key] = value_offset
+        return value_offset
+
+    def _grow(self, needed: int):
+        size = self._size
+        while size < needed:
+            size *= 2
+        # 其他线程可能仍在使用旧映射写值（MAP_SHARED，写入同样落到文件），保留到 close 时再释放
+        self._retired.append(self._mm)
+        self._file.truncate(size)
+        self._size = size
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def read(self, offset: int) -> float:
+        return struct.unpack_from("d", self._mm, offset)[0]
+
+    def write(self, offset: int, value: float):
+        struct.pack_into("d", self._mm, offset, value)
+
+    def close(self):
+        for mm in self._retired + [self._mm]:
+            mm.close()
+        self._file.close()
+
+
+def _read_entries(buffer: Any, used: int) -> Iterable[Tuple[str, float, int]]:
+    pos = 8
+    while pos < used:
+        key_length = struct.unpack_from("I", buffer, pos)[0]
+        padded = key_length + (-(4 + key_length) % 8)
+        key = bytes(buffer[pos + 4:pos + 4 + key_length]).decode("utf-8")
+        value_offset = pos + 4 + padded
+        yield key, struct.unpack_from("d", buffer, value_offset)[0], value_offset
+        pos = value_offset + 8
+
+
+def read_multiprocess_file(path: str) -> List[Tuple[str, float]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < 8:
+        return []
+    used = struct.unpack_from("I", data, 0)[0]
+    return [(key, value) for key, value, _ in _read_entries(data, min(used, len(data)))]
+
+
+class _MultiprocessStore:
+    """当前进程的数值文件；fork 之后子进程改用自己的文件"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.generation = 0
+        self._file: Optional[_MmapFile] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def file(self) -> _MmapFile:
+        if self._pid == os.getpid() and self._file is not None:
+            return self._file
+        with self._lock:
+            if self._pid != os.getpid() or self._file is None:
+                self._file = _MmapFile(os.path.join(self.directory, f"metrics_{os.getpid()}.db"))
+                self._pid = os.getpid()
+                self.generation += 1
+        return self._file
+
+
+# ============= 数值 =============
+class _LocalValue:
+    __slots__ = ("_value",)
+
+    def __init__(self):
+        self._value = 0.0
+
+    def add(self, amount: float):
+        self._value += amount
+
+    def set(self, value: float):
+        self._value = value
+
+    def get(self) -> float:
+        return self._value
+
+
+class _MmapValue:
+    """写入当前进程数值文件的值；fork 后在子进程中重新定位"""
+
+    __slots__ = ("_store", "_key", "_file", "_offset", "_generation")
+
+    def __init__(self, store: _MultiprocessStore, key: str):
+        self._store = store
+        self._key = key
+        self._generation = -1
+        self._resolve()
+
+    def _resolve(self):
+        self._file = self._store.file()
+        if self._generation != self._store.generation:
+            self._offset = self._file.offset(self._key)
+            self._generation = self._store.generation
+
+    def add(self, amount: float):
+        self._resolve()
+        self._file.write(self._offset, self._file.read(self._offset) + amount)
+
+    def set(self, value: float):
+        self._resolve()
+        self._file.write(self._offset, value)
+
+    def get(self) -> float:
+        self._resolve()
+        return self._file.read(self._offset)
+
+
+# ============= 指标 =============
+class _Child:
+    """一组标签值对应的序列；写入方持有自己的小锁，抓取方只读"""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+
+class CounterChild(_Child):
+    __slots__ = ("_value",)
+
+    def __init__(self, value):
+        super().__init__()
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value.add(amount)
+
+    def samples(self) -> List[Tuple[str, Tuple, float]]:
+        return [("_total", (), self._value.get())]
+
+
+class GaugeChild(_Child):
+    __slots__ = ("_value",)
+
+    def __init__(self, value):
+        super().__init__()
+        self._value = value
+
+    def set(self, value: float):
+        self._value.set(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value.add(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def samples(self) -> List[Tuple[str, Tuple, float]]:
+        return [("", (), self._value.get())]
+
+
+class HistogramChild(_Child):
+    __slots__ = ("_upper_bounds", "_buckets", "_sum", "_count")
+
+    def __init__(self, upper_bounds: Sequence[float], make_value: Callable[[str, Tuple], Any]):
+        super().__init__()
+        self._upper_bounds = list(upper_bounds) + [float("inf")]
+        self._buckets = [make_value("_bucket", (("le", _format_value(bound)),)) for bound in self._upper_bounds]
+        self._sum = make_value("_sum", ())
+        self._count = make_value("_count", ())
+
+    def observe(self, value: float):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._buckets[index].add(1.0)
+            self._sum.add(value)
+            self._count.add(1.0)
+
+    def samples(self) -> List[Tuple[str, Tuple, float]]:
+        # 存储的是各桶自身的计数，输出时累加为累计分布
+        samples = []
+        cumulative = 0.0
+        for bound, bucket in zip(self._upper_bounds, self._buckets):
+            cumulative += bucket.get()
+            samples.append(("_bucket", (("le", _format_value(bound)),), cumulative))
+        samples.append(("_sum", (), self._sum.get()))
+        samples.append(("_count", (), self._count.get()))
+        return samples
+
+
+class MetricFamily:
+    """同名指标的全部序列"""
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        kind: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        multiprocess_mode: str = "all"
+    ):
+        self.registry = registry
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.multiprocess_mode = multiprocess_mode
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: Any, **kwargs: Any):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child(key)
+        return child
+
+    def _new_child(self, key: LabelValues):
+        labels = tuple(zip(self.labelnames, key))
+
+        def make_value(suffix: str, extra: Tuple) -> Any:
+            return self.registry._make_value(self, suffix, labels + extra)
+
+        if self.kind == "counter":
+            return CounterChild(make_value("_total", ()))
+        if self.kind == "gauge":
+            return GaugeChild(make_value("", ()))
+        return HistogramChild(self.buckets, make_value)
+
+    # 无标签指标的快捷方法
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def collect(self) -> List[Tuple[str, Tuple, float]]:
+        samples = []
+        # dict 拷贝在 GIL 下是原子的，不需要持有族锁
+        for key, child in list(self._children.items()):
+            labels = tuple(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                samples.append((suffix, labels + extra, value))
+        return samples
+
+
+# ============= 注册表 =============
+class MetricsRegistry:
+    """
+    指标注册表
+
+    使用方法:
+    actions = REGISTRY.counter("agent_actions", "Agent 动作次数", ["agent_type", "action", "outcome"])
+    actions.labels("monitoring_specialist", "获取性能指标", "success").inc()
+    print(REGISTRY.render())
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str] = None):
+        self.multiprocess_dir = multiprocess_dir
+        self._store = _MultiprocessStore(multiprocess_dir) if multiprocess_dir else None
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            existing = self._families.get(family.name)
+            if existing is not None:
+                if existing.kind != family.kind or existing.labelnames != family.labelnames:
+                    raise ValueError(f"Metric {family.name} already registered with a different definition")
+                return existing
+            self._families[family.name] = family
+            return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(self, name, "counter", documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        multiprocess_mode: str = "all"
+    ) -> MetricFamily:
+        """multiprocess_mode: all（按 pid 分开）、sum、max、min"""
+        return self._register(MetricFamily(
+            self, name, "gauge", documentation, labelnames, multiprocess_mode=multiprocess_mode
+        ))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> MetricFamily:
+        return self._register(MetricFamily(self, name, "histogram", documentation, labelnames, buckets=buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        """注册抓取时调用的回调（用于从已有统计对象直接生成样本）"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _make_value(self, family: MetricFamily, suffix: str, labels: Tuple) -> Any:
+        if self._store is None:
+            return _LocalValue()
+        # 键里带上类型与多进程模式，抓取进程即使没有注册过该指标也能正确汇总
+        key = json.dumps(
+            [family.name, family.kind, family.multiprocess_mode, suffix, [list(pair) for pair in labels]],
+            ensure_ascii=False
+        )
+        return _MmapValue(self._store, key)
+
+    # ----- 渲染 -----
+    def _family_samples(self) -> Dict[str, Tuple[str, List[Tuple[str, Tuple, float]]]]:
+        """指标名 -> (类型, 样本)"""
+        if self._store is None:
+            return {name: (family.kind, family.collect()) for name, family in list(self._families.items())}
+        return self._aggregate_files()
+
+    def _aggregate_files(self) -> Dict[str, Tuple[str, List[Tuple[str, Tuple, float]]]]:
+        """汇总目录中所有进程的数值文件（类型与模式取自文件中的键，不依赖本进程的注册表）"""
+        merged: Dict[Tuple[str, str, Tuple], float] = {}
+        kinds: Dict[str, str] = {name: family.kind for name, family in list(self._families.items())}
+        for path in glob.glob(os.path.join(self.multiprocess_dir, "metrics_*.db")):
+            pid = os.path.basename(path)[len("metrics_"):-len(".db")]
+            try:
+                entries = read_multiprocess_file(path)
+            except OSError:
+                continue
+            for key, value in entries:
+                name, kind, mode, suffix, labels = json.loads(key)
+                labels = tuple(tuple(pair) for pair in labels)
+                kinds.setdefault(name, kind)
+                if kind != "gauge":
+                    mode = "sum"
+                if mode == "all":
+                    merged[(name, suffix, labels + (("pid", pid),))] = value
+                    continue
+                sample_key = (name, suffix, labels)
+                if sample_key not in merged:
+                    merged[sample_key] = value
+                elif mode == "max":
+                    merged[sample_key] = max(merged[sample_key], value)
+                elif mode == "min":
+                    merged[sample_key] = min(merged[sample_key], value)
+                else:
+                    merged[sample_key] = merged[sample_key] + value
+
+        families: Dict[str, List[Tuple[str, Tuple, float]]] = {name: [] for name in self._families}
+        for (name, suffix, labels), value in merged.items():
+            families.setdefault(name, []).append((suffix, labels, value))
+
+        # 直方图各桶在文件里是独立计数，输出前转为累计值
+        for name, samples in families.items():
+            if kinds[name] != "histogram":
+                continue
+            series: Dict[Tuple, Dict[str, Any]] = {}
+            for suffix, labels, value in samples:
+                base = tuple(pair for pair in labels if pair[0] != "le")
+                entry = series.setdefault(base, {"buckets": [], "rest": []})
+                if suffix == "_bucket":
+                    bound = dict(labels)["le"]
+                    entry["buckets"].append((float(bound), bound, value))
+                else:
+                    entry["rest"].append((suffix, labels, value))
+            rebuilt = []
+            for base, entry in series.items():
+                cumulative = 0.0
+                for _, bound, value in sorted(entry["buckets"]):
+                    cumulative += value
+                    rebuilt.append(("_bucket", base + (("le", bound),), cumulative))
+                rebuilt.extend(entry["rest"])
+            families[name] = rebuilt
+        return {name: (kinds[name], samples) for name, samples in families.items()}
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式；只读取数值，不获取写入方的锁"""
+        lines: List[str] = []
+        for name, (kind, samples) in sorted(self._family_samples().items()):
+            family = self._families.get(name)
+            # 文本格式 0.0.4 中计数器的 HELP/TYPE 必须使用带 _total 的样本名
+            metric_name = f"{name}_total" if kind == "counter" else name
+            if family is not None and family.documentation:
+                lines.append(f"# HELP {metric_name} {_escape(family.documentation)}")
+            lines.append(f"# TYPE {metric_name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        # 多个回调可能输出同名指标（例如多个 OperationLogger），合并后每个指标只写一次 HELP/TYPE
+        collected: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in list(self._collectors):
+            try:
+                for name, kind, documentation, samples in collector():
+                    collected.setdefault(name, (kind, documentation, []))[2].extend(samples)
+            except Exception as e:
+                self.logger.error(f"Metrics collector failed: {e}")
+        for name, (kind, documentation, samples) in collected.items():
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+    def mark_process_dead(self, pid: int):
+        """删除已退出进程的数值文件（其计数器随之归零，Prometheus 按重置处理）"""
+        if self.multiprocess_dir:
+            path = os.path.join(self.multiprocess_dir, f"metrics_{pid}.db")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+REGISTRY = MetricsRegistry(multiprocess_dir=os.getenv("METRICS_MULTIPROC_DIR") or None)
+
+
+# ============= 内置指标 =============
+AGENT_ACTIONS = REGISTRY.counter(
+    "agent_actions", "track_agent_action 动作次数", ["agent_type", "action", "outcome"]
+)
+AGENT_ACTION_DURATION = REGISTRY.histogram(
+    "agent_action_duration_seconds", "track_agent_action 动作耗时", ["agent_type", "action"]
+)
+TOOL_HTTP_DURATION = REGISTRY.histogram(
+    "tool_http_phase_duration_seconds", "工具出站 HTTP 请求各阶段耗时", ["host", "phase"]
+)
+HEALTH_SCORE = REGISTRY.gauge(
+    "monitoring_health_score", "最近一次健康报告分数 (0-100)", ["system"], multiprocess_mode="max"
+)
+HEALTH_STATUS = REGISTRY.gauge(
+    "monitoring_health_status", "最近一次健康报告状态（当前状态为 1）", ["system", "status"], multiprocess_mode="max"
+)
+
+_HTTP_PHASES = ("dns", "connect", "tls", "ttfb", "body", "total")
+
+
+def _record_action(agent_type: str, action: str, duration: float, success: bool):
+    AGENT_ACTIONS.labels(agent_type, action, "success" if success else "error").inc()
+    AGENT_ACTION_DURATION.labels(agent_type, action).observe(duration)
+
+
+def _record_http_timing(entry: Dict[str, Any]):
+    host = entry.get("host") or "unknown"
+    for phase in _HTTP_PHASES:
+        value = entry.get(f"{phase}_ms")
+        if value is not None:
+            TOOL_HTTP_DURATION.labels(host, phase).observe(value / 1000)
+
+
+_HEALTH_STATUSES = ("healthy", "warning", "critical", "unknown")
+
+
+def record_health_report(report: Any):
+    """记录一份 HealthReport 的分数与状态"""
+    HEALTH_SCORE.labels(report.system).set(report.score)
+    for status in _HEALTH_STATUSES:
+        HEALTH_STATUS.labels(report.system, status).set(1.0 if report.status.value == status else 0.0)
+
+
+def record_health_scores(systems: Sequence[str], scores: Sequence[float], statuses: Sequence[int]):
+    """记录一批评分结果（statuses 为 health_scoring.STATUS_NAMES 的下标；unknown 的分数记为 0）"""
+    for system, score, status in zip(systems, list(scores), list(statuses)):
+        unknown = _HEALTH_STATUSES[status] == "unknown"
+        HEALTH_SCORE.labels(system).set(0.0 if unknown else max(0.0, float(score)))
+        for i, name in enumerate(_HEALTH_STATUSES):
+            HEALTH_STATUS.labels(system, name).set(1.0 if status == i else 0.0)
+
+
+def install_default_metrics():
+    """接入 track_agent_action 与出站 HTTP 计时回调（重复调用无副作用）"""
+    from agent_tracking_base import ACTION_LISTENERS
+    from http_tracing import TIMING_LISTENERS
+
+    if _record_action not in ACTION_LISTENERS:
+        ACTION_LISTENERS.append(_record_action)
+    if _record_http_timing not in TIMING_LISTENERS:
+        TIMING_LISTENERS.append(_record_http_timing)
+
+
+# 多进程模式下的操作统计族在导入时注册，抓取进程即使自己没有记录过操作也带有 HELP/TYPE；
+# 单进程模式由 operation_stats_collector 输出同名指标，这里不注册以免重复
+if REGISTRY.multiprocess_dir is not None:
+    TOOL_OPERATIONS: Optional[MetricFamily] = REGISTRY.counter(
+        "tool_operations", "工具操作次数（按状态）", ["tool", "command", "status"]
+    )
+    TOOL_OPERATION_DURATION: Optional[MetricFamily] = REGISTRY.histogram(
+        "tool_operation_duration_seconds", "工具操作耗时", ["tool", "command"]
+    )
+else:
+    TOOL_OPERATIONS = None
+    TOOL_OPERATION_DURATION = None
+
+
+def record_operation(tool: str, command: str, status: str, duration_ms: Optional[float]):
+    """
+    多进程模式下把一次操作写入本进程的数值文件，抓取时与其他进程的文件汇总
+
+    单进程模式下什么也不做：操作统计由 operation_stats_collector 在抓取时读取
+    """
+    if TOOL_OPERATIONS is None:
+        return
+    TOOL_OPERATIONS.labels(tool, command, status).inc()
+    if duration_ms is not None:
+        TOOL_OPERATION_DURATION.labels(tool, command).observe(duration_ms / 1000)
+
+
+def operation_stats_collector(op_logger: Any) -> Callable[[], Iterable[CollectedMetric]]:
+    """
+    把 OperationLogger 的统计转换为样本（抓取时读取，不在写日志时额外开销）
+
+    只读取本进程的统计，只用于单进程模式；多进程模式由 record_operation 写入共享文件
+    """
+    def collect() -> Iterable[CollectedMetric]:
+        counts: List[Tuple[Dict[str, str], float]] = []
+        durations: List[Tuple[Dict[str, str], float]] = []
+        # rebuild_stats 会替换 stats 对象，所以每次抓取时重新取
+        for group, summary in op_logger.stats.breakdown().items():
+            tool, _, command = group.partition("/")
+            for status, count in summary["by_status"].items():
+                counts.append(({"tool": tool, "command": command, "status": status}, count))
+            for quantile in ("p50", "p95", "p99"):
+                value = summary["duration_ms"][quantile]
+                if value is not None:
+                    labels = {"tool": tool, "command": command, "quantile": f"0.{quantile[1:]}"}
+                    durations.append((labels, value / 1000))
+        return [
+            ("tool_operations_total", "counter", "工具操作次数（按状态）", counts),
+            ("tool_operation_duration_seconds", "summary", "工具操作耗时分位数", durations),
+        ]
+    return collect
+
+
+# ============= HTTP 端点 =============
+class MetricsExporter:
+    """
+    /metrics HTTP 端点
+
+    使用方法:
+    exporter = start_exporter(9464)
+    ...
+    exporter.stop()
+    """
+
+    def __init__(self, port: int = 9464, addr: str = "0.0.0.0", registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or REGISTRY
+        registry_ref = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((addr, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "MetricsExporter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread = None
+
+
+def start_exporter(port: int = 9464, addr: str = "0.0.0.0", registry: Optional[MetricsRegistry] = None) -> MetricsExporter:
+    """安装默认指标并启动 /metrics 端点"""
+    install_default_metrics()
+    return MetricsExporter(port, addr, registry).start()
+
+
+if __name__ == "__main__":
+    import urllib.request
+
+    print("=" * 60)
+    print("Prometheus 指标导出示例")
+    print("=" * 60)
+
+    install_default_metrics()
+    for duration in (0.02, 0.2, 1.5):
+        _record_action("monitoring_specialist", "获取性能指标", duration, True)
+    _record_action("monitoring_specialist", "获取性能指标", 0.05, False)
+    _record_http_timing({"host": "api.github.com", "dns_ms": 3.0, "connect_ms": 12.0, "ttfb_ms": 80.0, "total_ms": 120.0})
+
+    exporter = MetricsExporter(port=0, addr="127.0.0.1").start()
+    with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+        print(response.read().decode("utf-8"))
+    exporter.stop()
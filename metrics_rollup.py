@@ -0,0 +1,606 @@
+"""
+指标多分辨率汇总
+原始点持续降采样到 1m / 5m / 1h 三级，每个桶保存各列的 min/max/sum/count，响应时间另带 DDSketch；
+查询规划器选择满足时间范围与步长的最粗一级，多天的查询只读取几千个桶
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics_store import COLUMNS, MetricsWindow
+from quantile_sketch import DDSketch
+
+
+VALUE_COLUMNS = COLUMNS[1:]
+_VALUE_INDEX = {name: i for i, name in enumerate(VALUE_COLUMNS)}
+
+# 只有响应时间需要分位数
+SKETCH_COLUMN = "response_time_ms"
+_SKETCH_INDEX = _VALUE_INDEX[SKETCH_COLUMN]
+
+# (名称, 分辨率秒数, 保留时长秒数)
+DEFAULT_TIERS = (
+    ("1m", 60, 2 * 86400),
+    ("5m", 300, 14 * 86400),
+    ("1h", 3600, 90 * 86400),
+)
+
+# 未指定步长时，一次查询最多返回的点数
+DEFAULT_MAX_POINTS = 2000
+
+_MIN, _MAX, _SUM, _COUNT = range(4)
+
+
+def _empty_stats(n: int) -> np.ndarray:
+    stats = np.zeros((4, len(VALUE_COLUMNS), n), dtype=np.float64)
+    stats[_MIN] = np.inf
+    stats[_MAX] = -np.inf
+    return stats
+
+
+def _reduce_buckets(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    width: float,
+    point_sketches: Optional[Sequence[Optional[DDSketch]]] = None
+) -> Tuple[np.ndarray, np.ndarray, List[DDSketch]]:
+    """
+    把一批原始点按宽度 width 分桶汇总
+
+    point_sketches 给出某个点的完整响应时间分布时，桶草图合并该分布而不是只记一个均值
+
+    Returns:
+        (桶编号, 汇总 shape (4, 列数, 桶数), 每个桶响应时间的草图)
+    """
+    buckets = np.floor(timestamps / width).astype(np.int64)
+    if len(buckets) == 1:
+        # 逐点追加是最常见的情况，跳过排序与 reduceat
+        column = values[:, 0]
+        valid = ~np.isnan(column)
+        stats = np.stack([
+            np.where(valid, column, np.inf),
+            np.where(valid, column, -np.inf),
+            np.where(valid, column, 0.0),
+            valid.astype(np.float64)
+        ])[:, :, None]
+        if point_sketches is not None and point_sketches[0] is not None:
+            sketch = point_sketches[0].copy()
+        else:
+            sketch = DDSketch()
+            if valid[_SKETCH_INDEX]:
+                sketch.add(float(column[_SKETCH_INDEX]))
+        return buckets, stats, [sketch]
+
+    order = np.argsort(buckets, kind="stable")
+    buckets = buckets[order]
+    values = values[:, order]
+    boundaries = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    valid = ~np.isnan(values)
+    stats = np.empty((4, len(VALUE_COLUMNS), len(boundaries)), dtype=np.float64)
+    stats[_MIN] = np.minimum.reduceat(np.where(valid, values, np.inf), boundaries, axis=1)
+    stats[_MAX] = np.maximum.reduceat(np.where(valid, values, -np.inf), boundaries, axis=1)
+    stats[_SUM] = np.add.reduceat(np.where(valid, values, 0.0), boundaries, axis=1)
+    stats[_COUNT] = np.add.reduceat(valid, boundaries, axis=1)
+
+    latencies = values[_SKETCH_INDEX]
+    ends = np.r_[boundaries[1:], len(buckets)]
+    sketches = []
+    for start, end in zip(boundaries, ends):
+        sketch = DDSketch()
+        if point_sketches is None:
+            group = latencies[start:end]
+            sketch.extend(group[~np.isnan(group)].tolist())
+        else:
+            for k in range(start, end):
+                provided = point_sketches[order[k]]
+                if provided is not None:
+                    sketch.merge(provided)
+                elif not np.isnan(latencies[k]):
+                    sketch.add(float(latencies[k]))
+        sketches.append(sketch)
+    return buckets[boundaries], stats, sketches
+
+
+# ============= 查询结果 =============
+class RollupWindow:
+    """
+    一段按时间升序排列的汇总桶
+
+    timestamps 是各桶起点；min/max/mean 在桶内没有样本时为 NaN
+    """
+
+    __slots__ = ("timestamps", "resolution", "stats", "sketches")
+
+    def __init__(self, timestamps: np.ndarray, resolution: float, stats: np.ndarray, sketches: List[Optional[DDSketch]]):
+        self.timestamps = timestamps
+        self.resolution = resolution
+        self.stats = stats
+        self.sketches = sketches
+
+    @classmethod
+    def from_points(cls, timestamps: np.ndarray, values: np.ndarray, step: float) -> "RollupWindow":
+        """由原始点直接生成（values shape (列数, n)）"""
+        if not len(timestamps):
+            return cls(np.empty(0), step, _empty_stats(0), [])
+        buckets, stats, sketches = _reduce_buckets(timestamps, values, step)
+        return cls(buckets * float(step), step, stats, sketches)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _stat(self, stat: int, column: str) -> np.ndarray:
+        values = self.stats[stat, _VALUE_INDEX[column]]
+        return np.where(self.stats[_COUNT, _VALUE_INDEX[column]] > 0, values, np.nan)
+
+    def min(self, column: str) -> np.ndarray:
+        return self._stat(_MIN, column)
+
+    def max(self, column: str) -> np.ndarray:
+        return self._stat(_MAX, column)
+
+    def sum(self, column: str) -> np.ndarray:
+        return self.stats[_SUM, _VALUE_INDEX[column]]
+
+    def count(self, column: str) -> np.ndarray:
+        return self.stats[_COUNT, _VALUE_INDEX[column]]
+
+    def mean(self, column: str) -> np.ndarray:
+        count = self.count(column)
+        return np.divide(self.sum(column), count, out=np.full(len(count), np.nan), where=count > 0)
+
+    def sketch(self) -> DDSketch:
+        """整段时间响应时间的合并草图"""
+        merged = DDSketch()
+        for sketch in self.sketches:
+            if sketch is not None:
+                merged.merge(sketch)
+        return merged
+
+    def resample(self, step: float) -> "RollupWindow":
+        """合并为更粗的步长（step 应为当前分辨率的整数倍）"""
+        if step <= self.resolution or not len(self):
+            return self
+        groups = np.floor(self.timestamps / step).astype(np.int64)
+        boundaries = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        stats = np.empty((4, self.stats.shape[1], len(boundaries)), dtype=np.float64)
+        stats[_MIN] = np.minimum.reduceat(self.stats[_MIN], boundaries, axis=1)
+        stats[_MAX] = np.maximum.reduceat(self.stats[_MAX], boundaries, axis=1)
+        stats[_SUM] = np.add.reduceat(self.stats[_SUM], boundaries, axis=1)
+        stats[_COUNT] = np.add.reduceat(self.stats[_COUNT], boundaries, axis=1)
+
+        sketches: List[Optional[DDSketch]] = []
+        ends = np.r_[boundaries[1:], len(groups)]
+        for start, end in zip(boundaries, ends):
+            merged = DDSketch()
+            for sketch in self.sketches[start:end]:
+                if sketch is not None:
+                    merged.merge(sketch)
+            sketches.append(merged)
+        return RollupWindow(groups[boundaries] * float(step), step, stats, sketches)
+
+    def to_metrics_window(self) -> MetricsWindow:
+        """各桶均值组成的 MetricsWindow（时间戳为桶起点）"""
+        data = np.empty((len(COLUMNS), len(self)), dtype=np.float64)
+        data[0] = self.timestamps
+        for i, column in enumerate(VALUE_COLUMNS, start=1):
+            data[i] = self.mean(column)
+        return MetricsWindow(data)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        rows = []
+        for i, timestamp in enumerate(self.timestamps.tolist()):
+            row: Dict[str, Any] = {"timestamp": timestamp}
+            for column in VALUE_COLUMNS:
+                j = _VALUE_INDEX[column]
+                count = self.stats[_COUNT, j, i]
+                row[column] = float(self.stats[_SUM, j, i] / count) if count else None
+                if column == SKETCH_COLUMN and count:
+                    row[f"{column}_max"] = float(self.stats[_MAX, j, i])
+                    sketch = self.sketches[i]
+                    row[f"{column}_p95"] = sketch.quantile(0.95) if sketch is not None else None
+            rows.append(row)
+        return rows
+
+
+# ============= 单级汇总 =============
+class _TierSeries:
+    """一个系统在某一级上的桶（按桶编号取模存放的环形数组）"""
+
+    __slots__ = ("starts", "stats", "sketches", "latest_bucket")
+
+    def __init__(self, capacity: int):
+        self.starts = np.full(capacity, np.nan, dtype=np.float64)
+        self.stats = _empty_stats(capacity)
+        self.sketches: List[Optional[DDSketch]] = [None] * capacity
+        self.latest_bucket = -1
+
+
+class RollupTier:
+    """
+    一级汇总
+
+    提供与 MetricsStore 相同的 window(system, since=...) 接口（只含已封口的桶，值为桶均值），
+    因此可以直接交给 TrendAnalyzer 做长时间范围的趋势分析
+    """
+
+    def __init__(self, name: str, resolution: int, retention: int):
+        self.name = name
+        self.resolution = resolution
+        self.retention = retention
+        self.capacity = max(1, retention // resolution)
+        self._series: Dict[str, _TierSeries] = {}
+        self._lock = threading.Lock()
+
+    def ingest(
+        self,
+        system: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+        point_sketches: Optional[Sequence[Optional[DDSketch]]] = None
+    ):
+        """合并一批原始点（values shape (列数, n)）"""
+        if not len(timestamps):
+            return
+        buckets, stats, sketches = _reduce_buckets(timestamps, values, self.resolution, point_sketches)
+        # 一批跨度超过容量时只保留最新的部分
+        keep = buckets > buckets[-1] - self.capacity
+        buckets, stats = buckets[keep], stats[:, :, keep]
+        sketches = [sketch for sketch, kept in zip(sketches, keep) if kept]
+
+        with self._lock:
+            series = self._series.get(system)
+            if series is None:
+                series = self._series[system] = _TierSeries(self.capacity)
+            slots = buckets % self.capacity
+            starts = buckets * float(self.resolution)
+
+            current = series.starts[slots]
+            # 槽位里已是更新的桶：这批点太旧，已超出保留期
+            accepted = ~(current > starts)
+            reset = accepted & (current != starts)
+            reset_slots = slots[reset]
+            series.starts[reset_slots] = starts[reset]
+            series.stats[:, :, reset_slots] = _empty_stats(len(reset_slots))
+            for slot in reset_slots.tolist():
+                series.sketches[slot] = None
+
+            slots, stats = slots[accepted], stats[:, :, accepted]
+            series.stats[_MIN, :, slots] = np.minimum(series.stats[_MIN, :, slots], stats[_MIN].T)
+            series.stats[_MAX, :, slots] = np.maximum(series.stats[_MAX, :, slots], stats[_MAX].T)
+            series.stats[_SUM, :, slots] += stats[_SUM].T
+            series.stats[_COUNT, :, slots] += stats[_COUNT].T
+            for slot, sketch in zip(slots.tolist(), (s for s, ok in zip(sketches, accepted) if ok)):
+                if series.sketches[slot] is None:
+                    series.sketches[slot] = sketch
+                else:
+                    series.sketches[slot].merge(sketch)
+            series.latest_bucket = max(series.latest_bucket, int(buckets[-1]))
+
+    def rollup_window(
+        self,
+        system: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        sealed_only: bool = False
+    ) -> RollupWindow:
+        """[start, end) 内的桶（按时间升序）；sealed_only 时不含仍在写入的最新桶"""
+        with self._lock:
+            series = self._series.get(system)
+            if series is None:
+                return RollupWindow(np.empty(0), self.resolution, _empty_stats(0), [])
+            starts = series.starts
+            mask = ~np.isnan(starts)
+            if start is not None:
+                mask &= starts >= np.floor(start / self.resolution) * self.resolution
+            if end is not None:
+                mask &= starts < end
+            if sealed_only:
+                mask &= starts < series.latest_bucket * float(self.resolution)
+            slots = np.flatnonzero(mask)
+            slots = slots[np.argsort(starts[slots], kind="stable")]
+            return RollupWindow(
+                starts[slots].copy(),
+                self.resolution,
+                series.stats[:, :, slots].copy(),
+                [series.sketches[slot].copy() if series.sketches[slot] is not None else None for slot in slots.tolist()]
+            )
+
+    def window(self, system: str, last: Optional[int] = None, since: Optional[float] = None) -> MetricsWindow:
+        """MetricsStore 兼容接口：已封口桶的均值序列"""
+        window = self.rollup_window(system, start=since, sealed_only=True).to_metrics_window()
+        if last is not None:
+            window = MetricsWindow(window.data[:, -last:] if last else window.data[:, :0])
+        return window
+
+    def systems(self) -> List[str]:
+        return list(self._series)
+
+    # ----- 持久化 -----
+    def save(self, directory: str):
+        """每个系统写入 <directory>/<system>.<级别>.npz（原子替换）"""
+        with self._lock:
+            snapshot = {
+                system: (
+                    series.starts.copy(),
+                    series.stats.copy(),
+                    [sketch.to_bytes() if sketch is not None else b"" for sketch in series.sketches],
+                    series.latest_bucket
+                )
+                for system, series in self._series.items()
+            }
+        for system, (starts, stats, blobs, latest_bucket) in snapshot.items():
+            path = os.path.join(directory, f"{system}.{self.name}.npz")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    starts=starts,
+                    stats=stats,
+                    latest_bucket=np.array(latest_bucket),
+                    # 草图以二进制拼接保存，长度为 0 表示空槽位
+                    sketch_lengths=np.array([len(blob) for blob in blobs], dtype=np.int64),
+                    sketch_data=np.frombuffer(b"".join(blobs), dtype=np.uint8)
+                )
+            os.replace(tmp_path, path)
+
+    def load(self, directory: str):
+        """读取 save 写出的文件；容量不一致的文件会被跳过"""
+        suffix = f".{self.name}.npz"
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(suffix):
+                continue
+            with np.load(os.path.join(directory, name)) as data:
+                if data["starts"].shape != (self.capacity,):
+                    raise ValueError(f"{name} has capacity {data['starts'].shape[0]}, expected {self.capacity}")
+                series = _TierSeries(self.capacity)
+                series.starts = data["starts"].copy()
+                series.stats = data["stats"].copy()
+                series.latest_bucket = int(data["latest_bucket"])
+                lengths = data["sketch_lengths"]
+                blob = data["sketch_data"].tobytes()
+                offsets = np.concatenate(([0], np.cumsum(lengths))).tolist()
+                series.sketches = [
+                    DDSketch.from_bytes(blob[start:end]) if end > start else None
+                    for start, end in zip(offsets[:-1], offsets[1:])
+                ]
+            self._series[name[:-len(suffix)]] = series
+
+
+# ============= 查询规划 =============
+@dataclass
+class QueryPlan:
+    """查询规划结果: tier 为 None 表示直接读原始点"""
+    tier: Optional[RollupTier]
+    step: float            # 返回结果的步长（秒）
+    range_seconds: float
+
+    @property
+    def source(self) -> str:
+        return self.tier.name if self.tier is not None else "raw"
+
+
+class MetricsRollup:
+    """
+    多分辨率汇总管道
+
+    使用方法:
+    rollup = MetricsRollup(store)
+    rollup.append_metrics(metrics)                  # 与 MetricsStore.append_metrics 一起调用
+    window = rollup.query("prometheus", "7d")     # 自动选择 5m 级，约 2000 个点
+    window.mean("response_time_ms"), window.sketch().quantile(0.99)
+    """
+
+    def __init__(
+        self,
+        store: Optional[Any] = None,
+        tiers: Sequence[Tuple[str, int, int]] = DEFAULT_TIERS,
+        max_points: int = DEFAULT_MAX_POINTS
+    ):
+        self.store = store
+        self.tiers = [RollupTier(name, resolution, retention) for name, resolution, retention in tiers]
+        self.tiers.sort(key=lambda tier: tier.resolution)
+        self.max_points = max_points
+        self.logger = logging.getLogger(__name__)
+        self._dirty = False
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    def tier(self, name: str) -> RollupTier:
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise KeyError(name)
+
+    def ingest(
+        self,
+        system: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+        point_sketches: Optional[Sequence[Optional[DDSketch]]] = None
+    ):
+        """合并一批原始点到所有级别（values shape (列数, n)）"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(VALUE_COLUMNS), -1)
+        for tier in self.tiers:
+            tier.ingest(system, timestamps, values, point_sketches)
+        self._dirty = True
+
+    def append(
+        self,
+        system: str,
+        timestamp: float,
+        response_time_sketch: Optional[DDSketch] = None,
+        **values: Optional[float]
+    ):
+        row = [[np.nan if values.get(column) is None else values[column]] for column in VALUE_COLUMNS]
+        sketches = [response_time_sketch] if response_time_sketch is not None else None
+        self.ingest(system, np.array([timestamp]), np.array(row), sketches)
+
+    def append_metrics(self, metrics: Any):
+        """合并一条 PerformanceMetrics（带响应时间分布时合并整个分布）"""
+        self.append(
+            metrics.system,
+            metrics.timestamp.timestamp(),
+            response_time_sketch=getattr(metrics, "response_time_sketch", None),
+            **{column: getattr(metrics, column) for column in VALUE_COLUMNS}
+        )
+
+    def backfill(self, system: str, window: MetricsWindow):
+        """用一段原始点补齐汇总（例如从快照恢复原始存储之后）"""
+        if len(window):
+            self.ingest(system, window.timestamps, window.data[1:])
+
+    def systems(self) -> List[str]:
+        return sorted({system for tier in self.tiers for system in tier.systems()})
+
+    # ----- 查询 -----
+    def raw_coverage(self, system: str, end: float) -> float:
+        """原始存储中该系统的数据覆盖到 end 为止多长时间（秒）"""
+        if self.store is None:
+            return 0.0
+        oldest = self.store.window(system, last=self.store.capacity).timestamps[:1]
+        return end - float(oldest[0]) if len(oldest) else 0.0
+
+    def plan(self, range_seconds: float, step: Optional[float] = None, raw_coverage: float = 0.0) -> QueryPlan:
+        """
+        选择数据来源
+
+        步长（默认 范围 / max_points）小于最细一级且原始数据覆盖整个范围时读原始点；
+        否则在保留期覆盖范围的级别中选分辨率不超过步长的最粗一级，
+        都不满足步长时退而选覆盖范围的最细一级
+        """
+        step = float(step) if step else range_seconds / self.max_points
+        finest = self.tiers[0].resolution
+        if step < finest and raw_coverage >= range_seconds:
+            return QueryPlan(None, step, range_seconds)
+
+        covering = [tier for tier in self.tiers if tier.retention >= range_seconds] or [self.tiers[-1]]
+        fitting = [tier for tier in covering if tier.resolution <= max(step, finest)]
+        tier = fitting[-1] if fitting else covering[0]
+        # 步长取分辨率的整数倍，重采样时每个输出点包含相同数量的桶
+        return QueryPlan(tier, max(step // tier.resolution, 1) * tier.resolution, range_seconds)
+
+    def query(
+        self,
+        system: str,
+        range_seconds: float,
+        step: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> RollupWindow:
+        """按规划读取 [end - range, end) 的数据并按步长返回"""
+        if end is None:
+            latest = [tier._series[system].latest_bucket for tier in self.tiers[:1] if system in tier._series]
+            end = (latest[0] + 1) * float(self.tiers[0].resolution) if latest else 0.0
+        plan = self.plan(range_seconds, step, self.raw_coverage(system, end))
+        start = end - range_seconds
+
+        if plan.tier is None:
+            raw = self.store.window(system, since=start)
+            keep = raw.timestamps < end
+            return RollupWindow.from_points(raw.timestamps[keep], raw.data[1:, keep], plan.step)
+        return plan.tier.rollup_window(system, start, end).resample(plan.step)
+
+    # ----- 持久化 -----
+    def snapshot(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._dirty = False
+        for tier in self.tiers:
+            tier.save(directory)
+
+    @classmethod
+    def restore(
+        cls,
+        directory: str,
+        store: Optional[Any] = None,
+        tiers: Sequence[Tuple[str, int, int]] = DEFAULT_TIERS,
+        max_points: int = DEFAULT_MAX_POINTS
+    ) -> "MetricsRollup":
+        rollup = cls(store, tiers, max_points)
+        if not os.path.isdir(directory):
+            return rollup
+        for tier in rollup.tiers:
+            try:
+                tier.load(directory)
+            except (OSError, ValueError, KeyError) as e:
+                rollup.logger.warning(f"Skipping {tier.name} rollup snapshot: {e}")
+        return rollup
+
+    def start_snapshots(self, directory: str, interval: float = 60.0):
+        """后台定期快照（仅在有新数据时写盘）"""
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            while not self._snapshot_stop.wait(interval):
+                if self._dirty:
+                    try:
+                        self.snapshot(directory)
+                    except Exception as e:
+                        self.logger.error(f"Failed to snapshot metrics rollups: {e}")
+
+        self._snapshot_thread = threading.Thread(target=run, name="metrics-rollup-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self):
+        self._snapshot_stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from metrics_store import MetricsStore
+
+    store = MetricsStore()
+    rollup = MetricsRollup(store)
+    print(f"\n🧮 多分辨率汇总测试: 原始存储每个系统 {store.capacity} 个点")
+
+    # 10 天、每 10 秒一个点
+    now = time.time()
+    timestamps = np.arange(now - 10 * 86400, now, 10.0)
+    rng = np.random.default_rng(0)
+    latency = 80 + 20 * np.sin(timestamps / 86400 * 2 * np.pi) + rng.exponential(10, len(timestamps))
+    values = np.vstack([
+        latency,
+        np.full(len(timestamps), 0.01),
+        np.full(len(timestamps), 1000.0),
+        rng.uniform(20, 60, len(timestamps)),
+        np.full(len(timestamps), np.nan),
+    ])
+
+    started = time.perf_counter()
+    for chunk in range(0, len(timestamps), 360):
+        rollup.ingest("prometheus", timestamps[chunk:chunk + 360], values[:, chunk:chunk + 360])
+    elapsed = time.perf_counter() - started
+    print(f"  汇总 {len(timestamps)} 个点: {elapsed * 1000:.0f}ms")
+    for i in range(len(timestamps) - store.capacity, len(timestamps)):
+        store.append("prometheus", timestamps[i], **{c: values[j, i] for j, c in enumerate(VALUE_COLUMNS)})
+
+    for time_range in (3600, 86400, 7 * 86400, 30 * 86400):
+        plan = rollup.plan(time_range, raw_coverage=rollup.raw_coverage("prometheus", now))
+        started = time.perf_counter()
+        window = rollup.query("prometheus", time_range, end=now)
+        elapsed = time.perf_counter() - started
+        p99 = window.sketch().quantile(0.99)
+        print(
+            f"  {time_range // 3600:>4}h -> {plan.source:>3}, {len(window):>4} 个点, "
+            f"{elapsed * 1000:.1f}ms, p99={p99:.1f}ms"
+        )
+
+    exact = np.percentile(latency[timestamps >= now - 7 * 86400], 99)
+    print(f"  7 天 p99 精确值: {exact:.1f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        rollup.snapshot(directory)
+        restored = MetricsRollup.restore(directory, store)
+        assert len(restored.query("prometheus", 7 * 86400, end=now)) == len(rollup.query("prometheus", 7 * 86400, end=now))
+        print(f"  快照恢复: {len(restored.systems())} 个系统")
@@ -0,0 +1,367 @@
+"""
+性能指标时序存储
+每个系统一个 NumPy 环形缓冲区：固定内存、O(1) 追加、零拷贝窗口视图，可定期快照到内存映射文件
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+COLUMNS = ("timestamp", "response_time_ms", "error_rate", "throughput", "cpu_usage", "memory_usage")
+_COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+# 每个点占用的字节数（双写，所以乘 2）
+_BYTES_PER_POINT = len(COLUMNS) * np.dtype(np.float64).itemsize * 2
+
+DEFAULT_MEMORY_BUDGET_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_POINTS_PER_SYSTEM = 10000
+DEFAULT_MAX_SYSTEMS = 4096
+INITIAL_CAPACITY = 256
+
+
+# ============= 窗口视图 =============
+class MetricsWindow:
+    """
+    环形缓冲区中连续一段数据的视图
+
+    各列是底层缓冲区的切片，不发生拷贝；缓冲区绕回覆盖后视图内容会随之变化，
+    需要长期持有时调用 copy()
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray):
+        self.data = data  # shape (len(COLUMNS), n)
+
+    def __len__(self) -> int:
+        return self.data.shape[1]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.data[_COLUMN_INDEX[column]]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.data[0]
+
+    def copy(self) -> "MetricsWindow":
+        return MetricsWindow(self.data.copy())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转换为行字典（NaN 表示缺失，转换为 None）"""
+        rows = self.data.T.tolist()
+        return [
+            {name: (None if value != value else value) for name, value in zip(COLUMNS, row)}
+            for row in rows
+        ]
+
+
+# ============= 单系统环形缓冲区 =============
+class MetricsRing:
+    """
+    固定容量的列式环形缓冲区
+
+    缓冲区长度为 2 * capacity，每个点同时写入 i 和 i + capacity 两个位置，
+    因此最近任意 n 个点在内存中总是连续的，窗口查询无需拼接或拷贝。
+    追加的时间戳应单调不减（窗口按时间二分查找，恢复时也依赖这一点）
+    """
+
+    def __init__(self, capacity: int, buffer: Optional[np.ndarray] = None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+
+        if buffer is None:
+            buffer = np.full((len(COLUMNS), 2 * capacity), np.nan, dtype=np.float64)
+            self._pos = 0
+            self._size = 0
+        else:
+            if buffer.shape != (len(COLUMNS), 2 * capacity):
+                raise ValueError(f"Buffer shape {buffer.shape} does not match capacity {capacity}")
+            self._pos, self._size = self._recover_position(buffer[0, :capacity])
+        self._buffer = buffer
+
+    @staticmethod
+    def _recover_position(timestamps: np.ndarray):
+        # 快照里不单独记录写指针：未写过的槽位时间戳为 NaN，写满后最新点是时间戳最大的槽位
+        filled = int(np.count_nonzero(~np.isnan(timestamps)))
+        capacity = len(timestamps)
+        if filled < capacity:
+            return filled, filled
+        newest = capacity - 1 - int(np.argmax(timestamps[::-1]))
+        return (newest + 1) % capacity, capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self,
+        timestamp: float,
+        response_time_ms: float,
+        error_rate: float,
+        throughput: float,
+        cpu_usage: Optional[float] = None,
+        memory_usage: Optional[float] = None
+    ):
+        row = (
+            timestamp,
+            response_time_ms,
+            error_rate,
+            throughput,
+            np.nan if cpu_usage is None else cpu_usage,
+            np.nan if memory_usage is None else memory_usage
+        )
+        pos = self._pos
+        self._buffer[:, pos] = row
+        self._buffer[:, pos + self.capacity] = row
+        self._pos = pos + 1 if pos + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+
+    @property
+    def full(self) -> bool:
+        return self._size == self.capacity
+
+    def grow(self, capacity: int):
+        """扩容到 capacity，保留已有的点（旧缓冲区上的窗口视图不受影响）"""
+        if capacity <= self.capacity:
+            return
+        data = self.window().data
+        buffer = np.full((len(COLUMNS), 2 * capacity), np.nan, dtype=np.float64)
+        n = data.shape[1]
+        buffer[:, :n] = data
+        buffer[:, capacity:capacity + n] = data
+        self._buffer = buffer
+        self.capacity = capacity
+        self._pos = n
+        self._size = n
+
+    def window(self, last: Optional[int] = None, since: Optional[float] = None) -> MetricsWindow:
+        """
+        最近的一段数据（按时间升序）
+
+        Args:
+            last: 最多返回最近多少个点
+            since: 只返回时间戳 >= since 的点（Unix 秒）
+        """
+        n = self._size if last is None else min(last, self._size)
+        end = self._pos + self.capacity
+        view = self._buffer[:, end - n:end]
+        if since is not None:
+            view = view[:, int(np.searchsorted(view[0], since, side="left")):]
+        return MetricsWindow(view)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        if not self._size:
+            return None
+        return self.window(last=1).to_dicts()[0]
+
+    @property
+    def buffer(self) -> np.ndarray:
+        return self._buffer
+
+
+# ============= 多系统存储 =============
+class MetricsStore:
+    """
+    按系统划分的指标时序存储
+
+    每个系统的环形缓冲区从 INITIAL_CAPACITY 个点开始，写满后按需翻倍，
+    最多 max_points_per_system 个点；所有缓冲区总大小不超过 memory_budget_bytes：
+    预算用完后已有缓冲区不再扩容、继续循环覆盖，新系统被拒绝（ValueError）。
+    max_systems 同样受预算约束，不超过预算能容纳的初始缓冲区个数
+
+    使用方法:
+    store = MetricsStore()
+    store.append_metrics(metrics)                 # PerformanceMetrics
+    window = store.window("prometheus", since=time.time() - 3600)
+    window["response_time_ms"].mean()
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        max_systems: int = DEFAULT_MAX_SYSTEMS,
+        max_points_per_system: int = DEFAULT_MAX_POINTS_PER_SYSTEM
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.capacity = max(1, max_points_per_system)
+        self._initial_capacity = min(INITIAL_CAPACITY, self.capacity)
+        self.max_systems = min(max_systems, memory_budget_bytes // (self._initial_capacity * _BYTES_PER_POINT))
+        self.logger = logging.getLogger(__name__)
+        self._rings: Dict[str, MetricsRing] = {}
+        self._allocated = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    def _ring(self, system: str) -> MetricsRing:
+        ring = self._rings.get(system)
+        if ring is None:
+            if len(self._rings) >= self.max_systems:
+                raise ValueError(f"Metrics store is limited to {self.max_systems} systems")
+            nbytes = self._initial_capacity * _BYTES_PER_POINT
+            if self._allocated + nbytes > self.memory_budget_bytes:
+                raise ValueError(f"Metrics store memory budget of {self.memory_budget_bytes} bytes is exhausted")
+            ring = self._rings[system] = MetricsRing(self._initial_capacity)
+            self._allocated += nbytes
+        elif ring.full and ring.capacity < self.capacity:
+            capacity = min(2 * ring.capacity, self.capacity)
+            extra = (capacity - ring.capacity) * _BYTES_PER_POINT
+            if self._allocated + extra <= self.memory_budget_bytes:
+                ring.grow(capacity)
+                self._allocated += extra
+        return ring
+
+    def append(self, system: str, timestamp: float, **values: Optional[float]):
+        with self._lock:
+            self._ring(system).append(timestamp, **values)
+            self._dirty = True
+
+    def append_metrics(self, metrics: Any):
+        """追加一条 PerformanceMetrics"""
+        self.append(
+            metrics.system,
+            metrics.timestamp.timestamp(),
+            response_time_ms=metrics.response_time_ms,
+            error_rate=metrics.error_rate,
+            throughput=metrics.throughput,
+            cpu_usage=metrics.cpu_usage,
+            memory_usage=metrics.memory_usage
+        )
+
+    def window(self, system: str, last: Optional[int] = None, since: Optional[float] = None) -> MetricsWindow:
+        with self._lock:
+            ring = self._rings.get(system)
+            if ring is None:
+                return MetricsWindow(np.empty((len(COLUMNS), 0), dtype=np.float64))
+            return ring.window(last=last, since=since)
+
+    def latest(self, system: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ring = self._rings.get(system)
+            return ring.latest() if ring is not None else None
+
+    def systems(self) -> List[str]:
+        return list(self._rings)
+
+    def __len__(self) -> int:
+        return sum(len(ring) for ring in self._rings.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ring.buffer.nbytes for ring in self._rings.values())
+
+    # ----- 快照 -----
+    @staticmethod
+    def _snapshot_file(directory: str, system: str) -> str:
+        return os.path.join(directory, f"{system}.npy")
+
+    def snapshot(self, directory: str):
+        """把每个系统的缓冲区原子写入 <directory>/<system>.npy（内存映射格式）"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            buffers = {system: ring.buffer.copy() for system, ring in self._rings.items()}
+            self._dirty = False
+
+        for system, buffer in buffers.items():
+            path = self._snapshot_file(directory, system)
+            tmp_path = f"{path}.tmp"
+            mapped = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float64, shape=buffer.shape)
+            mapped[:] = buffer
+            mapped.flush()
+            del mapped
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def restore(
+        cls,
+        directory: str,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        max_systems: int = DEFAULT_MAX_SYSTEMS,
+        max_points_per_system: int = DEFAULT_MAX_POINTS_PER_SYSTEM
+    ) -> "MetricsStore":
+        """
+        从快照目录恢复
+
+        缓冲区以写时复制方式映射，启动时不读取整个文件，页面在首次访问时才载入；
+        容量超过 max_points_per_system 或超出内存预算的快照会被跳过
+        """
+        store = cls(memory_budget_bytes, max_systems, max_points_per_system)
+        if not os.path.isdir(directory):
+            return store
+
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".npy") or len(store._rings) >= store.max_systems:
+                continue
+            system = name[:-len(".npy")]
+            try:
+                buffer = np.load(os.path.join(directory, name), mmap_mode="c")
+                capacity = buffer.shape[1] // 2 if buffer.ndim == 2 else 0
+                if capacity > store.capacity:
+                    raise ValueError(f"capacity {capacity} exceeds {store.capacity}")
+                if store._allocated + buffer.nbytes > store.memory_budget_bytes:
+                    raise ValueError("memory budget exhausted")
+                store._rings[system] = MetricsRing(capacity, buffer=buffer)
+                store._allocated += buffer.nbytes
+            except (OSError, ValueError) as e:
+                store.logger.warning(f"Skipping metrics snapshot {name}: {e}")
+        return store
+
+    def start_snapshots(self, directory: str, interval: float = 60.0):
+        """后台定期快照（仅在有新数据时写盘）"""
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            while not self._snapshot_stop.wait(interval):
+                if self._dirty:
+                    try:
+                        self.snapshot(directory)
+                    except Exception as e:
+                        self.logger.error(f"Failed to snapshot metrics store: {e}")
+
+        self._snapshot_thread = threading.Thread(target=run, name="metrics-store-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self):
+        self._snapshot_stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    store = MetricsStore(memory_budget_bytes=1024 * 1024, max_systems=4, max_points_per_system=2000)
+    print(f"\n🗄️  指标存储测试: 每个系统容量 {store.capacity} 个点")
+
+    now = time.time()
+    points = store.capacity * 3
+    started = time.perf_counter()
+    for i in range(points):
+        store.append(
+            "prometheus", now + i,
+            response_time_ms=30.0 + i % 50, error_rate=0.01, throughput=1000.0, cpu_usage=40.0
+        )
+    elapsed = time.perf_counter() - started
+    print(f"  追加 {points} 个点: {elapsed / points * 1e6:.2f}µs/点，内存 {store.nbytes / 1024:.0f}KiB")
+
+    window = store.window("prometheus", since=now + points - 100)
+    print(f"  最近 100 秒: {len(window)} 个点，共享内存: {np.shares_memory(window.data, store._rings['prometheus'].buffer)}")
+    assert np.all(np.diff(store.window("prometheus").timestamps) == 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store.snapshot(directory)
+        started = time.perf_counter()
+        restored = MetricsStore.restore(directory, memory_budget_bytes=1024 * 1024, max_systems=4, max_points_per_system=2000)
+        print(f"  快照恢复: {(time.perf_counter() - started) * 1000:.2f}ms")
+        assert restored.latest("prometheus") == store.latest("prometheus")
+        restored.append("prometheus", now + points, response_time_ms=1.0, error_rate=0.0, throughput=1.0)
+        print(f"  恢复后最新点: {restored.latest('prometheus')['response_time_ms']}ms")
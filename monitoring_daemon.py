@@ -0,0 +1,475 @@
+"""
+监控守护进程
+在一个事件循环上按系统调度指标采集、错误日志同步与健康评分：
+间隔带随机抖动，同一目标的重叠采集合并为一次，失败后指数退避，调度状态持久化以便重启后立即续跑
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+JOB_KINDS = ("metrics", "errors", "health")
+
+DEFAULT_INTERVALS = {
+    "metrics": 30.0,
+    "errors": 60.0,
+    "health": 60.0,
+}
+
+# 只有这些系统有错误日志可同步
+ERROR_LOG_SYSTEMS = ("langfuse",)
+
+DEFAULT_JITTER = 0.1
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_JOB_TIMEOUT_SECONDS = 30.0
+DEFAULT_MAX_BACKOFF_SECONDS = 600.0
+DEFAULT_SCORE_INTERVAL_SECONDS = 5.0
+DEFAULT_SAVE_INTERVAL_SECONDS = 10.0
+
+
+@dataclass
+class CollectorJob:
+    """一个周期性采集任务"""
+    kind: str
+    system: str
+    interval: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.system}"
+
+
+@dataclass
+class JobState:
+    """任务的调度状态（持久化）；时间均为 Unix 秒"""
+    next_run: float = 0.0
+    consecutive_failures: int = 0
+    runs: int = 0
+    last_success: Optional[float] = None
+    last_error: Optional[str] = None
+    last_duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JobState":
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__ if name in data})
+
+
+class MonitoringDaemon:
+    """
+    监控守护进程
+
+    使用方法:
+    daemon = MonitoringDaemon(agent, targets=["langfuse", "prometheus"], state_file="daemon_state.json")
+    daemon.start()                      # 在后台线程中运行自己的事件循环
+    ...
+    daemon.stop()
+
+    或在已有事件循环中: await daemon.run()
+
+    阻塞的 Agent 调用在线程池中执行，并发数由 max_concurrency 限制；
+    health 任务只收集指标，评分每隔 score_interval 对收集到的所有系统批量进行一次
+    """
+
+    def __init__(
+        self,
+        agent: Any,
+        targets: Optional[Iterable[str]] = None,
+        intervals: Optional[Dict[str, float]] = None,
+        jitter: float = DEFAULT_JITTER,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_JOB_TIMEOUT_SECONDS,
+        max_backoff: float = DEFAULT_MAX_BACKOFF_SECONDS,
+        state_file: Optional[str] = None,
+        time_range: str = "1h",
+        score_interval: float = DEFAULT_SCORE_INTERVAL_SECONDS,
+        save_interval: float = DEFAULT_SAVE_INTERVAL_SECONDS
+    ):
+        self.agent = agent
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.state_file = state_file
+        self.time_range = time_range
+        self.score_interval = score_interval
+        self.save_interval = save_interval
+        self.logger = logging.getLogger(__name__)
+
+        self.jobs: Dict[str, CollectorJob] = {}
+        self.states: Dict[str, JobState] = self._load_state()
+        self.latest_metrics: Dict[str, Tuple[float, Any]] = {}   # system -> (采集时间, PerformanceMetrics)
+        self.reports: Dict[str, Any] = {}                         # system -> 最近一次 HealthReport
+        self.on_health_change: List[Callable[[Any], None]] = []
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._running_jobs: Dict[str, asyncio.Task] = {}
+        self._pending_health: Dict[str, Any] = {}
+        self._health_failures: Dict[str, str] = {}
+        self._dirty = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+        for system in targets or []:
+            self.add_target(system)
+
+    # ----- 目标 -----
+    def _call_in_loop(self, fn: Callable[..., Any], *args: Any) -> bool:
+        """运行中且不在事件循环线程时，把调用转到事件循环里执行；返回是否已转交"""
+        loop = self._loop
+        if loop is None:
+            return False
+        try:
+            if asyncio.get_running_loop() is loop:
+                return False
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(fn, *args)
+        return True
+
+    def add_target(self, system: str, intervals: Optional[Dict[str, float]] = None):
+        """
+        添加一个系统的所有采集任务（可在任意线程调用）
+
+        有持久化状态的任务按保存的 next_run 续跑（已过期则立即执行）；
+        新任务在第一个抖动窗口内随机错开，避免几百个目标同时启动
+        """
+        if not self._call_in_loop(self._add_target, system, intervals):
+            self._add_target(system, intervals)
+
+    def _add_target(self, system: str, intervals: Optional[Dict[str, float]]):
+        intervals = {**self.intervals, **(intervals or {})}
+        now = time.time()
+        for kind in JOB_KINDS:
+            if kind == "errors" and system not in ERROR_LOG_SYSTEMS:
+                continue
+            job = CollectorJob(kind, system, intervals[kind])
+            self.jobs[job.key] = job
+            state = self.states.get(job.key)
+            if state is None:
+                state = self.states[job.key] = JobState(next_run=now + random.uniform(0, job.interval * self.jitter))
+            self._schedule(job.key, max(state.next_run, now))
+
+    def remove_target(self, system: str):
+        """移除一个系统的所有采集任务（可在任意线程调用）"""
+        if not self._call_in_loop(self._remove_target, system):
+            self._remove_target(system)
+
+    def _remove_target(self, system: str):
+        for key in [key for key, job in self.jobs.items() if job.system == system]:
+            del self.jobs[key]
+            self.states.pop(key, None)
+        self.latest_metrics.pop(system, None)
+        self._dirty = True
+
+    def _schedule(self, key: str, when: float):
+        # 只在事件循环线程（或启动前）调用；堆中的旧条目不删除，弹出时与 state.next_run 比对后丢弃
+        self.states[key].next_run = when
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, key))
+        self._dirty = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def _next_delay(self, job: CollectorJob, state: JobState) -> float:
+        if state.consecutive_failures:
+            # 指数退避，取 [backoff/2, backoff] 之间的随机值，避免失败的目标同时重试
+            backoff = min(job.interval * 2 ** (state.consecutive_failures - 1), self.max_backoff)
+            return random.uniform(backoff / 2, backoff)
+        return job.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    # ----- 合并执行 -----
+    async def _coalesced(self, key: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        在线程池中执行 fn；同一 key 已在执行时直接等待那一次的结果
+
+        超时只结束等待，线程里的调用继续运行并保持占用该 key，后续请求仍会合并到它上面
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            async def call():
+                async with self._semaphore:
+                    return await self._loop.run_in_executor(self._executor, fn, *args)
+
+            future = asyncio.ensure_future(call())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def collect_metrics(self, system: str) -> Any:
+        metrics_list = await self._coalesced(
+            f"fetch:{system}", self.agent.get_performance_metrics, system, self.time_range, False
+        )
+        if not metrics_list:
+            raise RuntimeError(f"No metrics returned for {system}")
+        self.latest_metrics[system] = (time.time(), metrics_list[0])
+        return metrics_list[0]
+
+    # ----- 任务 -----
+    async def _run_metrics(self, job: CollectorJob):
+        await self.collect_metrics(job.system)
+
+    async def _run_errors(self, job: CollectorJob):
+        # 错误同步是进程级的（所有错误日志系统共用一个游标），按固定 key 合并
+        await self._coalesced("errors", self.agent.error_sync.sync)
+
+    async def _run_health(self, job: CollectorJob):
+        # 指标任务刚采集过时直接复用，否则采集一次（与正在进行的指标采集合并）
+        latest = self.latest_metrics.get(job.system)
+        fresh_for = self.jobs.get(f"metrics:{job.system}", job).interval
+        try:
+            if latest is not None and time.time() - latest[0] < fresh_for:
+                metrics = latest[1]
+            else:
+                metrics = await self.collect_metrics(job.system)
+        except Exception as e:
+            self._pending_health[job.system] = None
+            self._health_failures[job.system] = str(e) or type(e).__name__
+            raise
+        self._pending_health[job.system] = metrics
+        self._health_failures.pop(job.system, None)
+
+    async def _execute(self, job: CollectorJob):
+        state = self.states[job.key]
+        started = time.time()
+        try:
+            await getattr(self, f"_run_{job.kind}")(job)
+        except Exception as e:
+            state.consecutive_failures += 1
+            state.last_error = f"{type(e).__name__}: {e}"
+            self.logger.warning(f"{job.key} failed ({state.consecutive_failures} in a row): {state.last_error}")
+        else:
+            state.consecutive_failures = 0
+            state.last_success = time.time()
+            state.last_error = None
+        finally:
+            state.runs += 1
+            state.last_duration = time.time() - started
+            self._running_jobs.pop(job.key, None)
+            # 下一次从本次结束时开始计时，同一任务不会与自己重叠
+            if job.key in self.jobs:
+                self._schedule(job.key, time.time() + self._next_delay(job, state))
+
+    async def trigger(self, kind: str, system: str) -> None:
+        """立即执行一次任务；已在执行时等待那一次完成"""
+        key = f"{kind}:{system}"
+        running = self._running_jobs.get(key)
+        if running is not None:
+            await asyncio.shield(running)
+            return
+        job = self.jobs[key]
+        task = self._running_jobs[key] = asyncio.ensure_future(self._execute(job))
+        await asyncio.shield(task)
+
+    # ----- 主循环 -----
+    async def _scheduler(self):
+        while not self._stopping.is_set():
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                when, _, key = heapq.heappop(self._heap)
+                state = self.states.get(key)
+                job = self.jobs.get(key)
+                if job is None or state is None or state.next_run != when:
+                    continue
+                if key in self._running_jobs:
+                    # 上一次还没结束（例如被 trigger 启动）：合并，结束时会重新排期
+                    continue
+                self._running_jobs[key] = asyncio.ensure_future(self._execute(job))
+
+            delay = self._heap[0][0] - time.time() if self._heap else 60.0
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(delay, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _score_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.score_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._pending_health:
+                continue
+            pending, self._pending_health = self._pending_health, {}
+            failures = {system: self._health_failures[system] for system in pending if system in self._health_failures}
+            try:
+                changed = await self._loop.run_in_executor(
+                    self._executor, self.agent.score_fleet, pending, None, failures
+                )
+            except Exception as e:
+                self.logger.error(f"Health scoring failed: {e}")
+                continue
+            self.reports.update(changed)
+            for report in changed.values():
+                for callback in self.on_health_change:
+                    try:
+                        callback(report)
+                    except Exception as e:
+                        self.logger.error(f"Health change callback failed: {e}")
+
+    async def _save_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.save_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._dirty:
+                self.save_state()
+
+    async def run(self):
+        """在当前事件循环中运行，直到 stop()"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="monitoring-daemon")
+        telemetry = getattr(self.agent, "telemetry", None)
+        if telemetry is not None:
+            telemetry.attach_event_loop(self._loop)
+
+        try:
+            await asyncio.gather(self._scheduler(), self._score_loop(), self._save_loop())
+        finally:
+            for task in list(self._running_jobs.values()):
+                task.cancel()
+            if telemetry is not None:
+                telemetry.detach_event_loop(self._loop)
+            self._executor.shutdown(wait=False)
+            self.save_state()
+            self._loop = None
+            self._wake = None
+
+    def request_stop(self):
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self) -> "MonitoringDaemon":
+        """在后台线程中启动独立的事件循环"""
+        if self._thread is not None:
+            return self
+        ready = threading.Event()
+
+        async def main():
+            # run() 在第一次 await 之前完成初始化，ready 在其后触发
+            asyncio.get_running_loop().call_soon(ready.set)
+            await self.run()
+
+        self._thread = threading.Thread(target=lambda: asyncio.run(main()), name="monitoring-daemon", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        self.request_stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ----- 持久化 -----
+    def _load_state(self) -> Dict[str, JobState]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable daemon state {self.state_file}: {e}")
+            return {}
+        return {key: JobState.from_dict(item) for key, item in data.get("jobs", {}).items()}
+
+    def save_state(self):
+        """原子写入调度状态"""
+        if not self.state_file:
+            return
+        self._dirty = False
+        data = {"saved_at": time.time(), "jobs": {key: state.to_dict() for key, state in self.states.items()}}
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            self.logger.error(f"Failed to save daemon state: {e}")
+
+    # ----- 查询 -----
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "job": key,
+                "interval": job.interval,
+                "running": key in self._running_jobs,
+                "due_in": round(self.states[key].next_run - now, 3),
+                **self.states[key].to_dict()
+            }
+            for key, job in sorted(list(self.jobs.items()))
+        ]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from datetime import datetime
+    from types import SimpleNamespace
+
+    logging.basicConfig(level=logging.ERROR)
+
+    class _DemoAgent:
+        """模拟 Agent：部分目标很慢或总是失败"""
+
+        def __init__(self):
+            self.fetches = 0
+            self.error_sync = SimpleNamespace(sync=lambda: 0)
+
+        def get_performance_metrics(self, system, time_range, use_cache):
+            self.fetches += 1
+            if system.endswith("-7"):
+                raise RuntimeError("connection refused")
+            time.sleep(random.uniform(0.01, 0.05))
+            return [SimpleNamespace(system=system, timestamp=datetime.now(), response_time_ms=100.0)]
+
+        def score_fleet(self, metrics, requested, failures):
+            return {system: f"{system}: {'unknown' if m is None else 'healthy'}" for system, m in metrics.items()}
+
+    agent = _DemoAgent()
+    targets = [f"svc-{i}" for i in range(300)]
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, "state.json")
+        daemon = MonitoringDaemon(
+            agent, targets, intervals={"metrics": 1.0, "health": 2.0}, state_file=state_file, score_interval=0.5
+        )
+        changes = []
+        daemon.on_health_change.append(changes.append)
+
+        print(f"\n🛰️  守护进程测试: {len(targets)} 个目标，{len(daemon.jobs)} 个任务")
+        daemon.start()
+        time.sleep(4.0)
+        daemon.stop()
+
+        failing = [s for s in daemon.status() if s["job"] == "metrics:svc-7"][0]
+        print(f"  4 秒内采集 {agent.fetches} 次，健康状态变化 {len(changes)} 次")
+        print(f"  失败目标 svc-7: 连续失败 {failing['consecutive_failures']} 次，下次执行 {failing['due_in']:.1f}s 后")
+
+        restarted = MonitoringDaemon(agent, targets, intervals={"metrics": 1.0, "health": 2.0}, state_file=state_file)
+        print(f"  重启后恢复 {len(restarted.states)} 个任务状态，svc-7 退避保持: {restarted.states['metrics:svc-7'].consecutive_failures}")
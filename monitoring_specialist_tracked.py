@@ -4,7 +4,13 @@ Monitoring Specialist Agent (带 Langfuse 追踪)
 """
 
 import os
+import time
+import base64
+import contextvars
+import threading
 import requests
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from enum import Enum
@@ -12,6 +18,19 @@ from dataclasses import dataclass
 
 # 导入追踪基类
 from agent_tracking_base import TrackedAgent, track_agent_action, langfuse_track
+from alerting import DEFAULT_ALERT_RULES, AlertEngine, AlertRule, AlertSink, LoggingSink, RuleKind
+from error_clusters import SEVERITY_LEVELS, ErrorClusterIndex, LangfuseErrorSync
+from metrics_cache import MetricsCache, ttl_for_range
+from health_scoring import HealthRule, HealthScorer
+from log_tail_ingest import LogTailIngester
+from metrics_exporter import record_health_scores
+from monitoring_daemon import MonitoringDaemon
+from metrics_rollup import MetricsRollup
+from metrics_store import MetricsStore
+from prometheus_query import PrometheusClient, avg_over_time, increase, parse_duration, rate
+from quantile_sketch import DDSketch
+from self_telemetry import get_sampler
+from trend_analysis import TrendAnalyzer
 
 
 # ============= Agent 职能定义 =============
@@ -48,7 +67,30 @@ class MonitoringRole:
     ]
 
 
+# 批量健康报告的并发度与单目标默认超时
+REPORT_MAX_WORKERS = 32
+DEFAULT_REPORT_TIMEOUT_SECONDS = 10.0
+
+# 只有这一时间范围的聚合记入历史与告警：不同范围的平均值混在一条序列里会破坏趋势与变点检测
+HISTORY_TIME_RANGE = "1h"
+
+# Prometheus 原始序列查询；聚合（rate/avg）在本地向量化完成
+DEFAULT_PROMETHEUS_QUERIES = {
+    "requests": "http_requests_total",                      # 计数器
+    "errors": 'http_requests_total{status=~"5.."}',         # 计数器
+    "latency_sum": "http_request_duration_seconds_sum",     # 计数器（秒）
+    "latency_count": "http_request_duration_seconds_count", # 计数器
+    "latency_buckets": "http_request_duration_seconds_bucket",  # 直方图桶计数器（按 le 分组得到分布）
+    "cpu": '100 * (1 - rate(node_cpu_seconds_total{mode="idle"}[1m]))',           # 百分比
+    "memory": "100 * (1 - node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)"  # 百分比
+}
+
+
 # ============= 数据模型 =============
+class MetricsUnavailableError(RuntimeError):
+    """后端不可用或系统没有数据来源；不返回默认值，由调用方按 UNKNOWN 处理"""
+
+
 class MonitoringSystem(Enum):
     """监控系统类型"""
     LANGFUSE = "langfuse"
@@ -76,19 +118,78 @@ class PerformanceMetrics:
     throughput: float
     cpu_usage: Optional[float] = None
     memory_usage: Optional[float] = None
+    # 响应时间分布（毫秒）；后端只给出均值时为 None
+    response_time_sketch: Optional[DDSketch] = None
+    
+    def response_time_quantile(self, q: float) -> Optional[float]:
+        if self.response_time_sketch is None:
+            return None
+        return self.response_time_sketch.quantile(q)
+    
+    @property
+    def response_time_p95_ms(self) -> Optional[float]:
+        return self.response_time_quantile(0.95)
+    
+    @property
+    def response_time_p99_ms(self) -> Optional[float]:
+        return self.response_time_quantile(0.99)
     
     def to_dict(self) -> Dict[str, Any]:
+        sketch = self.response_time_sketch
         return {
             "system": self.system,
             "timestamp": self.timestamp.isoformat(),
             "response_time_ms": self.response_time_ms,
+            "response_time_p50_ms": self.response_time_quantile(0.50),
+            "response_time_p95_ms": self.response_time_p95_ms,
+            "response_time_p99_ms": self.response_time_p99_ms,
             "error_rate": self.error_rate,
             "throughput": self.throughput,
             "cpu_usage": self.cpu_usage,
-            "memory_usage": self.memory_usage
+            "memory_usage": self.memory_usage,
+            "response_time_sketch": base64.b64encode(sketch.to_bytes()).decode("ascii") if sketch is not None else None
         }
 
 
+def merge_performance_metrics(
+    metrics_list: List[PerformanceMetrics],
+    system: Optional[str] = None
+) -> PerformanceMetrics:
+    """
+    合并同一时间窗口内多个节点的指标
+    
+    吞吐量相加，响应时间均值与错误率按吞吐量加权，CPU/内存取平均；
+    分位数来自合并后的草图，而不是对各节点的 p99 求平均
+    """
+    if not metrics_list:
+        raise ValueError("No metrics to merge")
+    throughput = np.array([m.throughput for m in metrics_list], dtype=np.float64)
+    weights = throughput if throughput.sum() > 0 else np.ones(len(metrics_list))
+    
+    def mean_of(name: str) -> Optional[float]:
+        values = [getattr(m, name) for m in metrics_list if getattr(m, name) is not None]
+        return float(np.mean(values)) if values else None
+    
+    sketch = None
+    for m in metrics_list:
+        if m.response_time_sketch is not None:
+            if sketch is None:
+                sketch = m.response_time_sketch.copy()
+            else:
+                sketch.merge(m.response_time_sketch)
+    
+    return PerformanceMetrics(
+        system=system or metrics_list[0].system,
+        timestamp=max(m.timestamp for m in metrics_list),
+        response_time_ms=float(np.average([m.response_time_ms for m in metrics_list], weights=weights)),
+        error_rate=float(np.average([m.error_rate for m in metrics_list], weights=weights)),
+        throughput=float(throughput.sum()),
+        cpu_usage=mean_of("cpu_usage"),
+        memory_usage=mean_of("memory_usage"),
+        response_time_sketch=sketch
+    )
+
+
 @dataclass
 class HealthReport:
     """健康报告"""
@@ -117,7 +218,9 @@ class MonitoringSpecialist(TrackedAgent):
     def __init__(
         self,
         agent_id: str = "monitoring_spec_001",
-        monitoring_system: MonitoringSystem = MonitoringSystem.LANGFUSE
+        monitoring_system: MonitoringSystem = MonitoringSystem.LANGFUSE,
+        metrics_snapshot_dir: Optional[str] = None,
+        error_index_file: Optional[str] = None
     ):
         # 初始化追踪基类
         super().__init__(
@@ -139,12 +242,71 @@ class MonitoringSpecialist(TrackedAgent):
                 "secret_key": os.getenv("LANGFUSE_SECRET_KEY", "")
             },
             MonitoringSystem.PROMETHEUS: {
-                "host": os.getenv("PROMETHEUS_HOST", "http://localhost:9090")
+                "host": os.getenv("PROMETHEUS_HOST", "http://localhost:9090"),
+                "queries": dict(DEFAULT_PROMETHEUS_QUERIES)
             },
             MonitoringSystem.GRAFANA: {
                 "host": os.getenv("GRAFANA_HOST", "http://localhost:3001")
             }
         }
+        
+        self.prometheus = PrometheusClient(self.system_configs[MonitoringSystem.PROMETHEUS]["host"])
+        
+        # 指标历史（每个系统一个环形缓冲区），配置了快照目录时从上次快照恢复并定期落盘
+        self.metrics_snapshot_dir = metrics_snapshot_dir
+        if metrics_snapshot_dir:
+            self.metrics_store = MetricsStore.restore(metrics_snapshot_dir)
+            self.metrics_store.start_snapshots(metrics_snapshot_dir)
+        else:
+            self.metrics_store = MetricsStore()
+        self._history_rejected = set()
+        
+        # 1m/5m/1h 多分辨率汇总：长时间范围的查询与趋势分析读汇总桶，而不是原始点
+        if metrics_snapshot_dir:
+            rollup_dir = os.path.join(metrics_snapshot_dir, "rollups")
+            self.metrics_rollup = MetricsRollup.restore(rollup_dir, self.metrics_store)
+            if not self.metrics_rollup.systems():
+                for name in self.metrics_store.systems():
+                    self.metrics_rollup.backfill(name, self.metrics_store.window(name))
+            self.metrics_rollup.start_snapshots(rollup_dir)
+        else:
+            self.metrics_rollup = MetricsRollup(self.metrics_store)
+        self.trend_analyzer = TrendAnalyzer(self.metrics_store)
+        self._tier_trend_analyzers = {
+            tier.name: TrendAnalyzer(tier) for tier in self.metrics_rollup.tiers
+        }
+        
+        # 指标缓存：新鲜期随时间范围变化，过期后后台刷新
+        self.metrics_cache = MetricsCache(
+            loader=self._fetch_metrics,
+            ttl_for=lambda key: ttl_for_range(key[1])
+        )
+        
+        # 错误聚类索引：按游标增量同步，配置了文件时持久化游标与聚类
+        self.error_index = ErrorClusterIndex.load(error_index_file) if error_index_file else ErrorClusterIndex()
+        self.error_sync = LangfuseErrorSync(
+            self.system_configs[MonitoringSystem.LANGFUSE],
+            self.error_index,
+            index_file=error_index_file
+        )
+        
+        # 进程自身遥测（进程内共享一个后台采样器），用于 custom 系统的指标
+        self.telemetry = get_sampler()
+        
+        # 本地 JSONL 日志尾随采集（start_log_ingest 启动），没有 Langfuse 服务时的数据来源
+        self.log_ingester: Optional[LogTailIngester] = None
+        
+        # 健康评分：声明式规则编译为向量化求值
+        self.health_scorer = HealthScorer(make_report=self._make_report)
+        
+        # 告警：每个新获取的指标点都增量求值一次规则
+        self.alert_engine = AlertEngine(rules=DEFAULT_ALERT_RULES, sinks=[LoggingSink()])
+        if any(rule.kind is RuleKind.ABSENCE for rule in DEFAULT_ALERT_RULES):
+            self.alert_engine.start()
+        
+        # 批量健康报告共用的线程池（首次使用时创建）
+        self._report_executor: Optional[ThreadPoolExecutor] = None
+        self._report_pool_lock = threading.Lock()
     
     @track_agent_action("获取系统列表")
     def get_system_list(self) -> List[str]:
@@ -155,44 +317,130 @@ class MonitoringSpecialist(TrackedAgent):
     def get_performance_metrics(
         self,
         system: Optional[str] = None,
-        time_range: str = "1h"
+        time_range: str = "1h",
+        use_cache: bool = True
     ) -> List[PerformanceMetrics]:
         """
         获取性能指标 - 自动追踪到 Langfuse
         
+        默认走 (系统, 时间范围) 缓存：过期后先返回旧值，由后台刷新
+        
         Args:
             system: 系统名称（None 表示所有系统）
             time_range: 时间范围（如 "1h", "24h", "7d"）
+            use_cache: False 时绕过缓存直接查询后端
         """
         metrics_list = []
         
         target_system = system or self.monitoring_system.value
         
         try:
-            if target_system == MonitoringSystem.LANGFUSE.value:
-                metrics = self._get_langfuse_metrics(time_range)
-                metrics_list.append(metrics)
-            
-            elif target_system == MonitoringSystem.PROMETHEUS.value:
-                metrics = self._get_prometheus_metrics(time_range)
-                metrics_list.append(metrics)
-            
+            if use_cache:
+                metrics = self.metrics_cache.get((target_system, time_range))
             else:
-                # 通用系统
-                metrics = PerformanceMetrics(
-                    system=target_system,
-                    timestamp=datetime.now(),
-                    response_time_ms=100.0,
-                    error_rate=0.01,
-                    throughput=1000.0
-                )
-                metrics_list.append(metrics)
+                metrics = self._fetch_metrics((target_system, time_range))
+            metrics_list.append(metrics)
         
         except Exception as e:
             print(f"获取指标失败: {e}")
         
         return metrics_list
     
+    def _fetch_metrics(self, key) -> PerformanceMetrics:
+        """从后端获取一次指标（缓存的加载函数）；HISTORY_TIME_RANGE 的结果记入历史并求值告警"""
+        target_system, time_range = key
+        
+        if target_system == MonitoringSystem.LANGFUSE.value:
+            metrics = self._get_langfuse_metrics(time_range)
+        
+        elif target_system == MonitoringSystem.PROMETHEUS.value:
+            metrics = self._get_prometheus_metrics(time_range)
+        
+        elif target_system == MonitoringSystem.CUSTOM.value:
+            metrics = self._get_custom_metrics()
+        
+        elif self.log_ingester is not None and target_system in self.log_ingester.systems():
+            # 采集器已把每个时间桶写入历史，这里只汇总，不再追加
+            metrics = self._get_ingested_metrics(target_system, time_range)
+            if self._is_history_range(time_range):
+                self.alert_engine.observe_metrics(metrics)
+            return metrics
+        
+        else:
+            # 没有数据来源的系统不编造指标，评分为 UNKNOWN
+            raise MetricsUnavailableError(f"No metrics source for system {target_system}")
+        
+        if not self._is_history_range(time_range):
+            return metrics
+        
+        try:
+            self.metrics_store.append_metrics(metrics)
+            self.metrics_rollup.append_metrics(metrics)
+        except ValueError as e:
+            # 超出存储上限的系统不记录历史，每个系统只提示一次
+            if target_system not in self._history_rejected:
+                self._history_rejected.add(target_system)
+                print(f"⚠️  {target_system} 的指标历史未记录: {e}")
+        self.alert_engine.observe_metrics(metrics)
+        
+        return metrics
+    
+    @staticmethod
+    def _is_history_range(time_range: str) -> bool:
+        try:
+            return parse_duration(time_range) == parse_duration(HISTORY_TIME_RANGE)
+        except ValueError:
+            return False
+    
+    def add_alert_rule(self, rule: AlertRule):
+        """添加或替换告警规则（按规则名与系统去重）；数据缺失规则需要后台检查线程"""
+        self.alert_engine.add_rule(rule)
+        if rule.kind is RuleKind.ABSENCE:
+            self.alert_engine.start()
+    
+    def add_alert_sink(self, sink: AlertSink):
+        self.alert_engine.sinks.append(sink)
+    
+    def get_active_alerts(self) -> List[Dict[str, Any]]:
+        """当前处于 pending / firing 的告警"""
+        return self.alert_engine.active_alerts()
+    
+    @track_agent_action("获取指标历史")
+    def get_metrics_history(
+        self,
+        system: str,
+        time_range: str = "24h",
+        step: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        获取指标历史 - 自动追踪
+        
+        由查询规划器选择数据来源：短范围读原始点，长范围读满足步长的最粗一级汇总
+        
+        Args:
+            system: 系统名称
+            time_range: 时间范围（如 "1h", "7d", "30d"）
+            step: 步长（秒），默认使结果不超过约 2000 个点
+        """
+        range_seconds = parse_duration(time_range)
+        end = time.time()
+        plan = self.metrics_rollup.plan(range_seconds, step, self.metrics_rollup.raw_coverage(system, end))
+        window = self.metrics_rollup.query(system, range_seconds, step, end=end)
+        sketch = window.sketch()
+        return {
+            "system": system,
+            "time_range": time_range,
+            "source": plan.source,
+            "step_seconds": plan.step,
+            "points": window.to_dicts(),
+            "response_time_p95_ms": sketch.quantile(0.95),
+            "response_time_p99_ms": sketch.quantile(0.99)
+        }
+    
+    def get_metrics_cache_stats(self) -> Dict[str, Any]:
+        """指标缓存的命中情况与各条目年龄"""
+        return self.metrics_cache.stats()
+    
     @langfuse_track
     def _get_langfuse_metrics(self, time_range: str) -> PerformanceMetrics:
         """获取 Langfuse 性能指标"""
@@ -207,45 +455,165 @@ class MonitoringSpecialist(TrackedAgent):
                 },
                 params={"range": time_range}
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return PerformanceMetrics(
-                    system="langfuse",
-                    timestamp=datetime.now(),
-                    response_time_ms=data.get("avg_response_time", 0),
-                    error_rate=data.get("error_rate", 0),
-                    throughput=data.get("requests_per_second", 0)
-                )
+        except requests.RequestException as e:
+            raise MetricsUnavailableError(f"Langfuse 指标获取失败: {e}") from e
         
-        except Exception as e:
-            print(f"Langfuse 指标获取失败: {e}")
+        if response.status_code != 200:
+            raise MetricsUnavailableError(f"Langfuse 指标获取失败: HTTP {response.status_code}")
         
-        # 返回默认值
+        data = response.json()
         return PerformanceMetrics(
             system="langfuse",
             timestamp=datetime.now(),
-            response_time_ms=50.0,
-            error_rate=0.005,
-            throughput=500.0
+            response_time_ms=data.get("avg_response_time", 0),
+            error_rate=data.get("error_rate", 0),
+            throughput=data.get("requests_per_second", 0)
         )
     
     @langfuse_track
     def _get_prometheus_metrics(self, time_range: str) -> PerformanceMetrics:
-        """获取 Prometheus 性能指标"""
-        config = self.system_configs[MonitoringSystem.PROMETHEUS]
+        """
+        获取 Prometheus 性能指标
+        
+        每个查询一次范围查询，矩阵直接解码为 NumPy 数组；
+        所有序列的 rate/avg 一次性向量化计算后再汇总
+        """
+        queries = self.system_configs[MonitoringSystem.PROMETHEUS]["queries"]
         
-        # 示例：查询 Prometheus
+        try:
+            end = time.time()
+            matrices = {
+                name: self.prometheus.query_range_for(expr, time_range, end=end)
+                for name, expr in queries.items()
+            }
+            
+            # 吞吐量与错误率：所有序列的速率求和
+            throughput = np.nansum(rate(matrices["requests"]))
+            errors = np.nansum(rate(matrices["errors"]))
+            
+            # 平均响应时间：窗口内耗时总增量 / 请求数总增量
+            latency_seconds = np.nansum(increase(matrices["latency_sum"]))
+            latency_requests = np.nansum(increase(matrices["latency_count"]))
+            
+            return PerformanceMetrics(
+                system="prometheus",
+                timestamp=datetime.now(),
+                response_time_ms=float(latency_seconds / latency_requests * 1000) if latency_requests else 0.0,
+                error_rate=float(errors / throughput) if throughput else 0.0,
+                throughput=float(throughput),
+                cpu_usage=self._mean_gauge(matrices["cpu"]),
+                memory_usage=self._mean_gauge(matrices["memory"]),
+                response_time_sketch=self._latency_sketch(matrices["latency_buckets"]) if "latency_buckets" in matrices else None
+            )
+        
+        except Exception as e:
+            raise MetricsUnavailableError(f"Prometheus 指标获取失败: {e}") from e
+    
+    def _get_custom_metrics(self) -> PerformanceMetrics:
+        """
+        custom 系统: 本进程自身的资源压力
+        
+        CPU / 内存来自后台遥测采样，响应时间与错误率来自本进程被追踪的 Agent 动作
+        """
+        return PerformanceMetrics(
+            system=MonitoringSystem.CUSTOM.value,
+            timestamp=datetime.now(),
+            **self.telemetry.performance_metrics()
+        )
+    
+    def start_log_ingest(self, directory: str = ".", **kwargs) -> LogTailIngester:
+        """
+        开始尾随本地日志（tool_operations*.jsonl、langfuse_traces_*.jsonl）
+        
+        每个工具和追踪项目成为一个系统（如 tool-github、traces-langgraph_demo），
+        可像其他系统一样查询指标、历史与健康度
+        
+        Args:
+            directory: 日志所在目录
+            **kwargs: 传给 LogTailIngester（bucket_seconds, poll_interval, patterns 等）
+        """
+        if self.log_ingester is None:
+            if self.metrics_snapshot_dir:
+                kwargs.setdefault("state_file", os.path.join(self.metrics_snapshot_dir, "log_tail_state.json"))
+            self.log_ingester = LogTailIngester(self.metrics_store, self.metrics_rollup, directory, **kwargs).start()
+        return self.log_ingester
+    
+    def stop_log_ingest(self):
+        if self.log_ingester is not None:
+            self.log_ingester.stop()
+            self.log_ingester = None
+    
+    def close(self):
+        """停止日志采集、告警检查与快照线程，关闭告警 sink 与报告线程池"""
+        self.stop_log_ingest()
+        self.alert_engine.close()
+        self.metrics_rollup.stop_snapshots()
+        self.metrics_store.stop_snapshots()
+        with self._report_pool_lock:
+            if self._report_executor is not None:
+                self._report_executor.shutdown(wait=False)
+                self._report_executor = None
+    
+    def _get_ingested_metrics(self, system: str, time_range: str) -> PerformanceMetrics:
+        """由日志采集写入的时间桶汇总出 time_range 内的指标（按每桶次数加权）"""
+        now = time.time()
+        range_seconds = parse_duration(time_range)
+        window = self.metrics_store.window(system, since=now - range_seconds)
+        counts = window["throughput"] * self.log_ingester.bucket_seconds
+        total = counts.sum()
+        if not len(window) or total <= 0:
+            # 时间范围内没有写入的数据：不补 0，评分为 UNKNOWN
+            raise MetricsUnavailableError(f"No ingested metrics for {system} in the last {time_range}")
+        
+        timed = ~np.isnan(window["response_time_ms"])
+        span = min(range_seconds, now - window.timestamps[0] + self.log_ingester.bucket_seconds)
+        sketch = self.metrics_rollup.query(system, range_seconds, end=now).sketch()
         return PerformanceMetrics(
-            system="prometheus",
+            system=system,
             timestamp=datetime.now(),
-            response_time_ms=30.0,
-            error_rate=0.002,
-            throughput=2000.0,
-            cpu_usage=45.5,
-            memory_usage=62.3
+            # 没有耗时字段的日志（如本地追踪）响应时间记为 0
+            response_time_ms=float(np.average(window["response_time_ms"][timed], weights=counts[timed])) if counts[timed].sum() > 0 else 0.0,
+            error_rate=float((window["error_rate"] * counts).sum() / total),
+            throughput=float(total / span),
+            response_time_sketch=sketch if sketch.count else None
         )
     
+    def get_self_telemetry(self) -> Optional[Dict[str, Any]]:
+        """最近一次进程遥测采样（GC 暂停、线程数、事件循环延迟等）"""
+        sample = self.telemetry.latest()
+        return sample.to_dict() if sample is not None else None
+    
+    @staticmethod
+    def _mean_gauge(matrix) -> Optional[float]:
+        """多条仪表盘序列的时间平均值再取均值；没有数据时返回 None"""
+        if matrix.empty:
+            return None
+        averages = avg_over_time(matrix)
+        if np.isnan(averages).all():
+            return None
+        return float(np.nanmean(averages))
+    
+    @staticmethod
+    def _latency_sketch(matrix) -> Optional[DDSketch]:
+        """
+        直方图桶在窗口内的增量按 le 汇总（所有实例相加）后转换为毫秒分布
+        
+        increase 的外推可能让累计计数略微不单调，先取前缀最大值再差分
+        """
+        if matrix.empty:
+            return None
+        totals: Dict[float, float] = {}
+        for labels, value in zip(matrix.labels, increase(matrix)):
+            if "le" in labels and not np.isnan(value):
+                bound = float(labels["le"])
+                totals[bound] = totals.get(bound, 0.0) + float(value)
+        if not totals:
+            return None
+        bounds = sorted(totals)
+        cumulative = np.maximum.accumulate([totals[bound] for bound in bounds])
+        sketch = DDSketch.from_buckets([bound * 1000 for bound in bounds], np.diff(cumulative, prepend=0.0))
+        return sketch if sketch.count else None
+    
     @track_agent_action("获取错误日志")
     def get_error_logs(
         self,
@@ -274,29 +642,23 @@ class MonitoringSpecialist(TrackedAgent):
         limit: int,
         severity: Optional[str]
     ) -> List[Dict[str, Any]]:
-        """获取 Langfuse 错误日志"""
-        config = self.system_configs[MonitoringSystem.LANGFUSE]
+        """
+        获取 Langfuse 错误日志
         
+        先按游标增量同步新的错误（距上次同步不足间隔时跳过），再从本地聚类索引返回
+        按最近出现时间排序的错误类别
+        """
         try:
-            response = requests.get(
-                f"{config['host']}/api/public/observations",
-                headers={
-                    "Authorization": f"Bearer {config['public_key']}:{config['secret_key']}"
-                },
-                params={
-                    "type": "error",
-                    "limit": limit,
-                    "level": severity
-                }
-            )
-            
-            if response.status_code == 200:
-                return response.json().get("data", [])
-        
+            self.error_sync.sync_if_stale()
         except Exception as e:
-            print(f"错误日志获取失败: {e}")
+            print(f"错误日志同步失败: {e}")
         
-        return []
+        level = SEVERITY_LEVELS.get(severity.lower()) if severity else None
+        return self.error_index.query(
+            system=MonitoringSystem.LANGFUSE.value,
+            level=level,
+            limit=limit
+        )
     
     @track_agent_action("生成健康报告")
     def generate_health_report(
@@ -314,69 +676,138 @@ class MonitoringSpecialist(TrackedAgent):
         # 获取性能指标
         metrics_list = self.get_performance_metrics(target_system)
         
-        if not metrics_list:
-            return HealthReport(
-                system=target_system,
-                status=HealthStatus.UNKNOWN,
-                score=0,
-                issues=["无法获取系统指标"],
-                recommendations=["检查系统连接"],
-                timestamp=datetime.now()
-            )
+        return self._score_reports([target_system], [metrics_list[0] if metrics_list else None])[0]
+    
+    @track_agent_action("批量生成健康报告")
+    def generate_health_reports(
+        self,
+        systems: Optional[List[str]] = None,
+        time_range: str = "1h",
+        timeout: float = DEFAULT_REPORT_TIMEOUT_SECONDS
+    ) -> Dict[str, HealthReport]:
+        """
+        并发生成多个系统的健康报告 - 自动追踪
         
-        metrics = metrics_list[0]
-        
-        # 计算健康分数
-        score = 100
-        issues = []
-        recommendations = []
-        
-        # 响应时间检查
-        if metrics.response_time_ms > 1000:
-            score -= 20
-            issues.append(f"响应时间过长: {metrics.response_time_ms:.2f}ms")
-            recommendations.append("优化查询性能，考虑添加缓存")
-        elif metrics.response_time_ms > 500:
-            score -= 10
-            issues.append(f"响应时间较慢: {metrics.response_time_ms:.2f}ms")
-        
-        # 错误率检查
-        if metrics.error_rate > 0.05:
-            score -= 30
-            issues.append(f"错误率过高: {metrics.error_rate*100:.2f}%")
-            recommendations.append("检查错误日志，修复关键问题")
-        elif metrics.error_rate > 0.01:
-            score -= 15
-            issues.append(f"错误率偏高: {metrics.error_rate*100:.2f}%")
-        
-        # CPU 使用率检查
-        if metrics.cpu_usage and metrics.cpu_usage > 80:
-            score -= 15
-            issues.append(f"CPU 使用率过高: {metrics.cpu_usage:.1f}%")
-            recommendations.append("考虑扩展计算资源")
-        
-        # 内存使用率检查
-        if metrics.memory_usage and metrics.memory_usage > 85:
-            score -= 15
-            issues.append(f"内存使用率过高: {metrics.memory_usage:.1f}%")
-            recommendations.append("检查内存泄漏，优化内存使用")
-        
-        # 确定健康状态
-        if score >= 80:
-            status = HealthStatus.HEALTHY
-        elif score >= 60:
-            status = HealthStatus.WARNING
-        else:
-            status = HealthStatus.CRITICAL
-        
-        return HealthReport(
-            system=target_system,
-            status=status,
-            score=max(0, score),
-            issues=issues if issues else ["系统运行正常"],
-            recommendations=recommendations if recommendations else ["保持当前配置"],
-            timestamp=datetime.now()
-        )
+        每个目标的指标在线程池中并发获取，超时从该目标开始执行时计时；
+        超时或失败的目标返回 UNKNOWN 报告，不阻塞其他目标。评分在所有指标到齐后批量进行
+        
+        Args:
+            systems: 系统名称列表（None 表示所有 MonitoringSystem）
+            time_range: 时间范围
+            timeout: 单个目标获取指标的超时（秒）
+        """
+        targets = list(dict.fromkeys(systems if systems is not None else self.get_system_list()))
+        started_at: Dict[str, float] = {}
+        
+        def fetch(target: str) -> List[PerformanceMetrics]:
+            started_at[target] = time.monotonic()
+            return self.get_performance_metrics(target, time_range)
+        
+        executor = self._report_pool()
+        # 线程被卡死的目标占满时，排队的目标可能一直无法开始；按批次数给出总体上限
+        batches = -(-len(targets) // REPORT_MAX_WORKERS)
+        overall_deadline = time.monotonic() + timeout * max(batches, 1)
+        # 每个任务一份上下文副本，子任务的追踪 span 挂在本次调用下
+        futures = {
+            target: executor.submit(contextvars.copy_context().run, fetch, target)
+            for target in targets
+        }
+        
+        results: Dict[str, Optional[PerformanceMetrics]] = {}
+        failures: Dict[str, str] = {}
+        pending = dict(futures)
+        while pending:
+            now = time.monotonic()
+            # 尚未开始执行的目标还没有开始计时
+            deadlines = {target: started_at[target] + timeout for target in pending if target in started_at}
+            expired = [target for target, deadline in deadlines.items() if deadline <= now]
+            for target in expired:
+                pending.pop(target).cancel()
+                failures[target] = f"获取指标超过 {timeout}s"
+            if now >= overall_deadline:
+                for target in list(pending):
+                    pending.pop(target).cancel()
+                    failures[target] = "等待执行超时"
+            if not pending:
+                break
+            
+            next_deadline = min(deadlines.values(), default=overall_deadline)
+            next_deadline = min(next_deadline, overall_deadline)
+            done, _ = wait(pending.values(), timeout=max(next_deadline - now, 0.0), return_when=FIRST_COMPLETED)
+            for target in [target for target, future in pending.items() if future in done]:
+                future = pending.pop(target)
+                try:
+                    metrics_list = future.result()
+                    results[target] = metrics_list[0] if metrics_list else None
+                except Exception as e:
+                    failures[target] = str(e)
+        
+        reports = self._score_reports(targets, [results.get(target) for target in targets], failures)
+        return dict(zip(targets, reports))
+    
+    def _report_pool(self) -> ThreadPoolExecutor:
+        with self._report_pool_lock:
+            if self._report_executor is None:
+                self._report_executor = ThreadPoolExecutor(
+                    max_workers=REPORT_MAX_WORKERS,
+                    thread_name_prefix="health-report"
+                )
+            return self._report_executor
+    
+    def _score_reports(
+        self,
+        targets: List[str],
+        metrics: List[Optional[PerformanceMetrics]],
+        failures: Optional[Dict[str, str]] = None
+    ) -> List[HealthReport]:
+        """批量计算健康分数并生成所有目标的报告"""
+        scores = self.health_scorer.evaluate(targets, metrics, failures)
+        record_health_scores(scores.systems, scores.scores, scores.statuses)
+        return [scores.report(target) for target in targets]
+    
+    @staticmethod
+    def _make_report(system: str, status: str, **fields: Any) -> HealthReport:
+        return HealthReport(system=system, status=HealthStatus(status), **fields)
+    
+    @track_agent_action("批量评分")
+    def score_fleet(
+        self,
+        metrics: Dict[str, Optional[PerformanceMetrics]],
+        requested: Optional[List[str]] = None,
+        failures: Optional[Dict[str, str]] = None
+    ) -> Dict[str, HealthReport]:
+        """
+        为大量系统打分 - 自动追踪
+        
+        所有系统在一次向量化求值中打分并更新导出的分数；
+        只为状态相对上次评分发生变化的系统和 requested 中的系统生成 HealthReport
+        
+        Args:
+            metrics: 系统名称 -> 指标（None 表示获取失败）
+            requested: 无论状态是否变化都需要报告的系统
+            failures: 获取失败的原因
+        """
+        systems = list(metrics)
+        scores = self.health_scorer.evaluate(systems, [metrics[system] for system in systems], failures)
+        record_health_scores(scores.systems, scores.scores, scores.statuses)
+        return scores.reports(requested or [], include_changed=True)
+    
+    def add_health_rule(self, rule: HealthRule):
+        """添加或替换同名评分规则"""
+        self.health_scorer.add_rule(rule)
+    
+    def create_daemon(self, targets: Optional[List[str]] = None, **kwargs) -> MonitoringDaemon:
+        """
+        创建守护进程，按间隔持续采集指标、同步错误日志并评分
+        
+        Args:
+            targets: 监控的系统，默认为 SUPPORTED_SYSTEMS
+            **kwargs: 传给 MonitoringDaemon（intervals, jitter, state_file 等）
+        """
+        if self.metrics_snapshot_dir:
+            # 调度状态与指标快照放在一起，重启后一起恢复
+            kwargs.setdefault("state_file", os.path.join(self.metrics_snapshot_dir, "daemon_state.json"))
+        return MonitoringDaemon(self, targets or MonitoringRole.SUPPORTED_SYSTEMS, **kwargs)
     
     @track_agent_action("分析趋势")
     def analyze_trends(
@@ -388,18 +819,42 @@ class MonitoringSpecialist(TrackedAgent):
         """
         分析性能趋势 - 自动追踪
         
+        基于已记录的指标历史：回归斜率、EWMA 基线、去季节性变化与变点检测，
+        重复调用只增量处理新数据
+        
         Args:
             system: 系统名称
             metric: 指标名称（response_time, error_rate, throughput）
             time_range: 时间范围
         """
+        # 长时间范围在汇总级别上分析（桶均值），短范围直接用原始点
+        range_seconds = parse_duration(time_range)
+        plan = self.metrics_rollup.plan(
+            range_seconds, raw_coverage=self.metrics_rollup.raw_coverage(system, time.time())
+        )
+        analyzer = self._tier_trend_analyzers[plan.tier.name] if plan.tier is not None else self.trend_analyzer
+        analysis = analyzer.analyze(system, metric, time_range)
+        analysis["source"] = plan.source
+        
+        trend = analysis["trend"]
+        if trend == "insufficient_data":
+            prediction = "历史数据不足，无法判断趋势"
+        elif trend == "stable":
+            prediction = "系统性能保持稳定"
+        else:
+            direction = "上升" if trend == "increasing" else "下降"
+            prediction = f"{metric} 持续{direction}，约 {analysis['slope_per_hour']:+.4g}/小时"
+        if analysis.get("change_points"):
+            latest = analysis["change_points"][-1]
+            changed_at = datetime.fromtimestamp(latest["timestamp"]).strftime("%m-%d %H:%M")
+            prediction += f"；{changed_at} 检测到水平变化"
+        
         return {
             "system": system,
             "metric": metric,
             "time_range": time_range,
-            "trend": "stable",  # stable, increasing, decreasing
-            "change_percentage": 0.5,
-            "prediction": "系统性能保持稳定",
+            **analysis,
+            "prediction": prediction,
             "timestamp": datetime.now().isoformat()
         }
 
@@ -442,6 +897,8 @@ if __name__ == "__main__":
             metrics = metrics_list[0]
             print(f"  系统: {metrics.system}")
             print(f"  响应时间: {metrics.response_time_ms:.2f}ms")
+            if metrics.response_time_sketch is not None:
+                print(f"  P95/P99: {metrics.response_time_p95_ms:.2f}ms / {metrics.response_time_p99_ms:.2f}ms")
             print(f"  错误率: {metrics.error_rate*100:.2f}%")
             print(f"  吞吐量: {metrics.throughput:.0f} req/s")
         
@@ -458,8 +915,14 @@ if __name__ == "__main__":
         for rec in report.recommendations:
             print(f"    • {rec}")
         
+        # 批量健康报告
+        print("\n3️⃣ 批量生成健康报告:")
+        reports = agent.generate_health_reports(timeout=5.0)
+        for name, fleet_report in reports.items():
+            print(f"  {name}: {fleet_report.status.value} ({fleet_report.score}/100)")
+        
         # 分析趋势
-        print("\n3️⃣ 分析性能趋势:")
+        print("\n4️⃣ 分析性能趋势:")
         trend = agent.analyze_trends("langfuse", "response_time", "7d")
         print(f"  趋势: {trend['trend']}")
         print(f"  变化: {trend['change_percentage']}%")
@@ -472,4 +935,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\n❌ 错误: {e}")
     
+    finally:
+        agent.close()
+    
     print("\n" + "="*60 + "\n")
@@ -0,0 +1,86 @@
+"""
+ULID 风格的操作 ID
+48 位毫秒时间戳 + 80 位随机数，Crockford Base32 编码为 26 个字符；
+同一毫秒内随机部分递增，保证进程内单调、跨进程无碰撞、字典序即时间序
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+ULID_LENGTH = 26
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class UlidGenerator:
+    """线程安全的单调 ULID 生成器"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+    
+    def _reset(self):
+        # fork 后子进程必须重新取随机数，否则会与父进程生成相同序列
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+    
+    def new(self, timestamp_ms: Optional[int] = None) -> str:
+        """生成一个 ULID"""
+        now_ms = timestamp_ms if timestamp_ms is not None else time.time_ns() // 1_000_000
+        
+        with self._lock:
+            if now_ms <= self._last_ms:
+                # 同一毫秒（或时钟回拨）：沿用上次时间戳，随机部分 +1
+                now_ms = self._last_ms
+                random_part = self._last_random + 1
+                if random_part > _RANDOM_MAX:
+                    now_ms += 1
+                    random_part = int.from_bytes(os.urandom(10), "big")
+            else:
+                random_part = int.from_bytes(os.urandom(10), "big")
+            self._last_ms = now_ms
+            self._last_random = random_part
+        
+        return _encode(now_ms, 10) + _encode(random_part, 16)
+
+
+_default_generator = UlidGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_default_generator._reset)
+
+
+def new_ulid() -> str:
+    """生成一个 ULID"""
+    return _default_generator.new()
+
+
+def new_operation_id(tool_name: str) -> str:
+    """生成操作 ID：<tool_name>_<ULID>"""
+    return f"{tool_name}_{_default_generator.new()}"
+
+
+def operation_id_sort_key(operation_id: str) -> str:
+    """操作 ID 的时间排序键（取 ULID 部分，忽略工具名前缀）"""
+    return operation_id[-ULID_LENGTH:]
+
+
+def ulid_timestamp_ms(ulid: str) -> int:
+    """从 ULID 中取出毫秒时间戳"""
+    value = 0
+    for char in ulid[-ULID_LENGTH:][:10]:
+        value = value * 32 + _CROCKFORD.index(char)
+    return value
@@ -0,0 +1,257 @@
+"""
+操作日志写入器
+所有线程把编码好的日志行放入无锁队列，由单个写线程批量落盘；
+多进程部署时每个进程写自己的日志分段，结束后按操作 ID 合并
+"""
+
+import atexit
+import glob
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+from typing import List, Optional
+
+from operation_ids import operation_id_sort_key
+
+
+DEFAULT_FLUSH_TIMEOUT_SECONDS = 5.0
+
+
+# ============= 分段文件 =============
+def segment_path(log_file: str, pid: Optional[int] = None) -> str:
+    """进程日志分段路径，如 tool_operations.12345.jsonl"""
+    stem, ext = os.path.splitext(log_file)
+    return f"{stem}.{pid if pid is not None else os.getpid()}{ext}"
+
+
+def list_segments(log_file: str) -> List[str]:
+    """列出某个日志文件的所有进程分段"""
+    stem, ext = os.path.splitext(log_file)
+    return sorted(
+        path for path in glob.glob(f"{glob.escape(stem)}.*{ext}")
+        if path[len(stem) + 1:len(path) - len(ext)].isdigit()
+    )
+
+
+def _read_segment(path: str) -> List[tuple]:
+    # 操作 ID 在入队前生成，多线程下分段内只是近似有序；
+    # timsort 对近似有序的数据接近线性
+    entries = []
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                operation_id = json.loads(line).get("operation_id", "")
+                entries.append((operation_id_sort_key(operation_id), line))
+    entries.sort(key=lambda item: item[0])
+    return entries
+
+
+def merge_segments(log_file: str, remove: bool = True) -> int:
+    """
+    把所有进程分段按操作 ID（时间序）归并追加到主日志文件
+    
+    分段先各自排序，再做一次多路归并。
+    应在写入这些分段的进程都结束后调用。返回合并的行数。
+    """
+    segments = list_segments(log_file)
+    if not segments:
+        return 0
+    
+    merged = 0
+    with open(log_file, "ab") as out:
+        for _, line in heapq.merge(*(_read_segment(path) for path in segments), key=lambda item: item[0]):
+            out.write(line if line.endswith(b"\n") else line + b"\n")
+            merged += 1
+    
+    if remove:
+        for path in segments:
+            os.remove(path)
+    return merged
+
+
+# ============= 单写线程 =============
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class OperationLogWriter:
+    """
+    单写线程日志写入器
+    
+    write() 只做一次 SimpleQueue.put（C 实现、不持有 Python 级锁），
+    写线程把队列中已有的行合并为一次 write 调用。
+    """
+    
+    def __init__(self, log_file: str, per_process_segments: bool = False, batch_size: int = 512):
+        self.log_file = log_file
+        self.per_process_segments = per_process_segments
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._atexit_registered = False
+    
+    @property
+    def path(self) -> str:
+        """当前进程实际写入的文件"""
+        if self.per_process_segments:
+            return segment_path(self.log_file)
+        return self.log_file
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # 首次使用或 fork 之后：子进程没有写线程，需要新建队列与线程
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._run, args=(self._queue, self.path), name="operation-log-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            if not self._atexit_registered:
+                # 写线程是守护线程，退出前需要把队列中的行落盘
+                atexit.register(self.close)
+                self._atexit_registered = True
+    
+    def write(self, line: bytes):
+        """提交一行（须以换行结尾）"""
+        self._ensure_started()
+        self._queue.put(line)
+    
+    def flush(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """等待此前提交的所有行落盘；写线程已退出或超时返回 False"""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        if not self._thread.is_alive():
+            return False
+        marker = _FlushMarker()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+    
+    def close(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT_SECONDS):
+        """落盘并停止写线程"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+    
+    def _run(self, pending: "queue.SimpleQueue", path: str):
+        # 文件在写线程内打开：打开或写入失败只记录错误，线程继续运行，flush 标记总会被置位
+        f = None
+        try:
+            while True:
+                item = pending.get()
+                batch = []
+                markers = []
+                stop = False
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, _FlushMarker):
+                        markers.append(item)
+                    else:
+                        batch.append(item)
+                    if stop or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                
+                if batch:
+                    try:
+                        if f is None:
+                            f = open(path, "ab")
+                        f.write(b"".join(batch))
+                        f.flush()
+                    except Exception as e:
+                        self.logger.error(f"Failed to write operation log: {e}")
+                for marker in markers:
+                    marker.done.set()
+                if stop:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+
+# ============= 压力测试 =============
+def _stress_worker(log_file: str, threads: int, ops_per_thread: int):
+    from concurrent.futures import ThreadPoolExecutor
+    from tool_operations_specialist_tracked import OperationLogger, OperationRecord, OperationStatus, OperationType
+    from operation_ids import new_operation_id
+    
+    op_logger = OperationLogger(log_file, per_process_segments=True)
+    
+    def run(thread_index: int):
+        for i in range(ops_per_thread):
+            op_logger.log_operation(OperationRecord(
+                operation_id=new_operation_id("stress"),
+                tool_name="stress",
+                operation_type=OperationType.EXECUTE,
+                command="noop",
+                parameters={"thread": thread_index, "i": i, "pid": os.getpid()},
+                status=OperationStatus.SUCCESS
+            ))
+    
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    op_logger.close()
+
+
+def run_stress_test(processes: int = 4, threads: int = 16, ops_per_thread: int = 500) -> dict:
+    """多进程 × 多线程写日志，合并后检查行完整、ID 唯一且有序"""
+    import multiprocessing
+    import tempfile
+    import time
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "tool_operations.jsonl")
+        start = time.perf_counter()
+        workers = [
+            multiprocessing.Process(target=_stress_worker, args=(log_file, threads, ops_per_thread))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        
+        merged = merge_segments(log_file)
+        with open(log_file, "rb") as f:
+            ids = [json.loads(line)["operation_id"] for line in f]
+        
+        keys = [operation_id_sort_key(op_id) for op_id in ids]
+        expected = processes * threads * ops_per_thread
+        return {
+            "expected": expected,
+            "merged": merged,
+            "lines": len(ids),
+            "unique_ids": len(set(ids)),
+            "sorted": keys == sorted(keys),
+            "ops_per_second": expected / elapsed
+        }
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print("🧵 操作日志并发压力测试")
+    print("="*60)
+    
+    result = run_stress_test()
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+    
+    ok = result["expected"] == result["lines"] == result["unique_ids"] and result["sorted"]
+    print(f"\n{'✅ 通过' if ok else '❌ 失败'}")
+    print("\n" + "="*60 + "\n")
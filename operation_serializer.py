@@ -0,0 +1,219 @@
+"""
+OperationRecord 序列化
+直接把记录编码为一行 JSON 字节，跳过 to_dict() 的中间字典；安装了 orjson 时自动使用
+"""
+
+import json
+import operator
+from datetime import date, datetime, time as dt_time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# 与 OperationRecord.to_dict() 相同的字段顺序
+RECORD_FIELDS = (
+    "operation_id",
+    "tool_name",
+    "operation_type",
+    "command",
+    "parameters",
+    "status",
+    "request_payload",
+    "response_data",
+    "error_message",
+    "start_time",
+    "end_time",
+    "duration_ms",
+    "queue_wait_ms",
+    "retry_count",
+    "metadata",
+    "response_blob",
+)
+
+# 字段名前缀片段只编码一次，例如 ',"tool_name":'
+_FIELD_PREFIXES = tuple(
+    ("{" if i == 0 else ",") + json.dumps(name) + ":"
+    for i, name in enumerate(RECORD_FIELDS)
+)
+_FIELD_PREFIX_BYTES = tuple(prefix.encode("utf-8") for prefix in _FIELD_PREFIXES)
+_RESPONSE_INDEX = RECORD_FIELDS.index("response_data")
+
+def _json_default(value: Any) -> Any:
+    """json 与 orjson 共用的回退编码：嵌套的 datetime 统一为 isoformat，枚举取值"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+_encode_value = json.JSONEncoder(
+    ensure_ascii=False,
+    separators=(",", ":"),
+    default=_json_default
+).encode
+_encode_str = json.encoder.encode_basestring
+
+_record_values = operator.attrgetter(*RECORD_FIELDS)
+
+# 枚举值的 JSON 片段缓存
+_enum_fragments: Dict[Enum, str] = {}
+
+
+def _fragment(value: Any) -> str:
+    """把单个字段值编码为 JSON 片段"""
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return _encode_str(value)
+    if isinstance(value, Enum):
+        fragment = _enum_fragments.get(value)
+        if fragment is None:
+            fragment = _enum_fragments[value] = _encode_value(value.value)
+        return fragment
+    if isinstance(value, datetime):
+        return '"' + value.isoformat() + '"'
+    return _encode_value(value)
+
+
+def _encode_record_json(record: Any) -> bytes:
+    parts = [
+        prefix + _fragment(value)
+        for prefix, value in zip(_FIELD_PREFIXES, _record_values(record))
+    ]
+    parts.append("}\n")
+    return "".join(parts).encode("utf-8")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+    
+    def _encode_record_orjson(record: Any) -> bytes:
+        # orjson 原生支持 dataclass（含 slots）、datetime 与 Enum
+        return orjson.dumps(record, default=_json_default, option=_ORJSON_OPTIONS)
+    
+    _encode_record = _encode_record_orjson
+else:
+    _encode_record = _encode_record_json
+
+
+def encode_json(value: Any) -> bytes:
+    """把任意 JSON 值编码为紧凑的 UTF-8 字节"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return _encode_value(value).encode("utf-8")
+
+
+def _encode_record_spliced(record: Any, response_json: bytes) -> bytes:
+    """逐字段编码，response_data 直接使用已编码的字节"""
+    parts = []
+    for i, (prefix, value) in enumerate(zip(_FIELD_PREFIX_BYTES, _record_values(record))):
+        parts.append(prefix)
+        if i == _RESPONSE_INDEX:
+            parts.append(response_json)
+        elif orjson is not None:
+            parts.append(encode_json(value))
+        else:
+            parts.append(_fragment(value).encode("utf-8"))
+    parts.append(b"}\n")
+    return b"".join(parts)
+
+
+def encode_record(record: Any, response_json: Optional[bytes] = None) -> bytes:
+    """
+    把 OperationRecord 编码为以换行结尾的一行 UTF-8 JSON
+    
+    response_json: 调用方已经用 encode_json 编码过的 response_data（如为判断大小而编码），
+    传入后不再重复序列化响应
+    """
+    if response_json is None:
+        return _encode_record(record)
+    return _encode_record_spliced(record, response_json)
+
+
+def decode_record(line: bytes) -> Dict[str, Any]:
+    """解析一行日志"""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+# ============= 基准测试 =============
+def benchmark_serialization(count: int = 20000) -> Dict[str, Dict[str, float]]:
+    """
+    对比旧路径（to_dict + json.dump）与新路径（encode_record）
+    
+    返回每种路径的 records/s 与每条记录的峰值临时分配字节数
+    """
+    import io
+    import time
+    import tracemalloc
+    
+    from tool_operations_specialist_tracked import OperationRecord, OperationStatus, OperationType
+    
+    record = OperationRecord(
+        operation_id="github_01JABCDEF0123456789XYZ",
+        tool_name="github",
+        operation_type=OperationType.QUERY,
+        command="get_repo",
+        parameters={"owner": "langfuse", "repo": "langfuse"},
+        status=OperationStatus.SUCCESS,
+        response_data={"id": 1, "full_name": "langfuse/langfuse", "description": "开源 LLM 工程平台", "stargazers_count": 9000},
+        end_time=datetime.now(),
+        duration_ms=123.4,
+        metadata={"agent_id": "tool_ops_001"}
+    )
+    
+    def legacy(buffer):
+        json.dump(record.to_dict(), buffer, ensure_ascii=False)
+        buffer.write("\n")
+    
+    def fast(buffer):
+        buffer.write(encode_record(record))
+    
+    results = {}
+    for name, write, buffer_cls in (("to_dict+json.dump", legacy, io.StringIO), (f"encode_record[{JSON_BACKEND}]", fast, io.BytesIO)):
+        buffer = buffer_cls()
+        start = time.perf_counter()
+        for _ in range(count):
+            write(buffer)
+        elapsed = time.perf_counter() - start
+        
+        # 单条记录的临时分配：在空缓冲区上写入一次，统计峰值
+        tracemalloc.start()
+        samples = []
+        for _ in range(200):
+            scratch = buffer_cls()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            write(scratch)
+            samples.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        
+        results[name] = {
+            "records_per_second": count / elapsed,
+            "bytes_allocated_per_record": sorted(samples)[len(samples) // 2],
+            "bytes_written_per_record": len(buffer.getvalue()) / count
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print(f"⚡ OperationRecord 序列化基准 (backend: {JSON_BACKEND})")
+    print("="*60)
+    
+    for name, stats in benchmark_serialization().items():
+        print(f"\n  {name}:")
+        print(f"    吞吐: {stats['records_per_second']:,.0f} records/s")
+        print(f"    分配: {stats['bytes_allocated_per_record']:,.0f} bytes/record")
+        print(f"    输出: {stats['bytes_written_per_record']:,.0f} bytes/record")
+    
+    print("\n" + "="*60 + "\n")
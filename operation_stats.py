@@ -0,0 +1,272 @@
+"""
+操作统计
+OperationLogger 写入记录时增量维护按 (工具, 命令, 状态) 分组的聚合：
+次数、错误率、耗时分位数草图、重试次数分布；定期持久化，可从历史日志一次流式重建
+
+重建命令:
+python operation_stats.py rebuild [tool_operations.jsonl]
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from quantile_sketch import DDSketch
+
+
+StatsKey = Tuple[str, str, str]  # (tool_name, command, status)
+
+# 计入错误率分母的终态
+_TERMINAL_STATUSES = ("success", "failed")
+
+
+def stats_path(log_file: str) -> str:
+    """日志文件对应的统计文件，如 tool_operations.stats.json"""
+    stem, _ = os.path.splitext(log_file)
+    return f"{stem}.stats.json"
+
+
+# ============= 聚合单元 =============
+@dataclass
+class OperationAggregate:
+    """单个 (工具, 命令, 状态) 分组的聚合"""
+    count: int = 0
+    durations: DDSketch = field(default_factory=DDSketch)
+    retries: Dict[int, int] = field(default_factory=dict)
+    
+    def add(self, duration_ms: Optional[float], retry_count: int):
+        self.count += 1
+        if duration_ms is not None:
+            self.durations.add(duration_ms)
+        self.retries[retry_count] = self.retries.get(retry_count, 0) + 1
+    
+    def merge(self, other: "OperationAggregate"):
+        self.count += other.count
+        self.durations.merge(other.durations)
+        for retries, count in other.retries.items():
+            self.retries[retries] = self.retries.get(retries, 0) + count
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "durations": self.durations.to_dict(),
+            "retries": {str(k): v for k, v in self.retries.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OperationAggregate":
+        return cls(
+            count=data.get("count", 0),
+            durations=DDSketch.from_dict(data.get("durations", {})),
+            retries={int(k): v for k, v in data.get("retries", {}).items()}
+        )
+
+
+# ============= 统计 =============
+class OperationStats:
+    """按 (工具, 命令, 状态) 增量维护的操作统计"""
+    
+    def __init__(self):
+        self._aggregates: Dict[StatsKey, OperationAggregate] = {}
+        self._lock = threading.Lock()
+        self._autosave_stop = threading.Event()
+        self._autosave_thread: Optional[threading.Thread] = None
+        self._dirty = False
+        self.logger = logging.getLogger(__name__)
+    
+    # ----- 写入 -----
+    def add(
+        self,
+        tool_name: str,
+        command: str,
+        status: str,
+        duration_ms: Optional[float] = None,
+        retry_count: int = 0
+    ):
+        """累加一条操作"""
+        key = (tool_name, command, status)
+        with self._lock:
+            aggregate = self._aggregates.get(key)
+            if aggregate is None:
+                aggregate = self._aggregates[key] = OperationAggregate()
+            aggregate.add(duration_ms, retry_count)
+            self._dirty = True
+    
+    def add_record(self, record: Any):
+        """累加一条 OperationRecord"""
+        self.add(record.tool_name, record.command, record.status.value, record.duration_ms, record.retry_count)
+    
+    def add_dict(self, op: Dict[str, Any]):
+        """累加一条日志行（to_dict 格式）"""
+        self.add(
+            op.get("tool_name", ""),
+            op.get("command", ""),
+            op.get("status", ""),
+            op.get("duration_ms"),
+            op.get("retry_count", 0) or 0
+        )
+    
+    def merge(self, other: "OperationStats"):
+        """合并另一份统计（如其他进程的统计）"""
+        with other._lock:
+            items = [(key, OperationAggregate.from_dict(agg.to_dict())) for key, agg in other._aggregates.items()]
+        with self._lock:
+            for key, aggregate in items:
+                existing = self._aggregates.get(key)
+                if existing is None:
+                    self._aggregates[key] = aggregate
+                else:
+                    existing.merge(aggregate)
+            self._dirty = True
+    
+    # ----- 查询 -----
+    def summary(
+        self,
+        tool_name: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """汇总匹配分组：次数、错误率、p50/p95/p99、重试分布"""
+        by_status: Dict[str, int] = {}
+        durations = DDSketch()
+        retries: Dict[int, int] = {}
+        
+        with self._lock:
+            for (tool, cmd, status), aggregate in self._aggregates.items():
+                if tool_name is not None and tool != tool_name:
+                    continue
+                if command is not None and cmd != command:
+                    continue
+                by_status[status] = by_status.get(status, 0) + aggregate.count
+                durations.merge(aggregate.durations)
+                for retry_count, count in aggregate.retries.items():
+                    retries[retry_count] = retries.get(retry_count, 0) + count
+        
+        total = sum(by_status.values())
+        finished = sum(by_status.get(status, 0) for status in _TERMINAL_STATUSES)
+        return {
+            "tool_name": tool_name,
+            "command": command,
+            "count": total,
+            "by_status": by_status,
+            "error_rate": by_status.get("failed", 0) / finished if finished else 0.0,
+            "duration_ms": {
+                "mean": durations.mean,
+                "p50": durations.quantile(0.50),
+                "p95": durations.quantile(0.95),
+                "p99": durations.quantile(0.99),
+                "max": durations.max if durations.count else None
+            },
+            "retries": dict(sorted(retries.items()))
+        }
+    
+    def breakdown(self) -> Dict[str, Dict[str, Any]]:
+        """按 工具/命令 分组的汇总"""
+        with self._lock:
+            pairs = sorted({(tool, cmd) for tool, cmd, _ in self._aggregates})
+        return {f"{tool}/{cmd}": self.summary(tool, cmd) for tool, cmd in pairs}
+    
+    def keys(self) -> Iterable[StatsKey]:
+        with self._lock:
+            return list(self._aggregates)
+    
+    # ----- 持久化 -----
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._to_dict_locked()
+    
+    def _to_dict_locked(self) -> Dict[str, Any]:
+        return {
+            "groups": [
+                {"tool_name": tool, "command": cmd, "status": status, **aggregate.to_dict()}
+                for (tool, cmd, status), aggregate in self._aggregates.items()
+            ]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OperationStats":
+        stats = cls()
+        for group in data.get("groups", []):
+            key = (group["tool_name"], group["command"], group["status"])
+            stats._aggregates[key] = OperationAggregate.from_dict(group)
+        return stats
+    
+    def save(self, path: str):
+        """原子写入统计文件"""
+        # 在同一次持锁内清除标记并生成快照：之后到达的记录会重新置脏，不会被漏存
+        with self._lock:
+            self._dirty = False
+            data = self._to_dict_locked()
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._dirty = True
+            raise
+    
+    @classmethod
+    def load(cls, path: str) -> "OperationStats":
+        """读取统计文件，不存在时返回空统计"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+    
+    def start_autosave(self, path: str, interval: float = 30.0):
+        """后台定期保存（仅在有变化时写盘）"""
+        if self._autosave_thread is not None:
+            return
+        
+        def run():
+            while not self._autosave_stop.wait(interval):
+                if self._dirty:
+                    try:
+                        self.save(path)
+                    except Exception as e:
+                        self.logger.error(f"Failed to save operation stats: {e}")
+        
+        self._autosave_thread = threading.Thread(target=run, name="operation-stats-autosave", daemon=True)
+        self._autosave_thread.start()
+    
+    def stop_autosave(self):
+        self._autosave_stop.set()
+        if self._autosave_thread is not None:
+            self._autosave_thread.join()
+            self._autosave_thread = None
+    
+    # ----- 重建 -----
+    @classmethod
+    def rebuild(cls, log_files: Iterable[str]) -> "OperationStats":
+        """从历史日志单次流式重建"""
+        stats = cls()
+        for log_file in log_files:
+            if not os.path.exists(log_file):
+                continue
+            with open(log_file, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        stats.add_dict(json.loads(line))
+        stats._dirty = True
+        return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("用法: python operation_stats.py rebuild [tool_operations.jsonl]")
+        sys.exit(1)
+    
+    from operation_log_writer import list_segments
+    
+    log_file = sys.argv[2] if len(sys.argv) > 2 else "tool_operations.jsonl"
+    stats = OperationStats.rebuild([log_file] + list_segments(log_file))
+    stats.save(stats_path(log_file))
+    
+    print(f"\n✅ 统计已重建: {stats_path(log_file)}")
+    for group, summary in stats.breakdown().items():
+        p95 = summary["duration_ms"]["p95"]
+        print(f"  {group}: {summary['count']} 次, 错误率 {summary['error_rate']*100:.2f}%, p95 {p95 if p95 is None else round(p95, 2)}ms")
@@ -0,0 +1,380 @@
+"""
+Prometheus HTTP API 客户端
+支持即时查询与范围查询；矩阵结果直接解码为 NumPy 数组，聚合运算全部向量化
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+
+# 时间范围 -> 查询步长（秒），控制每条序列约 60~300 个点
+TIME_RANGE_STEPS = {
+    "5m": 15,
+    "15m": 15,
+    "30m": 30,
+    "1h": 60,
+    "6h": 300,
+    "12h": 600,
+    "24h": 900,
+    "7d": 3600,
+    "30d": 14400,
+}
+
+# 未在映射表中的时间范围按此点数推算步长
+_TARGET_POINTS = 240
+_MIN_STEP_SECONDS = 15
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_DURATION_RE = re.compile(r"^(\d+)([smhdw])$")
+
+
+def parse_duration(value: str) -> int:
+    """把 "15m"、"24h"、"7d" 之类的时间范围转换为秒数"""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid time range: {value!r}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def step_for_range(time_range: str) -> int:
+    """为时间范围选择查询步长（秒）"""
+    if time_range in TIME_RANGE_STEPS:
+        return TIME_RANGE_STEPS[time_range]
+    return max(_MIN_STEP_SECONDS, parse_duration(time_range) // _TARGET_POINTS)
+
+
+# ============= 查询结果 =============
+@dataclass
+class InstantVector:
+    """即时查询结果: 每条序列一个样本"""
+    labels: List[Dict[str, str]]
+    timestamps: np.ndarray  # shape (S,)
+    values: np.ndarray      # shape (S,)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+
+@dataclass
+class RangeMatrix:
+    """
+    范围查询结果
+
+    所有序列对齐到同一时间网格，缺失的样本为 NaN
+    """
+    labels: List[Dict[str, str]]
+    timestamps: np.ndarray  # shape (T,)
+    values: np.ndarray      # shape (S, T)
+    step: float
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def empty(self) -> bool:
+        return self.values.size == 0
+
+
+def _sample_values(samples: List[Any]) -> np.ndarray:
+    # Prometheus 把样本值编码为字符串（含 "NaN"、"+Inf"），一次性交给 NumPy 解析
+    return np.asarray([sample[1] for sample in samples], dtype=np.str_).astype(np.float64)
+
+
+def decode_vector(result: List[Dict[str, Any]]) -> InstantVector:
+    """解码 resultType=vector 的结果"""
+    samples = [series["value"] for series in result]
+    return InstantVector(
+        labels=[series.get("metric", {}) for series in result],
+        timestamps=np.fromiter((sample[0] for sample in samples), dtype=np.float64, count=len(samples)),
+        values=_sample_values(samples) if samples else np.empty(0, dtype=np.float64)
+    )
+
+
+def decode_matrix(result: List[Dict[str, Any]], start: float, end: float, step: float) -> RangeMatrix:
+    """
+    解码 resultType=matrix 的结果
+
+    所有样本先拼成一维数组，再按 (序列, 网格位置) 一次性散射进二维矩阵
+    """
+    grid = np.arange(start, end + step / 2, step, dtype=np.float64)
+    counts = np.fromiter((len(series["values"]) for series in result), dtype=np.int64, count=len(result))
+    values = np.full((len(result), len(grid)), np.nan, dtype=np.float64)
+
+    total = int(counts.sum())
+    if total:
+        samples = list(chain.from_iterable(series["values"] for series in result))
+        timestamps = np.fromiter((sample[0] for sample in samples), dtype=np.float64, count=total)
+        rows = np.repeat(np.arange(len(result)), counts)
+        cols = np.rint((timestamps - start) / step).astype(np.int64)
+        inside = (cols >= 0) & (cols < len(grid))
+        values[rows[inside], cols[inside]] = _sample_values(samples)[inside]
+
+    return RangeMatrix(
+        labels=[series.get("metric", {}) for series in result],
+        timestamps=grid,
+        values=values,
+        step=float(step)
+    )
+
+
+# ============= 向量化聚合 =============
+def _has_samples(values: np.ndarray) -> np.ndarray:
+    return ~np.all(np.isnan(values), axis=-1)
+
+
+def avg_over_time(matrix: RangeMatrix) -> np.ndarray:
+    """每条序列在时间窗口内的平均值，shape (S,)；无样本的序列为 NaN"""
+    out = np.full(len(matrix), np.nan)
+    present = _has_samples(matrix.values)
+    out[present] = np.nanmean(matrix.values[present], axis=1)
+    return out
+
+
+def quantile_over_time(matrix: RangeMatrix, q: float) -> np.ndarray:
+    """
+    每条序列在时间窗口内的分位数（q 取 0~1），shape (S,)
+
+    np.nanquantile 沿轴逐行处理；这里整体排序（NaN 排在末尾），
+    再按每行的有效样本数线性插值，结果与之相同
+    """
+    ordered = np.sort(matrix.values, axis=1)
+    counts = np.count_nonzero(~np.isnan(ordered), axis=1)
+    position = q * np.maximum(counts - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    low_values = np.take_along_axis(ordered, lower[:, None], axis=1)[:, 0]
+    high_values = np.take_along_axis(ordered, upper[:, None], axis=1)[:, 0]
+    out = low_values + (high_values - low_values) * (position - lower)
+    out[counts == 0] = np.nan
+    return out
+
+
+def increase(matrix: RangeMatrix) -> np.ndarray:
+    """
+    计数器在窗口内的增量，shape (S,)
+
+    与 PromQL 一致地处理计数器重置：值下降时视为从 0 重新计数；
+    缺失样本用前一个有效值填充，不会把空洞当成重置
+    """
+    values = matrix.values
+    if values.shape[1] < 2:
+        return np.zeros(len(matrix))
+
+    # 前向填充 NaN：取每个位置之前最近一个有效样本的列号
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = np.take_along_axis(values, index, axis=1)
+
+    deltas = np.diff(filled, axis=1)
+    resets = deltas < 0
+    deltas = np.where(resets, filled[:, 1:], deltas)
+    return np.nansum(deltas, axis=1)
+
+
+def rate(matrix: RangeMatrix) -> np.ndarray:
+    """计数器的每秒平均增长率，shape (S,)；按每条序列首末样本的时间跨度计算"""
+    valid = ~np.isnan(matrix.values)
+    count = valid.shape[1]
+    first = np.argmax(valid, axis=1)
+    last = count - 1 - np.argmax(valid[:, ::-1], axis=1)
+    span = (last - first) * matrix.step
+
+    out = np.full(len(matrix), np.nan)
+    covered = (span > 0) & valid.any(axis=1)
+    out[covered] = increase(matrix)[covered] / span[covered]
+    return out
+
+
+# ============= 客户端 =============
+class PrometheusClient:
+    """
+    Prometheus HTTP API 客户端
+
+    使用方法:
+    client = PrometheusClient("http://localhost:9090")
+    matrix = client.query_range_for("http_requests_total", "1h")
+    throughput = rate(matrix).sum()
+    """
+
+    def __init__(
+        self,
+        host: str,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        session: Optional[requests.Session] = None
+    ):
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.get(f"{self.host}{path}", params=params, timeout=self.timeout)
+        try:
+            payload = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise
+
+        if payload.get("status") != "success":
+            raise RuntimeError(
+                f"Prometheus API error ({payload.get('errorType', response.status_code)}): "
+                f"{payload.get('error', 'unknown error')}"
+            )
+        return payload["data"]
+
+    def query(self, expr: str, at: Optional[float] = None) -> InstantVector:
+        """即时查询 /api/v1/query"""
+        params: Dict[str, Any] = {"query": expr}
+        if at is not None:
+            params["time"] = at
+
+        data = self._get("/api/v1/query", params)
+        if data["resultType"] == "scalar":
+            ts, value = data["result"]
+            return InstantVector(
+                labels=[{}],
+                timestamps=np.array([ts], dtype=np.float64),
+                values=np.array([value], dtype=np.str_).astype(np.float64)
+            )
+        if data["resultType"] != "vector":
+            raise RuntimeError(f"Unexpected Prometheus result type: {data['resultType']}")
+        return decode_vector(data["result"])
+
+    def query_range(self, expr: str, start: float, end: float, step: float) -> RangeMatrix:
+        """范围查询 /api/v1/query_range"""
+        # 与 Prometheus 一致地把起止时间对齐到步长，网格与服务端返回的时间戳重合
+        start = np.floor(start / step) * step
+        end = np.floor(end / step) * step
+
+        data = self._get("/api/v1/query_range", {
+            "query": expr,
+            "start": start,
+            "end": end,
+            "step": step
+        })
+        if data["resultType"] != "matrix":
+            raise RuntimeError(f"Unexpected Prometheus result type: {data['resultType']}")
+        return decode_matrix(data["result"], start, end, step)
+
+    def query_range_for(self, expr: str, time_range: str, end: Optional[float] = None) -> RangeMatrix:
+        """按 "1h"、"7d" 这类时间范围执行范围查询，步长由 step_for_range 决定"""
+        end = end if end is not None else time.time()
+        return self.query_range(expr, end - parse_duration(time_range), end, step_for_range(time_range))
+
+    def close(self):
+        self.session.close()
+
+
+# ============= 测试 =============
+def _fake_prometheus(series: int, rng: np.random.Generator):
+    """
+    启动一个本地假 Prometheus，为每个查询返回 series 条计数器序列
+
+    各序列的真实速率（每秒）在启动时确定，保存在 server.rates 上供断言对照
+    """
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    rates = rng.uniform(1, 10, size=(series, 1))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            if url.path == "/api/v1/query_range":
+                start, end, step = (float(params[key]) for key in ("start", "end", "step"))
+                grid = np.arange(start, end + step / 2, step)
+                # 单调递增的计数器，每条序列速率不同，第 1 条在中点重置一次
+                values = np.cumsum(np.broadcast_to(rates * step, (series, len(grid))), axis=1)
+                values[0, len(grid) // 2:] -= values[0, len(grid) // 2 - 1]
+                result = [
+                    {
+                        "metric": {"__name__": params["query"], "instance": f"node-{i}"},
+                        "values": [[float(ts), repr(float(v))] for ts, v in zip(grid, row)]
+                    }
+                    for i, row in enumerate(values)
+                ]
+                body = {"status": "success", "data": {"resultType": "matrix", "result": result}}
+            elif url.path == "/api/v1/query":
+                body = {"status": "success", "data": {"resultType": "vector", "result": [
+                    {"metric": {"instance": f"node-{i}"}, "value": [time.time(), str(i)]}
+                    for i in range(series)
+                ]}}
+            else:
+                body = {"status": "error", "errorType": "bad_data", "error": "unknown endpoint"}
+
+            payload = json.dumps(body).encode()
+            self.send_response(200 if body["status"] == "success" else 400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.rates = rates[:, 0]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    series = 2000
+    server = _fake_prometheus(series, np.random.default_rng(7))
+    client = PrometheusClient(f"http://127.0.0.1:{server.server_address[1]}")
+
+    print(f"\n📈 Prometheus 客户端测试（{series} 条序列）")
+
+    started = time.perf_counter()
+    matrix = client.query_range_for("http_requests_total", "1h")
+    fetched = time.perf_counter()
+    rates = rate(matrix)
+    averages = avg_over_time(matrix)
+    p95 = quantile_over_time(matrix, 0.95)
+    done = time.perf_counter()
+
+    print(f"  矩阵形状: {matrix.values.shape}，步长 {matrix.step:.0f}s")
+    print(f"  查询+解码: {(fetched - started) * 1000:.1f}ms，聚合: {(done - fetched) * 1000:.1f}ms")
+    print(f"  总吞吐量: {np.nansum(rates):.1f}/s，平均值中位数: {np.nanmedian(averages):.1f}，p95 中位数: {np.nanmedian(p95):.1f}")
+    print(f"  重置序列的速率: {rates[0]:.2f}/s（生成速率 {server.rates[0]:.2f}/s）")
+
+    # 网格：步长由时间范围决定，起止对齐到步长，每条序列每个网格点一个样本
+    step = step_for_range("1h")
+    assert matrix.step == step
+    assert matrix.values.shape == (series, parse_duration("1h") // step + 1)
+    assert np.all(np.diff(matrix.timestamps) == step)
+    assert not np.isnan(matrix.values).any()
+
+    # rate / increase 与生成器的已知速率一致，包括中点重置过一次的第 1 条序列
+    assert np.any(np.diff(matrix.values[0]) < 0)
+    span = (matrix.values.shape[1] - 1) * step
+    assert np.allclose(rates, server.rates, rtol=1e-9)
+    assert np.allclose(increase(matrix), server.rates * span, rtol=1e-9)
+
+    vector = client.query("up")
+    print(f"  即时查询: {len(vector)} 条序列")
+    assert len(vector) == series
+    assert np.array_equal(vector.values, np.arange(series))
+
+    try:
+        client._get("/api/v1/unknown", {})
+    except RuntimeError as e:
+        print(f"  错误处理: {e}")
+        assert "bad_data" in str(e)
+    else:
+        raise AssertionError("unknown endpoint should raise")
+
+    client.close()
+    server.shutdown()
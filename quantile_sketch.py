@@ -0,0 +1,211 @@
+"""
+可合并的分位数草图（DDSketch）
+按对数分桶计数，保证相对误差；同参数的草图可以直接相加合并，并可序列化为紧凑的二进制格式
+"""
+
+import math
+import struct
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+
+# 二进制格式: 头部（魔数、精度、计数、零桶、和、最小、最大）+ 桶数 + 每个桶 (编号差值, 计数)，整数均为 varint
+_MAGIC = b"DDS1"
+_HEADER = struct.Struct("<4sdqqddd")
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class DDSketch:
+    """
+    DDSketch 分位数草图
+    
+    使用方法:
+    sketch = DDSketch()
+    sketch.add(12.5)
+    sketch.quantile(0.99)
+    sketch.merge(other_sketch)
+    """
+    
+    # 小于该值的样本计入零桶
+    MIN_INDEXABLE = 1e-9
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def key(self, value: float) -> int:
+        """样本值对应的桶编号"""
+        return math.ceil(math.log(value) / self._log_gamma)
+    
+    def add(self, value: float, count: int = 1):
+        """加入样本"""
+        if value < self.MIN_INDEXABLE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    def extend(self, values: Iterable[float]):
+        """批量加入样本"""
+        for value in values:
+            self.add(value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """估计分位数（q ∈ [0, 1]），空草图返回 None"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+    
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+    
+    def merge(self, other: "DDSketch"):
+        """合并另一个草图（需相同精度）"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def copy(self) -> "DDSketch":
+        sketch = DDSketch(self.relative_accuracy)
+        sketch.merge(self)
+        return sketch
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "bins": {str(key): count for key, count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+    
+    def to_bytes(self) -> bytes:
+        """
+        紧凑二进制序列化
+
+        桶编号按升序做差分并 zigzag 编码，计数用 varint；典型的延迟分布只需几百字节
+        """
+        out = bytearray(_HEADER.pack(
+            _MAGIC, self.relative_accuracy, self.count, self.zero_count, self.sum, self.min, self.max
+        ))
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for key in sorted(self.bins):
+            delta = key - previous
+            _write_varint(out, (delta << 1) ^ (delta >> 63))
+            _write_varint(out, self.bins[key])
+            previous = key
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        magic, relative_accuracy, count, zero_count, total, minimum, maximum = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized DDSketch")
+        sketch = cls(relative_accuracy)
+        sketch.count, sketch.zero_count, sketch.sum = count, zero_count, total
+        sketch.min, sketch.max = minimum, maximum
+
+        size, pos = _read_varint(data, _HEADER.size)
+        key = 0
+        for _ in range(size):
+            encoded, pos = _read_varint(data, pos)
+            key += (encoded >> 1) ^ -(encoded & 1)
+            sketch.bins[key], pos = _read_varint(data, pos)
+        return sketch
+
+    @classmethod
+    def from_buckets(
+        cls,
+        upper_bounds: Sequence[float],
+        counts: Sequence[float],
+        relative_accuracy: float = 0.01
+    ) -> "DDSketch":
+        """
+        由直方图桶（如 Prometheus 的 le 桶）构造草图
+
+        每个桶的计数记在桶区间的几何中点上，因此精度受原直方图桶宽限制；
+        +Inf 桶按最大有限上界计（与 histogram_quantile 相同）
+        """
+        sketch = cls(relative_accuracy)
+        lower = 0.0
+        for upper, count in zip(upper_bounds, counts):
+            count = int(round(count))
+            if count > 0:
+                if math.isinf(upper):
+                    value = lower
+                elif lower > 0:
+                    value = math.sqrt(lower * upper)
+                else:
+                    value = upper / 2
+                sketch.add(value, count)
+            if not math.isinf(upper):
+                lower = upper
+        return sketch
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch.bins = {int(key): count for key, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
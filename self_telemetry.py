@@ -0,0 +1,379 @@
+"""
+Agent 进程自身的资源遥测
+后台线程定期读取 /proc/self 与 resource 统计，结合 GC 暂停、线程数、事件循环延迟和 Agent 动作耗时，
+生成 custom 系统的 PerformanceMetrics，无需外部监控组件
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import resource
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from quantile_sketch import DDSketch
+
+
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 5.0
+DEFAULT_HISTORY_SIZE = 120
+DEFAULT_LOOP_PROBE_INTERVAL_SECONDS = 0.5
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# cgroup v2 / v1 内存上限；容器内以此为准，否则用物理内存
+_CGROUP_MEMORY_LIMITS = ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+_UNLIMITED_MEMORY = 1 << 60
+
+
+@dataclass
+class TelemetrySample:
+    """一次采样（比率类字段为上一次采样以来的区间值）"""
+    timestamp: float
+    cpu_percent: float                 # 单核百分比，多线程时可能超过 100
+    cpu_usage: float                   # 按可用核数归一化的百分比
+    rss_bytes: int
+    memory_usage: Optional[float]      # 占内存上限的百分比
+    memory_limit_bytes: Optional[int]
+    max_rss_bytes: int
+    threads: int                       # 操作系统线程数（含非 Python 线程）
+    python_threads: int
+    open_fds: Optional[int]
+    gc_collections: int
+    gc_pause_total_ms: float
+    gc_pause_max_ms: float
+    event_loop_lag_ms: Optional[float] # 区间内最大延迟；未接入事件循环时为 None
+    actions: int
+    action_errors: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# ============= /proc 读取 =============
+def _read_proc_stat() -> Optional[Dict[str, float]]:
+    """/proc/self/stat 中的 CPU 时间与线程数；非 Linux 返回 None"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 第 2 个字段（进程名）可能含空格，从最后一个 ')' 之后开始切分
+    fields = data[data.rindex(b")") + 2:].split()
+    return {
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,  # utime + stime
+        "threads": int(fields[17]),
+    }
+
+
+def _read_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _count_open_fds() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def memory_limit_bytes() -> Optional[int]:
+    """进程可用的内存上限：cgroup 限制优先，否则为物理内存"""
+    for path in _CGROUP_MEMORY_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < _UNLIMITED_MEMORY:
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# ============= 采样器 =============
+class SelfTelemetrySampler:
+    """
+    进程自身遥测采样器
+
+    使用方法:
+    sampler = SelfTelemetrySampler().start()
+    sampler.attach_event_loop(asyncio.get_running_loop())   # 可选，测量事件循环延迟
+    sampler.latest().cpu_usage
+    sampler.performance_metrics()                            # custom 系统的 PerformanceMetrics 字段
+
+    GC 暂停通过 gc.callbacks 计时，Agent 动作通过 agent_tracking_base.ACTION_LISTENERS 统计；
+    两个回调都只做计数与累加，采样线程每个周期读取并清零
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+        history_size: int = DEFAULT_HISTORY_SIZE
+    ):
+        self.interval = interval
+        self.history: Deque[TelemetrySample] = deque(maxlen=history_size)
+        self.listeners: List[Callable[[TelemetrySample], None]] = []
+        self.logger = logging.getLogger(__name__)
+        self.cpus = _available_cpus()
+        self.memory_limit = memory_limit_bytes()
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 区间累加器（回调写入，采样时交换）
+        self._gc_started: Optional[float] = None
+        self._gc_collections = 0
+        self._gc_pause_total = 0.0
+        self._gc_pause_max = 0.0
+        self._loop_lag_max: Optional[float] = None
+        self._actions = 0
+        self._action_errors = 0
+        self._action_durations = DDSketch()
+        self._last_actions: Optional[Dict[str, Any]] = None
+
+        self._last_cpu: Optional[float] = None
+        self._last_wall: Optional[float] = None
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+
+    # ----- 回调 -----
+    def _on_gc(self, phase: str, info: Dict[str, Any]):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            pause = time.perf_counter() - self._gc_started
+            self._gc_started = None
+            self._gc_collections += 1
+            self._gc_pause_total += pause
+            if pause > self._gc_pause_max:
+                self._gc_pause_max = pause
+
+    def _on_action(self, agent_type: str, action: str, duration: float, success: bool):
+        with self._lock:
+            self._actions += 1
+            if not success:
+                self._action_errors += 1
+            self._action_durations.add(duration * 1000)
+
+    def attach_event_loop(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        probe_interval: float = DEFAULT_LOOP_PROBE_INTERVAL_SECONDS
+    ):
+        """
+        测量事件循环延迟：每隔 probe_interval 安排一次回调，实际执行时间与预期之差即延迟
+
+        可以在任意线程调用；loop 为 None 时使用当前正在运行的循环
+        """
+        loop = loop or asyncio.get_running_loop()
+        if id(loop) in self._loops:
+            return
+        self._loops[id(loop)] = loop
+
+        def probe(expected: float):
+            lag = max(loop.time() - expected, 0.0)
+            if self._loop_lag_max is None or lag > self._loop_lag_max:
+                self._loop_lag_max = lag
+            if id(loop) in self._loops and not loop.is_closed():
+                loop.call_later(probe_interval, probe, loop.time() + probe_interval)
+
+        loop.call_soon_threadsafe(lambda: loop.call_later(probe_interval, probe, loop.time() + probe_interval))
+
+    def detach_event_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loops.pop(id(loop), None)
+
+    # ----- 采样 -----
+    def sample(self) -> TelemetrySample:
+        """立即采样一次（区间为上一次采样至今）"""
+        now = time.time()
+        wall = time.monotonic()
+        stat = _read_proc_stat()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_seconds = stat["cpu_seconds"] if stat else usage.ru_utime + usage.ru_stime
+        # Linux 上 ru_maxrss 单位为 KiB，macOS 为字节
+        max_rss = usage.ru_maxrss * (1 if os.uname().sysname == "Darwin" else 1024)
+        rss = _read_rss_bytes() or max_rss
+
+        if self._last_cpu is None or wall <= self._last_wall:
+            cpu_percent = 0.0
+        else:
+            cpu_percent = (cpu_seconds - self._last_cpu) / (wall - self._last_wall) * 100
+        self._last_cpu, self._last_wall = cpu_seconds, wall
+
+        # 交换区间累加器
+        gc_collections, gc_pause_total, gc_pause_max = self._gc_collections, self._gc_pause_total, self._gc_pause_max
+        self._gc_collections, self._gc_pause_total, self._gc_pause_max = 0, 0.0, 0.0
+        loop_lag, self._loop_lag_max = self._loop_lag_max, None
+        for key, loop in list(self._loops.items()):
+            if loop.is_closed():
+                del self._loops[key]
+        if loop_lag is None and self._loops:
+            loop_lag = 0.0
+        with self._lock:
+            actions, errors, durations = self._actions, self._action_errors, self._action_durations
+            self._actions, self._action_errors, self._action_durations = 0, 0, DDSketch()
+
+        sample = TelemetrySample(
+            timestamp=now,
+            cpu_percent=round(cpu_percent, 2),
+            cpu_usage=round(cpu_percent / self.cpus, 2),
+            rss_bytes=rss,
+            memory_usage=round(rss / self.memory_limit * 100, 2) if self.memory_limit else None,
+            memory_limit_bytes=self.memory_limit,
+            max_rss_bytes=max_rss,
+            threads=stat["threads"] if stat else threading.active_count(),
+            python_threads=threading.active_count(),
+            open_fds=_count_open_fds(),
+            gc_collections=gc_collections,
+            gc_pause_total_ms=round(gc_pause_total * 1000, 3),
+            gc_pause_max_ms=round(gc_pause_max * 1000, 3),
+            event_loop_lag_ms=round(loop_lag * 1000, 3) if loop_lag is not None else None,
+            actions=actions,
+            action_errors=errors
+        )
+        self.history.append(sample)
+        if actions:
+            self._last_actions = {
+                "duration": durations,
+                "seconds": sample.timestamp - self.history[-2].timestamp if len(self.history) > 1 else self.interval
+            }
+
+        for listener in self.listeners:
+            try:
+                listener(sample)
+            except Exception as e:
+                self.logger.error(f"Telemetry listener failed: {e}")
+        return sample
+
+    def latest(self) -> Optional[TelemetrySample]:
+        return self.history[-1] if self.history else None
+
+    def performance_metrics(self) -> Dict[str, Any]:
+        """
+        最近一个区间的 PerformanceMetrics 字段
+
+        响应时间与错误率来自本进程被追踪的 Agent 动作；区间内没有动作时沿用最近一次有动作的区间
+        """
+        sample = self.latest() or self.sample()
+        fields: Dict[str, Any] = {
+            "response_time_ms": 0.0,
+            "error_rate": 0.0,
+            "throughput": 0.0,
+            "cpu_usage": sample.cpu_usage,
+            "memory_usage": sample.memory_usage,
+            "response_time_sketch": None
+        }
+        recent = self._last_actions
+        if sample.actions and recent is not None:
+            durations: DDSketch = recent["duration"]
+            fields.update(
+                response_time_ms=durations.mean,
+                error_rate=sample.action_errors / sample.actions,
+                throughput=sample.actions / max(recent["seconds"], 1e-9),
+                response_time_sketch=durations.copy()
+            )
+        elif recent is not None:
+            fields.update(response_time_ms=recent["duration"].mean, response_time_sketch=recent["duration"].copy())
+        return fields
+
+    # ----- 生命周期 -----
+    def start(self) -> "SelfTelemetrySampler":
+        """注册 GC / 动作回调并启动后台采样线程（重复调用无副作用）"""
+        if self._thread is not None:
+            return self
+        from agent_tracking_base import ACTION_LISTENERS
+
+        gc.callbacks.append(self._on_gc)
+        ACTION_LISTENERS.append(self._on_action)
+        self._stop.clear()
+        self.sample()  # 建立 CPU 基线
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.sample()
+                except Exception as e:
+                    self.logger.error(f"Telemetry sample failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="self-telemetry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        from agent_tracking_base import ACTION_LISTENERS
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        if self._on_action in ACTION_LISTENERS:
+            ACTION_LISTENERS.remove(self._on_action)
+        self._loops.clear()
+
+
+_default_sampler: Optional[SelfTelemetrySampler] = None
+_default_lock = threading.Lock()
+
+
+def get_sampler() -> SelfTelemetrySampler:
+    """进程共享的采样器（首次调用时启动）"""
+    global _default_sampler
+    with _default_lock:
+        if _default_sampler is None:
+            _default_sampler = SelfTelemetrySampler().start()
+        return _default_sampler
+
+
+if __name__ == "__main__":
+    sampler = SelfTelemetrySampler(interval=0.5).start()
+    print(f"\n📈 自身遥测测试: {sampler.cpus} 个可用核，内存上限 {sampler.memory_limit / 2**30:.1f}GiB")
+
+    async def main():
+        sampler.attach_event_loop()
+        garbage = []
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            # 制造 CPU 负载、GC 与事件循环阻塞
+            garbage = [[i] * 10 for i in range(20000)]
+            for _ in range(50):
+                a, b = [], []
+                a.append(b)
+                b.append(a)
+            gc.collect()
+            time.sleep(0.05)
+            await asyncio.sleep(0.01)
+        del garbage
+
+    asyncio.run(main())
+    sampler.sample()
+    for sample in list(sampler.history)[-3:]:
+        print(
+            f"  CPU {sample.cpu_percent:6.1f}%  RSS {sample.rss_bytes / 2**20:6.1f}MiB  "
+            f"线程 {sample.threads}  GC {sample.gc_collections} 次/{sample.gc_pause_total_ms:.1f}ms  "
+            f"事件循环延迟 {sample.event_loop_lag_ms}ms"
+        )
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        sampler.sample()
+    print(f"  单次采样开销: {(time.perf_counter() - started):.3f}ms")
+    sampler.stop()
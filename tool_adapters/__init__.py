@@ -0,0 +1,29 @@
+"""
+工具适配器
+ToolOperationsSpecialist 通过 AdapterRegistry 按工具名、命令名分发操作
+"""
+
+from .base import (
+    CURRENT_OPERATION,
+    AdapterTraits,
+    GenericAdapter,
+    ToolAdapter,
+    TransportFactory,
+    adapter_command,
+    apply_projection,
+    compile_projection,
+)
+from .registry import ADAPTER_SPECS, AdapterRegistry
+
+__all__ = [
+    "ADAPTER_SPECS",
+    "CURRENT_OPERATION",
+    "AdapterRegistry",
+    "AdapterTraits",
+    "GenericAdapter",
+    "ToolAdapter",
+    "TransportFactory",
+    "adapter_command",
+    "apply_projection",
+    "compile_projection",
+]
@@ -0,0 +1,279 @@
+"""
+工具适配器基类
+每个适配器声明自己的连接池、缓存与幂等特性，并通过 adapter_command 注册命令
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_tracing import TracingTransport
+
+
+# 未在工具配置中指定 timeout 时的默认 HTTP 超时（秒）
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+# 当前正在执行的 (工具名, 命令)，供传输层（录制、追踪）识别请求来源
+CURRENT_OPERATION: ContextVar[Optional[Tuple[str, str]]] = ContextVar("current_tool_operation", default=None)
+
+# 传输层工厂：传入适配器，返回挂载到其 HTTP 会话上的 requests 传输适配器
+TransportFactory = Callable[["ToolAdapter"], HTTPAdapter]
+
+
+def compile_projection(paths: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    把字段路径编译成嵌套的投影规格
+    
+    "owner.login" 表示嵌套字段，"data[].id" 表示对列表中每个元素取字段。
+    ("data[].id", "data[].name", "meta") -> {"data[]": {"id": None, "name": None}, "meta": None}
+    """
+    spec: Dict[str, Any] = {}
+    for path in paths:
+        node = spec
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+        node.setdefault(parts[-1], None)
+    return spec
+
+
+def apply_projection(value: Any, spec: Optional[Dict[str, Any]]) -> Any:
+    """按投影规格裁剪响应，只保留声明的字段"""
+    if spec is None or not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, child in spec.items():
+        if key.endswith("[]"):
+            items = value.get(key[:-2])
+            if isinstance(items, list):
+                projected[key[:-2]] = [apply_projection(item, child) for item in items]
+        elif key in value:
+            projected[key] = apply_projection(value[key], child)
+    return projected
+
+
+# ============= 适配器特性 =============
+@dataclass(frozen=True)
+class AdapterTraits:
+    """适配器特性声明"""
+    pooled: bool = True                                   # 是否复用连接（HTTP 连接池 / 数据库连接）
+    pool_size: int = 10                                   # 连接池大小
+    cacheable_commands: FrozenSet[str] = frozenset()      # 结果可缓存的只读命令
+    cache_ttl_seconds: float = 30.0                       # 缓存有效期（秒）
+    cache_max_entries: int = 1024                         # 缓存条目上限（超出后淘汰最久未使用的）
+    idempotent_commands: FrozenSet[str] = frozenset()     # 可安全重试的命令
+
+
+def adapter_command(name: str) -> Callable:
+    """
+    把适配器方法注册为命令处理函数
+    
+    使用方法:
+    @adapter_command("get_repo")
+    def get_repo(self, parameters):
+        return {...}
+    """
+    def decorator(func: Callable) -> Callable:
+        func._adapter_command = name
+        return func
+    return decorator
+
+
+# ============= 适配器基类 =============
+class ToolAdapter:
+    """工具适配器基类 - 命令分发为一次字典查找"""
+    
+    tool_name = "generic"
+    display_name = "Generic"
+    traits = AdapterTraits()
+    
+    # 命令名 -> 方法名，由 __init_subclass__ 在类定义时构建
+    COMMANDS: Dict[str, str] = {}
+    
+    # 命令名 -> 写入操作日志时保留的响应字段（未声明的命令保留完整响应）
+    RESPONSE_PROJECTIONS: Dict[str, Tuple[str, ...]] = {}
+    _projection_specs: Dict[str, Dict[str, Any]] = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        commands: Dict[str, str] = {}
+        for klass in reversed(cls.__mro__):
+            for attr, value in vars(klass).items():
+                command = getattr(value, "_adapter_command", None)
+                if command:
+                    commands[command] = attr
+        cls.COMMANDS = commands
+        cls._projection_specs = {
+            command: compile_projection(paths) for command, paths in cls.RESPONSE_PROJECTIONS.items()
+        }
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None, tool_name: Optional[str] = None):
+        self.config = config or {}
+        if tool_name:
+            self.tool_name = tool_name
+        
+        # 绑定后的处理函数，避免每次调用都 getattr
+        self._handlers: Dict[str, Callable] = {
+            command: getattr(self, attr) for command, attr in self.COMMANDS.items()
+        }
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        # (命令, 参数) -> (过期时间, 结果)，按最近使用排序
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.transport_factory: Optional[TransportFactory] = None
+    
+    # ----- 特性查询 -----
+    def supports(self, command: str) -> bool:
+        """是否支持该命令"""
+        return command in self._handlers
+    
+    def is_idempotent(self, command: str) -> bool:
+        """命令失败后是否可以安全重试"""
+        return command in self.traits.idempotent_commands
+    
+    # ----- HTTP 连接 -----
+    @property
+    def session(self) -> requests.Session:
+        """共享的 HTTP 会话（仅 pooled 适配器；非 pooled 请求由 request() 按次创建并关闭）"""
+        if not self.traits.pooled:
+            raise RuntimeError(f"{self.display_name} adapter is not pooled; use request()")
+        
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._new_session()
+        return self._session
+    
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        if self.transport_factory is not None:
+            transport = self.transport_factory(self)
+        else:
+            transport = TracingTransport(
+                pool_connections=self.traits.pool_size,
+                pool_maxsize=self.traits.pool_size
+            )
+        session.mount("http://", transport)
+        session.mount("https://", transport)
+        return session
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送 HTTP 请求（默认带超时，避免探测或调用无限挂起）"""
+        kwargs.setdefault("timeout", self.config.get("timeout", DEFAULT_TIMEOUT_SECONDS))
+        if self.traits.pooled:
+            return self.session.request(method, url, **kwargs)
+        
+        # 非 pooled：每次调用一个会话，读完响应体后立即关闭，避免泄漏连接
+        with self._new_session() as session:
+            response = session.request(method, url, **kwargs)
+            response.content
+            return response
+    
+    # ----- 命令执行 -----
+    def execute(self, command: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """执行命令"""
+        handler = self._handlers.get(command)
+        if handler is None:
+            return self.unknown_command(command, parameters)
+        
+        token = CURRENT_OPERATION.set((self.tool_name, command))
+        try:
+            if command not in self.traits.cacheable_commands:
+                return handler(parameters)
+            
+            cache_key = (command, json.dumps(parameters, sort_keys=True, default=str))
+            found, cached = self._cache_get(cache_key)
+            if found:
+                return cached
+            
+            result = handler(parameters)
+            self._cache_put(cache_key, result)
+            return result
+        finally:
+            CURRENT_OPERATION.reset(token)
+    
+    def unknown_command(self, command: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """处理未注册的命令"""
+        raise ValueError(f"Unknown {self.display_name} command: {command}")
+    
+    def project_response(self, command: str, response: Any) -> Any:
+        """按命令的投影裁剪响应（用于写日志）"""
+        spec = self._projection_specs.get(command)
+        if spec is None:
+            return response
+        return apply_projection(response, spec)
+    
+    def cache_result(self, command: str, parameters: Dict[str, Any], result: Any):
+        """写入命令结果缓存（如批量读取后回填单条读取的缓存）"""
+        if command in self.traits.cacheable_commands:
+            self._cache_put((command, json.dumps(parameters, sort_keys=True, default=str)), result)
+    
+    def _cache_get(self, cache_key: Tuple[str, str]) -> Tuple[bool, Any]:
+        """命中时返回结果的副本（调用方修改不影响缓存）；过期条目在查找时删除"""
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+            if cached is None:
+                return False, None
+            if cached[0] <= time.monotonic():
+                del self._cache[cache_key]
+                return False, None
+            self._cache.move_to_end(cache_key)
+            value = cached[1]
+        return True, copy.deepcopy(value)
+    
+    def _cache_put(self, cache_key: Tuple[str, str], result: Any):
+        """保存结果的副本，超过 cache_max_entries 时淘汰最久未使用的条目"""
+        entry = (time.monotonic() + self.traits.cache_ttl_seconds, copy.deepcopy(result))
+        with self._cache_lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.traits.cache_max_entries:
+                self._cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """清空结果缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    # ----- 健康检查 -----
+    def health_check(self) -> Dict[str, Any]:
+        """检查工具状态（子类重写）"""
+        return {"tool": self.tool_name, "status": "unknown"}
+    
+    def close(self):
+        """释放连接"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+# ============= 通用适配器 =============
+class GenericAdapter(ToolAdapter):
+    """未注册工具的兜底适配器 - 原样回显命令"""
+    
+    traits = AdapterTraits(pooled=False)
+    
+    def is_idempotent(self, command: str) -> bool:
+        return True
+    
+    def unknown_command(self, command: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "executed",
+            "tool": self.tool_name,
+            "command": command,
+            "parameters": parameters,
+            "timestamp": datetime.now().isoformat()
+        }
@@ -0,0 +1,78 @@
+"""
+数据库适配器（SQLite）
+"""
+
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+class DatabaseAdapter(ToolAdapter):
+    """数据库适配器 - 目前支持 sqlite:///path 形式的连接串"""
+    
+    tool_name = "database"
+    display_name = "Database"
+    traits = AdapterTraits(
+        pooled=True,
+        pool_size=1,
+        idempotent_commands=frozenset({"query"})
+    )
+    
+    RESPONSE_PROJECTIONS = {
+        "query": ("row_count",),
+    }
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None, tool_name: Optional[str] = None):
+        super().__init__(config, tool_name)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.Lock()
+    
+    def _database_path(self) -> str:
+        url = self.config.get("url", "")
+        if not url.startswith("sqlite:///"):
+            raise ValueError(f"Unsupported database url: {url or '<empty>'}")
+        return url[len("sqlite:///"):]
+    
+    def _connection(self) -> sqlite3.Connection:
+        if self.traits.pooled and self._conn is not None:
+            return self._conn
+        
+        conn = sqlite3.connect(self._database_path(), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.traits.pooled:
+            self._conn = conn
+        return conn
+    
+    @adapter_command("query")
+    def query(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """执行只读查询"""
+        with self._conn_lock:
+            cursor = self._connection().execute(parameters["sql"], parameters.get("params", ()))
+            rows = [dict(row) for row in cursor.fetchall()]
+        return {"rows": rows, "row_count": len(rows)}
+    
+    @adapter_command("execute")
+    def execute_statement(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """执行写操作"""
+        with self._conn_lock:
+            conn = self._connection()
+            cursor = conn.execute(parameters["sql"], parameters.get("params", ()))
+            conn.commit()
+        return {"row_count": cursor.rowcount, "last_row_id": cursor.lastrowid}
+    
+    def health_check(self) -> Dict[str, Any]:
+        if not self.config.get("url"):
+            return {"tool": self.tool_name, "status": "not_configured", "message": "缺少 DATABASE_URL"}
+        
+        with self._conn_lock:
+            self._connection().execute("SELECT 1").fetchone()
+        return {"tool": self.tool_name, "status": "healthy"}
+    
+    def close(self):
+        super().close()
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,251 @@
+"""
+GitHub 适配器
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+# 批量读取仓库时请求的字段；每个仓库只含对象字段，不含分页连接，节点数为常数
+_REPO_FIELDS = """
+fragment RepoFields on Repository {
+  id
+  databaseId
+  name
+  nameWithOwner
+  owner { login }
+  description
+  url
+  homepageUrl
+  isPrivate
+  isFork
+  isArchived
+  stargazerCount
+  forkCount
+  diskUsage
+  primaryLanguage { name }
+  defaultBranchRef { name }
+  createdAt
+  updatedAt
+  pushedAt
+}
+"""
+
+# 单个查询最多合并的仓库数：没有分页连接的查询按点数计费很低，真正的限制是查询体积与服务端超时
+_MAX_REPOS_PER_QUERY = 100
+
+
+def _repo_to_rest(node: Dict[str, Any]) -> Dict[str, Any]:
+    """把 GraphQL Repository 节点转换成 REST get_repo 的字段名"""
+    return {
+        "id": node.get("databaseId"),
+        "node_id": node.get("id"),
+        "name": node.get("name"),
+        "full_name": node.get("nameWithOwner"),
+        "owner": {"login": (node.get("owner") or {}).get("login")},
+        "description": node.get("description"),
+        "html_url": node.get("url"),
+        "homepage": node.get("homepageUrl"),
+        "private": node.get("isPrivate"),
+        "fork": node.get("isFork"),
+        "archived": node.get("isArchived"),
+        "stargazers_count": node.get("stargazerCount"),
+        "forks_count": node.get("forkCount"),
+        "size": node.get("diskUsage"),
+        "language": (node.get("primaryLanguage") or {}).get("name"),
+        "default_branch": (node.get("defaultBranchRef") or {}).get("name"),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+        "pushed_at": node.get("pushedAt")
+    }
+
+
+class GitHubAdapter(ToolAdapter):
+    """GitHub REST / GraphQL API 适配器"""
+    
+    tool_name = "github"
+    display_name = "GitHub"
+    traits = AdapterTraits(
+        pooled=True,
+        cacheable_commands=frozenset({"get_repo"}),
+        cache_ttl_seconds=60.0,
+        idempotent_commands=frozenset({"get_repo", "get_repos"})
+    )
+    
+    RESPONSE_PROJECTIONS = {
+        "get_repo": (
+            "id", "full_name", "private", "html_url", "default_branch", "language",
+            "stargazers_count", "forks_count", "open_issues_count", "archived", "pushed_at"
+        ),
+        "create_issue": ("id", "number", "html_url", "state", "title"),
+    }
+    
+    # 每个 GraphQL 查询最多合并的仓库数
+    DEFAULT_BATCH_SIZE = 100
+    
+    @property
+    def base_url(self) -> str:
+        return self.config.get("base_url", "https://api.github.com")
+    
+    @property
+    def graphql_url(self) -> str:
+        if self.config.get("graphql_url"):
+            return self.config["graphql_url"]
+        # GitHub Enterprise: https://host/api/v3 -> https://host/api/graphql
+        if self.base_url.rstrip("/").endswith("/api/v3"):
+            return self.base_url.rstrip("/")[:-len("/v3")] + "/graphql"
+        return f"{self.base_url.rstrip('/')}/graphql"
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"token {self.config.get('token', '')}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+    
+    @adapter_command("get_repo")
+    def get_repo(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """获取仓库信息"""
+        owner = parameters.get("owner")
+        repo = parameters.get("repo")
+        response = self.request(
+            "GET",
+            f"{self.base_url}/repos/{owner}/{repo}",
+            headers=self._headers()
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @adapter_command("get_repos")
+    def get_repos(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        批量获取仓库信息
+        
+        多个仓库合并为带别名的 GraphQL 查询；GraphQL 失败的仓库逐个退回 REST get_repo。
+        
+        Args:
+            parameters: {"repos": [{"owner": ..., "repo": ...}, ...], "batch_size": 100}
+        
+        Returns:
+            {"results": [{"owner", "repo", "transport", "result" | "error"}...], "rate_limit": {...}}
+        """
+        repos: List[Dict[str, Any]] = parameters.get("repos", [])
+        batch_size = max(1, min(parameters.get("batch_size", self.DEFAULT_BATCH_SIZE), _MAX_REPOS_PER_QUERY))
+        
+        results: List[Dict[str, Any]] = []
+        rate_limit: Dict[str, Any] = {}
+        start = 0
+        size = 0
+        while start < len(repos):
+            size = self._next_batch_size(batch_size, rate_limit, size)
+            if size == 0:
+                # 点数耗尽：剩余仓库不再请求，直到 resetAt
+                message = f"GitHub GraphQL rate limit exhausted (resets at {rate_limit.get('resetAt')})"
+                results.extend(
+                    {
+                        "owner": item.get("owner"), "repo": item.get("repo"), "transport": "graphql",
+                        "error": message, "started_at": datetime.now(), "duration_ms": 0.0
+                    }
+                    for item in repos[start:]
+                )
+                break
+            batch = repos[start:start + size]
+            batch_results, batch_rate_limit = self._graphql_batch(batch)
+            results.extend(batch_results)
+            rate_limit = batch_rate_limit or rate_limit
+            start += size
+        
+        return {"results": results, "rate_limit": rate_limit}
+    
+    @staticmethod
+    def _next_batch_size(batch_size: int, rate_limit: Dict[str, Any], last_size: int) -> int:
+        """按上一批返回的 cost 估算每个仓库的点数，下一批的花费不超过剩余点数"""
+        remaining = rate_limit.get("remaining")
+        if remaining is None or not last_size:
+            return batch_size
+        if remaining <= 0:
+            return 0
+        cost_per_repo = max(rate_limit.get("cost") or 1, 1) / last_size
+        return max(1, min(batch_size, int(remaining / cost_per_repo)))
+    
+    def _graphql_batch(self, batch: List[Dict[str, Any]]):
+        variables: Dict[str, Any] = {}
+        declarations = []
+        selections = []
+        for i, item in enumerate(batch):
+            variables[f"o{i}"] = item.get("owner")
+            variables[f"n{i}"] = item.get("repo")
+            declarations.append(f"$o{i}: String!, $n{i}: String!")
+            selections.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...RepoFields }}")
+        query = (
+            f"query({', '.join(declarations)}) {{\n  "
+            + "\n  ".join(selections)
+            + "\n  rateLimit { cost remaining resetAt }\n}\n"
+            + _REPO_FIELDS
+        )
+        
+        data: Dict[str, Any] = {}
+        started_at = datetime.now()
+        started = time.perf_counter()
+        try:
+            response = self.request(
+                "POST",
+                self.graphql_url,
+                headers={"Authorization": f"bearer {self.config.get('token', '')}"},
+                json={"query": query, "variables": variables}
+            )
+            response.raise_for_status()
+            data = response.json().get("data") or {}
+        except Exception:
+            # 整批失败时全部退回 REST
+            data = {}
+        graphql_ms = (time.perf_counter() - started) * 1000
+        
+        # 每条结果带上自己那次请求的开始时间与耗时：GraphQL 结果为所在批次的查询耗时，REST 结果为单独请求的耗时
+        results = []
+        for i, item in enumerate(batch):
+            entry = {"owner": item.get("owner"), "repo": item.get("repo")}
+            node = data.get(f"r{i}")
+            if node is not None:
+                entry["transport"] = "graphql"
+                entry["result"] = _repo_to_rest(node)
+                entry["started_at"] = started_at
+                entry["duration_ms"] = graphql_ms
+                self.cache_result("get_repo", {"owner": entry["owner"], "repo": entry["repo"]}, entry["result"])
+            else:
+                entry["transport"] = "rest"
+                entry["started_at"] = datetime.now()
+                rest_started = time.perf_counter()
+                try:
+                    entry["result"] = self.get_repo({"owner": entry["owner"], "repo": entry["repo"]})
+                except Exception as e:
+                    entry["error"] = str(e)
+                entry["duration_ms"] = (time.perf_counter() - rest_started) * 1000
+            results.append(entry)
+        return results, data.get("rateLimit")
+    
+    @adapter_command("create_issue")
+    def create_issue(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """创建 Issue"""
+        owner = parameters.get("owner")
+        repo = parameters.get("repo")
+        response = self.request(
+            "POST",
+            f"{self.base_url}/repos/{owner}/{repo}/issues",
+            headers=self._headers(),
+            json=parameters.get("data", {})
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def health_check(self) -> Dict[str, Any]:
+        response = self.request(
+            "GET",
+            f"{self.base_url}/user",
+            headers={"Authorization": f"token {self.config.get('token', '')}"}
+        )
+        if response.status_code == 200:
+            return {"tool": self.tool_name, "status": "healthy", "user": response.json()}
+        return {"tool": self.tool_name, "status": "unknown"}
@@ -0,0 +1,61 @@
+"""
+通用 HTTP API 适配器
+"""
+
+from typing import Any, Dict
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+class HttpEndpointAdapter(ToolAdapter):
+    """任意 HTTP API 适配器 - 以 base_url 为前缀发送请求"""
+    
+    tool_name = "api_endpoints"
+    display_name = "API endpoints"
+    traits = AdapterTraits(
+        pooled=True,
+        idempotent_commands=frozenset({"get"})
+    )
+    
+    @property
+    def base_url(self) -> str:
+        return self.config.get("base_url", "").rstrip("/")
+    
+    def _send(self, method: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.request(
+            method,
+            f"{self.base_url}{parameters.get('path', '')}",
+            headers={**self.config.get("headers", {}), **parameters.get("headers", {})},
+            params=parameters.get("params"),
+            json=parameters.get("json")
+        )
+        response.raise_for_status()
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        return {"status_code": response.status_code, "body": body}
+    
+    @adapter_command("get")
+    def get(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """GET 请求"""
+        return self._send("GET", parameters)
+    
+    @adapter_command("post")
+    def post(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """POST 请求"""
+        return self._send("POST", parameters)
+    
+    @adapter_command("request")
+    def send_request(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """任意方法请求"""
+        return self._send(parameters.get("method", "GET").upper(), parameters)
+    
+    def health_check(self) -> Dict[str, Any]:
+        if not self.base_url:
+            return {"tool": self.tool_name, "status": "not_configured", "message": "缺少 API_ENDPOINTS_BASE_URL"}
+        
+        response = self.request("GET", f"{self.base_url}{self.config.get('health_path', '/health')}")
+        if response.status_code == 200:
+            return {"tool": self.tool_name, "status": "healthy"}
+        return {"tool": self.tool_name, "status": "unknown"}
@@ -0,0 +1,76 @@
+"""
+Jira 适配器
+"""
+
+from typing import Any, Dict
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+class JiraAdapter(ToolAdapter):
+    """Jira REST API (v2) 适配器"""
+    
+    tool_name = "jira"
+    display_name = "Jira"
+    traits = AdapterTraits(
+        pooled=True,
+        cacheable_commands=frozenset({"get_issue"}),
+        cache_ttl_seconds=30.0,
+        idempotent_commands=frozenset({"get_issue", "search_issues"})
+    )
+    
+    RESPONSE_PROJECTIONS = {
+        "get_issue": ("id", "key", "fields.summary", "fields.status.name", "fields.assignee.displayName"),
+        "search_issues": ("total", "issues[].key"),
+        "create_issue": ("id", "key"),
+        "add_comment": ("id",),
+    }
+    
+    @property
+    def base_url(self) -> str:
+        return self.config.get("base_url", "").rstrip("/")
+    
+    def _auth(self):
+        return (self.config.get("email", ""), self.config.get("api_token", ""))
+    
+    def _call(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        response = self.request(
+            method,
+            f"{self.base_url}/rest/api/2{path}",
+            auth=self._auth(),
+            headers={"Accept": "application/json"},
+            **kwargs
+        )
+        response.raise_for_status()
+        return response.json() if response.content else {}
+    
+    @adapter_command("get_issue")
+    def get_issue(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """获取 Issue"""
+        return self._call("GET", f"/issue/{parameters.get('issue_key')}")
+    
+    @adapter_command("search_issues")
+    def search_issues(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """JQL 搜索"""
+        return self._call("GET", "/search", params=parameters)
+    
+    @adapter_command("create_issue")
+    def create_issue(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """创建 Issue"""
+        return self._call("POST", "/issue", json={"fields": parameters.get("fields", {})})
+    
+    @adapter_command("add_comment")
+    def add_comment(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """添加评论"""
+        return self._call(
+            "POST",
+            f"/issue/{parameters.get('issue_key')}/comment",
+            json={"body": parameters.get("body", "")}
+        )
+    
+    def health_check(self) -> Dict[str, Any]:
+        if not self.base_url:
+            return {"tool": self.tool_name, "status": "not_configured", "message": "缺少 JIRA_BASE_URL"}
+        
+        user = self._call("GET", "/myself")
+        return {"tool": self.tool_name, "status": "healthy", "user": user.get("displayName")}
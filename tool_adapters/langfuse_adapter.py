@@ -0,0 +1,221 @@
+"""
+Langfuse 适配器
+"""
+
+import contextvars
+import gzip
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Tuple
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+# 摄取接口单个请求体的大小上限（Langfuse 限制约 3.5MB，留出余量）
+DEFAULT_MAX_BATCH_BYTES = 3_000_000
+
+# 批次级别的重试次数（事件 ID 不变，服务端按 ID 去重，可安全重试）
+_BATCH_RETRIES = 2
+
+# 429 的 Retry-After 最多等待的秒数
+_MAX_RETRY_AFTER_SECONDS = 30.0
+
+_BATCH_PREFIX = b'{"batch":['
+_BATCH_SUFFIX = b']}'
+
+
+def _retry_delay(response: Any, attempt: int) -> float:
+    """重试前的等待：429 优先使用 Retry-After（秒数或 HTTP 日期），否则指数退避"""
+    backoff = 0.5 * 2 ** attempt
+    if response is None or response.status_code != 429:
+        return backoff
+    value = response.headers.get("Retry-After")
+    if not value:
+        return backoff
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return backoff
+    return min(max(delay, 0.0), _MAX_RETRY_AFTER_SECONDS)
+
+
+class LangfuseAdapter(ToolAdapter):
+    """Langfuse 公共 API 适配器"""
+    
+    tool_name = "langfuse"
+    display_name = "Langfuse"
+    traits = AdapterTraits(
+        pooled=True,
+        idempotent_commands=frozenset({"get_traces"})
+    )
+    
+    RESPONSE_PROJECTIONS = {
+        "get_traces": ("data[].id", "data[].name", "data[].timestamp", "meta"),
+        "create_trace": ("id",),
+        "create_traces": ("total", "succeeded", "failed", "batches"),
+    }
+    
+    @property
+    def base_url(self) -> str:
+        return self.config.get("base_url", "http://localhost:3000")
+    
+    def _auth_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.config.get('public_key', '')}:{self.config.get('secret_key', '')}"
+        }
+    
+    @adapter_command("get_traces")
+    def get_traces(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """获取追踪记录"""
+        response = self.request(
+            "GET",
+            f"{self.base_url}/api/public/traces",
+            headers=self._auth_headers(),
+            params=parameters
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @adapter_command("create_trace")
+    def create_trace(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """创建追踪"""
+        response = self.request(
+            "POST",
+            f"{self.base_url}/api/public/traces",
+            headers=self._auth_headers(),
+            json=parameters
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    @adapter_command("create_traces")
+    def create_traces(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        批量创建追踪（摄取接口）
+        
+        Args:
+            parameters: {
+                "traces": [trace_body, ...],
+                "max_batch_bytes": 3000000,   # 单批请求体上限
+                "gzip": False,                # 是否压缩请求体
+                "concurrency": 4              # 并发上传的批次数
+            }
+        
+        Returns:
+            {"total", "succeeded", "failed", "batches",
+             "results": [{"index", "trace_id", "event_id", "status", "error"}...]}，results 与 traces 一一对应
+        """
+        traces: List[Dict[str, Any]] = parameters.get("traces", [])
+        max_batch_bytes = parameters.get("max_batch_bytes", DEFAULT_MAX_BATCH_BYTES)
+        use_gzip = parameters.get("gzip", False)
+        concurrency = max(1, min(parameters.get("concurrency", 4), self.traits.pool_size))
+        
+        results: List[Dict[str, Any]] = []
+        batches: List[List[Tuple[int, str, bytes]]] = []
+        current: List[Tuple[int, str, bytes]] = []
+        current_bytes = len(_BATCH_PREFIX) + len(_BATCH_SUFFIX)
+        timestamp = datetime.now(timezone.utc).isoformat()
+        
+        for index, trace in enumerate(traces):
+            body = dict(trace)
+            body.setdefault("id", str(uuid.uuid4()))
+            event_id = str(uuid.uuid4())
+            encoded = json.dumps(
+                {"id": event_id, "type": "trace-create", "timestamp": timestamp, "body": body},
+                ensure_ascii=False,
+                separators=(",", ":"),
+                default=str
+            ).encode("utf-8")
+            results.append({"index": index, "trace_id": body["id"], "event_id": event_id, "status": None, "error": None})
+            
+            event_bytes = len(encoded) + 1  # 逗号
+            if event_bytes + len(_BATCH_PREFIX) + len(_BATCH_SUFFIX) > max_batch_bytes:
+                results[index].update(status=413, error=f"事件过大: {len(encoded)} bytes")
+                continue
+            if current and current_bytes + event_bytes > max_batch_bytes:
+                batches.append(current)
+                current = []
+                current_bytes = len(_BATCH_PREFIX) + len(_BATCH_SUFFIX)
+            current.append((index, event_id, encoded))
+            current_bytes += event_bytes
+        if current:
+            batches.append(current)
+        
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+                # 每个批次在调用方上下文的副本中执行，请求带上当前 span 的 traceparent
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._ingest_batch, batch, use_gzip)
+                    for batch in batches
+                ]
+                for batch, outcome in zip(batches, (future.result() for future in futures)):
+                    for index, event_id, _ in batch:
+                        status, error = outcome.get(event_id, (None, "服务端未返回该事件结果"))
+                        results[index].update(status=status, error=error)
+        
+        succeeded = sum(1 for r in results if r["error"] is None)
+        return {
+            "total": len(traces),
+            "succeeded": succeeded,
+            "failed": len(traces) - succeeded,
+            "batches": len(batches),
+            "results": results
+        }
+    
+    def _ingest_batch(self, batch: List[Tuple[int, str, bytes]], use_gzip: bool) -> Dict[str, Tuple[Any, Any]]:
+        """上传一批事件，返回 event_id -> (status, error)"""
+        body = _BATCH_PREFIX + b",".join(encoded for _, _, encoded in batch) + _BATCH_SUFFIX
+        headers = {**self._auth_headers(), "Content-Type": "application/json"}
+        if use_gzip:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        
+        event_ids = [event_id for _, event_id, _ in batch]
+        error = None
+        for attempt in range(_BATCH_RETRIES + 1):
+            try:
+                response = self.request(
+                    "POST",
+                    f"{self.base_url}/api/public/ingestion",
+                    headers=headers,
+                    data=body
+                )
+                # 5xx 与 429 限流可重试，其余状态码直接返回
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+                error = f"HTTP {response.status_code}"
+            except Exception as e:
+                response = None
+                error = str(e)
+            if attempt < _BATCH_RETRIES:
+                time.sleep(_retry_delay(response, attempt))
+        
+        if response is None or (response.status_code >= 400 and response.status_code != 207):
+            message = error if response is None else f"HTTP {response.status_code}: {response.text[:200]}"
+            status = None if response is None else response.status_code
+            return {event_id: (status, message) for event_id in event_ids}
+        
+        try:
+            data = response.json() if response.content else {}
+        except ValueError:
+            message = f"无法解析响应 (HTTP {response.status_code}): {response.text[:200]}"
+            return {event_id: (response.status_code, message) for event_id in event_ids}
+        outcome: Dict[str, Tuple[Any, Any]] = {}
+        for item in data.get("successes", []):
+            outcome[item["id"]] = (item.get("status", 201), None)
+        for item in data.get("errors", []):
+            outcome[item["id"]] = (item.get("status"), item.get("message") or item.get("error") or "ingestion error")
+        return outcome
+    
+    def health_check(self) -> Dict[str, Any]:
+        response = self.request("GET", f"{self.base_url}/api/public/health")
+        if response.status_code == 200:
+            return {"tool": self.tool_name, "status": "healthy"}
+        return {"tool": self.tool_name, "status": "unknown"}
@@ -0,0 +1,110 @@
+"""
+工具适配器注册表
+工具名 -> "模块:类名"，首次使用时才导入对应模块，之后为一次字典查找
+"""
+
+import importlib
+import threading
+from typing import Any, Dict, List, Optional, Type, Union
+
+from .base import GenericAdapter, ToolAdapter, TransportFactory
+
+
+# 内置适配器（延迟导入）
+ADAPTER_SPECS: Dict[str, str] = {
+    "langfuse": "tool_adapters.langfuse_adapter:LangfuseAdapter",
+    "github": "tool_adapters.github_adapter:GitHubAdapter",
+    "slack": "tool_adapters.slack_adapter:SlackAdapter",
+    "jira": "tool_adapters.jira_adapter:JiraAdapter",
+    "database": "tool_adapters.database_adapter:DatabaseAdapter",
+    "api_endpoints": "tool_adapters.http_adapter:HttpEndpointAdapter",
+}
+
+
+class AdapterRegistry:
+    """适配器注册表 - 按工具名缓存适配器实例"""
+    
+    def __init__(
+        self,
+        tool_configs: Dict[str, Dict[str, Any]],
+        specs: Optional[Dict[str, Union[str, Type[ToolAdapter]]]] = None
+    ):
+        self.tool_configs = tool_configs
+        self._specs: Dict[str, Union[str, Type[ToolAdapter]]] = dict(
+            ADAPTER_SPECS if specs is None else specs
+        )
+        self._adapters: Dict[str, ToolAdapter] = {}
+        self._lock = threading.Lock()
+        self.transport_factory: Optional[TransportFactory] = None
+    
+    def register(self, tool_name: str, adapter: Union[str, Type[ToolAdapter]]):
+        """注册适配器：类，或 "模块:类名" 形式的延迟导入路径"""
+        with self._lock:
+            self._specs[tool_name] = adapter
+            old = self._adapters.pop(tool_name, None)
+        if old is not None:
+            old.close()
+    
+    def get(self, tool_name: str) -> ToolAdapter:
+        """获取适配器实例（首次调用时导入并实例化）"""
+        adapter = self._adapters.get(tool_name)
+        if adapter is not None:
+            return adapter
+        
+        with self._lock:
+            adapter = self._adapters.get(tool_name)
+            if adapter is None:
+                adapter = self._load(tool_name)
+                self._adapters[tool_name] = adapter
+        return adapter
+    
+    def _load(self, tool_name: str) -> ToolAdapter:
+        spec = self._specs.get(tool_name)
+        
+        if spec is None:
+            adapter_cls: Type[ToolAdapter] = GenericAdapter
+        elif isinstance(spec, str):
+            module_name, _, class_name = spec.partition(":")
+            adapter_cls = getattr(importlib.import_module(module_name), class_name)
+        else:
+            adapter_cls = spec
+        
+        adapter = adapter_cls(self.tool_configs.get(tool_name), tool_name=tool_name)
+        adapter.transport_factory = self.transport_factory
+        return adapter
+    
+    def set_transport_factory(self, factory: Optional[TransportFactory]):
+        """
+        替换所有适配器的 HTTP 传输层（如录制 / 回放）
+        
+        已加载的适配器会关闭现有会话，下次请求时用新的传输层重建。
+        """
+        with self._lock:
+            self.transport_factory = factory
+            adapters = list(self._adapters.values())
+        for adapter in adapters:
+            adapter.transport_factory = factory
+            adapter.close()
+    
+    def project_response(self, tool_name: str, command: str, response: Any) -> Any:
+        """按工具 / 命令的投影裁剪响应；工具尚未加载时原样返回"""
+        adapter = self._adapters.get(tool_name)
+        if adapter is None:
+            return response
+        return adapter.project_response(command, response)
+    
+    def tool_names(self) -> List[str]:
+        """已注册的工具名"""
+        return list(self._specs)
+    
+    def loaded_tools(self) -> List[str]:
+        """已实例化的工具名"""
+        return list(self._adapters)
+    
+    def close(self):
+        """关闭所有已加载的适配器"""
+        with self._lock:
+            adapters = list(self._adapters.values())
+            self._adapters.clear()
+        for adapter in adapters:
+            adapter.close()
@@ -0,0 +1,69 @@
+"""
+Slack 适配器
+"""
+
+from typing import Any, Dict
+
+from .base import AdapterTraits, ToolAdapter, adapter_command
+
+
+class SlackAdapter(ToolAdapter):
+    """Slack Web API 适配器"""
+    
+    tool_name = "slack"
+    display_name = "Slack"
+    traits = AdapterTraits(
+        pooled=True,
+        cacheable_commands=frozenset({"list_channels"}),
+        cache_ttl_seconds=300.0,
+        idempotent_commands=frozenset({"list_channels", "get_channel_history"})
+    )
+    
+    RESPONSE_PROJECTIONS = {
+        "post_message": ("ok", "channel", "ts"),
+        "get_channel_history": ("ok", "has_more", "messages[].ts", "messages[].user"),
+        "list_channels": ("ok", "channels[].id", "channels[].name"),
+    }
+    
+    @property
+    def base_url(self) -> str:
+        return self.config.get("base_url", "https://slack.com/api")
+    
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.config.get('token', '')}"}
+    
+    def _call(self, method: str, api_method: str, **kwargs) -> Dict[str, Any]:
+        response = self.request(
+            method,
+            f"{self.base_url}/{api_method}",
+            headers=self._headers(),
+            **kwargs
+        )
+        response.raise_for_status()
+        data = response.json()
+        # Slack 在 HTTP 200 中通过 ok 字段返回业务错误
+        if not data.get("ok", False):
+            raise RuntimeError(f"Slack API error: {data.get('error', 'unknown_error')}")
+        return data
+    
+    @adapter_command("post_message")
+    def post_message(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """发送消息"""
+        return self._call("POST", "chat.postMessage", json=parameters)
+    
+    @adapter_command("get_channel_history")
+    def get_channel_history(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """获取频道消息历史"""
+        return self._call("GET", "conversations.history", params=parameters)
+    
+    @adapter_command("list_channels")
+    def list_channels(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """列出频道"""
+        return self._call("GET", "conversations.list", params=parameters)
+    
+    def health_check(self) -> Dict[str, Any]:
+        if not self.config.get("token"):
+            return {"tool": self.tool_name, "status": "not_configured", "message": "缺少 SLACK_BOT_TOKEN"}
+        
+        data = self._call("POST", "auth.test")
+        return {"tool": self.tool_name, "status": "healthy", "team": data.get("team")}
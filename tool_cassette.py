@@ -0,0 +1,225 @@
+"""
+工具 HTTP 录制 / 回放
+录制模式把适配器发出的每个请求、响应与耗时写入 cassette（JSONL）；
+回放模式从 cassette 返回响应，并按原始（或缩放后的）延迟等待，无需访问 GitHub / Langfuse
+
+使用方法:
+cassette = record_to(agent.adapters, "cassettes/tools.jsonl")     # 录制
+...
+replay_from(agent.adapters, "cassettes/tools.jsonl", latency_scale=0.5)   # 回放
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from http_tracing import TracingTransport
+from tool_adapters import CURRENT_OPERATION, AdapterRegistry
+
+
+# 录制的是解码后的正文，回放时这些头部不再成立
+_DROPPED_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
+
+
+def _body_bytes(body: Any) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, bytes):
+        return body
+    return b""  # 流式请求体不参与匹配
+
+
+def _body_hash(body: Any) -> str:
+    return hashlib.sha256(_body_bytes(body)).hexdigest()[:16]
+
+
+# ============= Cassette =============
+class Cassette:
+    """一组录制的 HTTP 交互"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        # (method, url, body_hash) -> 交互列表；以及只按 (method, url) 的兜底索引
+        self._exact: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._loose: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[tuple, int] = defaultdict(int)
+    
+    # ----- 录制 -----
+    def append(self, interaction: Dict[str, Any]):
+        """追加一条交互"""
+        line = json.dumps(interaction, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self._index(interaction)
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    # ----- 回放 -----
+    def load(self) -> "Cassette":
+        """读取 cassette 文件并建立索引"""
+        with self._lock:
+            self._exact.clear()
+            self._loose.clear()
+            self._cursors.clear()
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        return self
+    
+    def _index(self, interaction: Dict[str, Any]):
+        method, url = interaction["method"], interaction["url"]
+        self._exact[(method, url, interaction.get("request_body_hash", ""))].append(interaction)
+        self._loose[(method, url)].append(interaction)
+    
+    def match(self, method: str, url: str, body: Any) -> Optional[Dict[str, Any]]:
+        """
+        查找匹配的交互：先按方法 + URL + 请求体精确匹配，再退化为方法 + URL；
+        同一请求多次录制时按顺序轮流返回
+        """
+        exact_key = (method, url, _body_hash(body))
+        loose_key = (method, url)
+        with self._lock:
+            for key, index in ((exact_key, self._exact), (loose_key, self._loose)):
+                candidates = index.get(key)
+                if candidates:
+                    cursor = self._cursors[key]
+                    self._cursors[key] = cursor + 1
+                    return candidates[cursor % len(candidates)]
+        return None
+    
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._loose.values())
+
+
+# ============= 传输层 =============
+class RecordingTransport(TracingTransport):
+    """真实发送请求（保留追踪头与分阶段计时），并把请求 / 响应 / 耗时写入 cassette"""
+    
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+    
+    def send(self, request, **kwargs):
+        operation = CURRENT_OPERATION.get() or (None, None)
+        interaction = {
+            "tool": operation[0],
+            "command": operation[1],
+            "method": request.method,
+            "url": request.url,
+            "request_body_hash": _body_hash(request.body),
+            "recorded_at": datetime.now().isoformat()
+        }
+        
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+            content = response.content
+        except requests.RequestException as e:
+            interaction["elapsed_ms"] = (time.perf_counter() - start) * 1000
+            interaction["error"] = f"{type(e).__name__}: {e}"
+            self.cassette.append(interaction)
+            raise
+        
+        interaction.update({
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                key: value for key, value in response.headers.items()
+                if key.lower() not in _DROPPED_HEADERS
+            },
+            "body_b64": base64.b64encode(content).decode("ascii")
+        })
+        self.cassette.append(interaction)
+        return response
+
+
+class ReplayTransport(HTTPAdapter):
+    """从 cassette 返回响应，不访问网络"""
+    
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+    
+    def send(self, request, **kwargs):
+        interaction = self.cassette.match(request.method, request.url, request.body)
+        if interaction is None:
+            raise requests.ConnectionError(
+                f"No cassette entry for {request.method} {request.url}",
+                request=request
+            )
+        
+        delay = interaction.get("elapsed_ms", 0) / 1000 * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+        
+        if "error" in interaction:
+            raise requests.ConnectionError(f"Replayed error: {interaction['error']}", request=request)
+        
+        content = base64.b64decode(interaction.get("body_b64", ""))
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction.get("reason")
+        response.headers = CaseInsensitiveDict(interaction.get("headers", {}))
+        response.headers["Content-Length"] = str(len(content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+# ============= 便捷函数 =============
+def record_to(registry: AdapterRegistry, path: str) -> Cassette:
+    """让注册表中的所有适配器进入录制模式"""
+    cassette = Cassette(path)
+    registry.set_transport_factory(
+        lambda adapter: RecordingTransport(
+            cassette,
+            pool_connections=adapter.traits.pool_size,
+            pool_maxsize=adapter.traits.pool_size
+        )
+    )
+    return cassette
+
+
+def replay_from(registry: AdapterRegistry, path: str, latency_scale: float = 1.0) -> Cassette:
+    """让注册表中的所有适配器从 cassette 回放"""
+    cassette = Cassette(path).load()
+    registry.set_transport_factory(lambda adapter: ReplayTransport(cassette, latency_scale))
+    return cassette
+
+
+def stop_cassette(registry: AdapterRegistry, cassette: Optional[Cassette] = None):
+    """恢复真实网络传输"""
+    registry.set_transport_factory(None)
+    if cassette is not None:
+        cassette.close()
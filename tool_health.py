@@ -0,0 +1,211 @@
+"""
+工具健康检查子系统
+并发探测所有已配置工具，结果带 TTL 缓存，后台按抖动间隔刷新
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+
+# ============= 数据模型 =============
+@dataclass
+class ToolHealthSnapshot:
+    """一次探测的结果"""
+    tool: str
+    result: Dict[str, Any]
+    latency_ms: float
+    checked_at: datetime
+    expires_at: float  # time.monotonic() 时间戳
+    
+    @property
+    def status(self) -> str:
+        return self.result.get("status", "unknown")
+    
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.expires_at
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.result,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at.isoformat()
+        }
+
+
+# ============= 健康监控 =============
+class ToolHealthMonitor:
+    """
+    工具健康监控
+    
+    使用方法:
+    monitor = ToolHealthMonitor(probe=agent._probe_tool_status, tools=lambda: agent.tool_configs)
+    monitor.start()                      # 后台刷新
+    monitor.get_status("github")         # 读缓存，过期时返回旧值并后台刷新
+    """
+    
+    def __init__(
+        self,
+        probe: Callable[[str], Dict[str, Any]],
+        tools: Callable[[], Iterable[str]],
+        ttl_seconds: float = 30.0,
+        refresh_interval: float = 15.0,
+        jitter: float = 0.2,
+        probe_timeout: float = 10.0,
+        history_size: int = 120,
+        max_workers: int = 8
+    ):
+        self.probe = probe
+        self.tools = tools
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval = refresh_interval
+        self.jitter = jitter
+        self.probe_timeout = probe_timeout
+        self.history_size = history_size
+        self.max_workers = max_workers
+        
+        self._snapshots: Dict[str, ToolHealthSnapshot] = {}
+        self._latency_history: Dict[str, Deque[float]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+    
+    # ----- 读取（只读缓存） -----
+    def get_snapshot(self, tool_name: str) -> Optional[ToolHealthSnapshot]:
+        """读取缓存中的探测结果（不触发探测，可能已过期）"""
+        return self._snapshots.get(tool_name)
+    
+    def get_status(self, tool_name: str) -> Dict[str, Any]:
+        """
+        读取工具状态
+
+        过期时立即返回旧结果（带 stale 标记）并在后台刷新；
+        从未探测过时同步探测，最多等待 probe_timeout 秒
+        """
+        snapshot = self._snapshots.get(tool_name)
+        if snapshot is None:
+            future = self._submit(tool_name)
+            try:
+                snapshot = future.result(timeout=self.probe_timeout)
+            except FutureTimeoutError:
+                snapshot = self._store_timeout(tool_name)
+        elif not snapshot.is_fresh():
+            self._submit(tool_name)
+            return {**snapshot.to_dict(), "stale": True}
+        return snapshot.to_dict()
+    
+    def get_all_statuses(self, refresh_stale: bool = True) -> Dict[str, Dict[str, Any]]:
+        """读取所有工具状态；refresh_stale 时并发探测过期的工具"""
+        if refresh_stale:
+            now = time.monotonic()
+            stale = [
+                tool for tool in self.tools()
+                if tool not in self._snapshots or not self._snapshots[tool].is_fresh(now)
+            ]
+            if stale:
+                self.probe_all(stale)
+        return {tool: snapshot.to_dict() for tool, snapshot in self._snapshots.items()}
+    
+    def latency_history(self, tool_name: str) -> List[float]:
+        """探测延迟历史（毫秒，按时间顺序）"""
+        return list(self._latency_history.get(tool_name, ()))
+    
+    # ----- 探测 -----
+    def probe_all(self, tools: Optional[Iterable[str]] = None) -> Dict[str, ToolHealthSnapshot]:
+        """并发探测所有（或指定）工具，超时的工具记为 timeout"""
+        tool_names = list(tools if tools is not None else self.tools())
+        futures = {tool: self._submit(tool) for tool in tool_names}
+        wait(futures.values(), timeout=self.probe_timeout)
+        
+        results = {}
+        for tool, future in futures.items():
+            if future.done():
+                results[tool] = future.result()
+            else:
+                results[tool] = self._store_timeout(tool)
+        return results
+    
+    def _store_timeout(self, tool_name: str) -> ToolHealthSnapshot:
+        return self._store(
+            tool_name,
+            {"tool": tool_name, "status": "timeout", "error": f"探测超过 {self.probe_timeout}s"},
+            self.probe_timeout * 1000
+        )
+    
+    def _submit(self, tool_name: str) -> Future:
+        """提交探测任务；同一工具同时只有一个探测在进行"""
+        with self._lock:
+            future = self._inflight.get(tool_name)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="tool-health"
+                    )
+                future = self._executor.submit(self._probe_one, tool_name)
+                self._inflight[tool_name] = future
+                future.add_done_callback(lambda _, tool=tool_name: self._inflight.pop(tool, None))
+        return future
+    
+    def _probe_one(self, tool_name: str) -> ToolHealthSnapshot:
+        start = time.perf_counter()
+        try:
+            result = self.probe(tool_name)
+        except Exception as e:
+            result = {"tool": tool_name, "status": "error", "error": str(e)}
+        latency_ms = (time.perf_counter() - start) * 1000
+        return self._store(tool_name, result, latency_ms)
+    
+    def _store(self, tool_name: str, result: Dict[str, Any], latency_ms: float) -> ToolHealthSnapshot:
+        snapshot = ToolHealthSnapshot(
+            tool=tool_name,
+            result=result,
+            latency_ms=latency_ms,
+            checked_at=datetime.now(),
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        history = self._latency_history.get(tool_name)
+        if history is None:
+            history = self._latency_history.setdefault(tool_name, deque(maxlen=self.history_size))
+        history.append(latency_ms)
+        self._snapshots[tool_name] = snapshot
+        return snapshot
+    
+    # ----- 后台刷新 -----
+    def start(self):
+        """启动后台刷新线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="tool-health-refresh", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止后台刷新并释放线程池"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.probe_timeout)
+            self._thread = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def _run(self):
+        # 首次刷新也加入抖动，避免多个 Agent 同时启动时集中探测
+        delay = random.uniform(0, self.refresh_interval * self.jitter)
+        while not self._stop_event.wait(delay):
+            try:
+                self.probe_all()
+            except Exception as e:
+                self.logger.error(f"Tool health refresh failed: {e}")
+            delay = self.refresh_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
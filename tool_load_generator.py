@@ -0,0 +1,130 @@
+"""
+工具操作负载生成器
+按 tool_operations.jsonl 中的历史节奏（N 倍速）重放操作，统计吞吐与延迟分位数；
+配合 tool_cassette 的回放传输层即可离线压测
+
+使用方法:
+python tool_load_generator.py tool_operations.jsonl cassettes/tools.jsonl 10
+"""
+
+import heapq
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from quantile_sketch import DDSketch
+
+
+def load_history(log_file: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """读取历史操作，按开始时间排序；limit 取最早的 N 条（日志行不一定按时间顺序）"""
+    operations = []
+    with open(log_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                op = json.loads(line)
+                if op.get("start_time"):
+                    operations.append(op)
+    if limit is not None:
+        return heapq.nsmallest(limit, operations, key=lambda op: op["start_time"])
+    operations.sort(key=lambda op: op["start_time"])
+    return operations
+
+
+def _percentiles(sketch: DDSketch) -> Dict[str, Optional[float]]:
+    return {
+        "p50": sketch.quantile(0.50),
+        "p95": sketch.quantile(0.95),
+        "p99": sketch.quantile(0.99),
+        "max": sketch.max if sketch.count else None
+    }
+
+
+def replay_history(
+    agent: Any,
+    operations: List[Dict[str, Any]],
+    speed: float = 1.0,
+    concurrency: int = 32
+) -> Dict[str, Any]:
+    """
+    以 speed 倍速重放历史操作
+    
+    Args:
+        agent: ToolOperationsSpecialist 实例（通常已接入回放传输层）
+        operations: load_history() 返回的操作
+        speed: 倍速，10 表示历史上 10 秒的操作在 1 秒内发出
+        concurrency: 最大并发数
+    """
+    from tool_operations_specialist_tracked import OperationType
+    
+    latency = DDSketch()
+    schedule_lag = DDSketch()
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    
+    def run(op: Dict[str, Any], due: float):
+        started = time.perf_counter()
+        record = agent.execute_operation(
+            tool_name=op["tool_name"],
+            operation_type=OperationType(op["operation_type"]),
+            command=op["command"],
+            parameters=op.get("parameters") or {}
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            latency.add(elapsed_ms)
+            schedule_lag.add(max(0.0, (started - due) * 1000))
+            statuses[record.status.value] = statuses.get(record.status.value, 0) + 1
+    
+    if not operations:
+        return {"operations": 0}
+    
+    t0 = datetime.fromisoformat(operations[0]["start_time"])
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for op in operations:
+            offset = (datetime.fromisoformat(op["start_time"]) - t0).total_seconds() / speed
+            due = wall_start + offset
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(run, op, due)
+    wall = time.perf_counter() - wall_start
+    
+    return {
+        "operations": len(operations),
+        "speed": speed,
+        "wall_seconds": wall,
+        "throughput_ops": len(operations) / wall if wall > 0 else None,
+        "statuses": statuses,
+        "latency_ms": _percentiles(latency),
+        "schedule_lag_ms": _percentiles(schedule_lag)
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("用法: python tool_load_generator.py <tool_operations.jsonl> <cassette.jsonl> [speed] [latency_scale]")
+        sys.exit(1)
+    
+    from tool_cassette import replay_from
+    from tool_operations_specialist_tracked import ToolOperationsSpecialist
+    
+    history_file, cassette_file = sys.argv[1], sys.argv[2]
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    latency_scale = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+    
+    # 负载测试写到独立日志，避免污染被重放的历史
+    agent = ToolOperationsSpecialist(agent_id="tool_ops_loadgen", log_file="loadgen_operations.jsonl")
+    cassette = replay_from(agent.adapters, cassette_file, latency_scale)
+    
+    print("\n" + "="*60)
+    print(f"🚦 负载回放: {history_file} × {speed} (cassette: {len(cassette)} 条交互)")
+    print("="*60)
+    
+    report = replay_history(agent, load_history(history_file), speed=speed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print("\n" + "="*60 + "\n")
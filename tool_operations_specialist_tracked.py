@@ -5,15 +5,23 @@ Tool Operations Specialist Agent (带 Langfuse 追踪)
 
 import os
 import json
-import requests
-from datetime import datetime
-from typing import Any, Dict, List, Optional
-from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field, replace
 from enum import Enum
 import logging
 
 # 导入追踪基类
 from agent_tracking_base import TrackedAgent, track_agent_action, langfuse_track
+from tool_adapters import AdapterRegistry
+from tool_health import ToolHealthMonitor
+from operation_serializer import encode_json, encode_record
+from blob_store import BlobStore
+from http_tracing import collect_http_timings
+from metrics_exporter import REGISTRY, operation_stats_collector, record_operation
+from operation_ids import new_operation_id
+from operation_log_writer import DEFAULT_FLUSH_TIMEOUT_SECONDS, OperationLogWriter, list_segments, segment_path
+from operation_stats import OperationStats, stats_path
 
 
 # ============= Agent 职能定义 =============
@@ -69,11 +77,12 @@ class OperationStatus(Enum):
     SUCCESS = "success"
     FAILED = "failed"
     RETRYING = "retrying"
+    REJECTED = "rejected"       # 调度队列已满，未执行
 
 
-@dataclass
+@dataclass(slots=True)
 class OperationRecord:
-    """操作记录"""
+    """操作记录（slots：不为每个实例分配 __dict__）"""
     operation_id: str
     tool_name: str
     operation_type: OperationType
@@ -86,8 +95,10 @@ class OperationRecord:
     start_time: datetime = field(default_factory=datetime.now)
     end_time: Optional[datetime] = None
     duration_ms: Optional[float] = None
+    queue_wait_ms: Optional[float] = None  # 在调度队列中等待的时间
     retry_count: int = 0
     metadata: Dict[str, Any] = field(default_factory=dict)
+    response_blob: Optional[str] = None  # 完整响应在 blob 存储中的哈希（仅日志中使用）
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -104,28 +115,135 @@ class OperationRecord:
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
             "duration_ms": self.duration_ms,
+            "queue_wait_ms": self.queue_wait_ms,
             "retry_count": self.retry_count,
-            "metadata": self.metadata
+            "metadata": self.metadata,
+            "response_blob": self.response_blob
         }
 
 
+def _timing_summary(timing: Dict[str, Any]) -> Dict[str, Any]:
+    """写入操作记录的请求计时（去掉 datetime 等冗余字段）"""
+    return {
+        key: timing[key] for key in (
+            "method", "host", "path", "status", "reused_connection",
+            "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "body_ms", "total_ms"
+        )
+    }
+
+
 # ============= 操作日志记录器 =============
 class OperationLogger:
     """操作日志记录器 - 记录所有工具交互"""
     
-    def __init__(self, log_file: str = "tool_operations.jsonl"):
+    def __init__(
+        self,
+        log_file: str = "tool_operations.jsonl",
+        per_process_segments: bool = False,
+        response_projector: Optional[Callable[[str, str, Any], Any]] = None,
+        blob_threshold_bytes: Optional[int] = 4096
+    ):
         self.log_file = log_file
+        self.per_process_segments = per_process_segments
         self.logger = logging.getLogger(__name__)
+        self._writer = OperationLogWriter(log_file, per_process_segments=per_process_segments)
+        
+        # 响应裁剪：日志只保留投影字段，超过阈值的完整响应写入内容寻址存储
+        self.response_projector = response_projector
+        self.blob_threshold_bytes = blob_threshold_bytes
+        self.blob_store = BlobStore(f"{os.path.splitext(log_file)[0]}_blobs") if blob_threshold_bytes is not None else None
+        
+        # 增量统计（多进程时每个进程维护自己的统计文件）
+        self.stats_file = stats_path(segment_path(log_file) if per_process_segments else log_file)
+        try:
+            self.stats = OperationStats.load(self.stats_file)
+        except Exception as e:
+            self.logger.error(f"Failed to load operation stats: {e}")
+            self.stats = OperationStats()
+        self.stats.start_autosave(self.stats_file)
+        
+        # /metrics：单进程模式在抓取时直接读取内存中的统计；多进程模式在记录时写入共享数值文件
+        self._metrics_collector = None
+        if REGISTRY.multiprocess_dir is None:
+            self._metrics_collector = operation_stats_collector(self)
+            REGISTRY.register_collector(self._metrics_collector)
         
     def log_operation(self, record: OperationRecord):
-        """记录操作到日志文件"""
+        """记录操作到日志文件（由写线程异步落盘）"""
         try:
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                json.dump(record.to_dict(), f, ensure_ascii=False)
-                f.write('\n')
+            compacted, response_json = self._compact(record)
+            self._writer.write(encode_record(compacted, response_json))
+            self.stats.add_record(record)
+            record_operation(record.tool_name, record.command, record.status.value, record.duration_ms)
         except Exception as e:
             self.logger.error(f"Failed to log operation: {e}")
     
+    def _compact(self, record: OperationRecord) -> Tuple[OperationRecord, Optional[bytes]]:
+        """
+        生成写入日志用的记录：响应按投影裁剪，大响应体移入 blob 存储
+        
+        同时返回日志中 response_data 已编码的字节（为判断大小已经序列化过时），写日志时直接复用
+        """
+        response = record.response_data
+        if response is None:
+            return record, None
+        
+        projected = response
+        if self.response_projector is not None:
+            projected = self.response_projector(record.tool_name, record.command, response)
+        
+        blob = None
+        body = None
+        if self.blob_store is not None:
+            body = encode_json(response)
+            if len(body) > self.blob_threshold_bytes:
+                blob = self.blob_store.put(body)
+                if projected is response:
+                    projected = None
+        
+        if projected is response and blob is None:
+            return record, body
+        return replace(record, response_data=projected, response_blob=blob), None
+    
+    def load_response(self, operation: Dict[str, Any]) -> Any:
+        """取回日志行对应的完整响应（优先从 blob 存储读取）"""
+        digest = operation.get("response_blob")
+        if digest and self.blob_store is not None:
+            body = self.blob_store.get(digest)
+            if body is not None:
+                return json.loads(body)
+        return operation.get("response_data")
+    
+    def flush(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT_SECONDS) -> bool:
+        """等待已提交的记录落盘"""
+        return self._writer.flush(timeout)
+    
+    def close(self):
+        """落盘并停止写线程"""
+        if self._metrics_collector is not None:
+            REGISTRY.unregister_collector(self._metrics_collector)
+            self._metrics_collector = None
+        self._writer.close()
+        self.stats.stop_autosave()
+        self.stats.save(self.stats_file)
+    
+    def get_stats(
+        self,
+        tool_name: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """获取操作统计（内存中的聚合，无需扫描日志）"""
+        return self.stats.summary(tool_name, command)
+    
+    def rebuild_stats(self) -> OperationStats:
+        """从历史日志重建统计"""
+        self.flush()
+        self.stats.stop_autosave()
+        self.stats = OperationStats.rebuild([self.log_file] + list_segments(self.log_file))
+        self.stats.save(self.stats_file)
+        self.stats.start_autosave(self.stats_file)
+        return self.stats
+    
     def get_operations(
         self,
         tool_name: Optional[str] = None,
@@ -133,19 +251,25 @@ class OperationLogger:
     ) -> List[Dict[str, Any]]:
         """获取操作历史"""
         operations = []
+        self.flush()
+        
+        log_files = [self.log_file]
+        if self.per_process_segments:
+            log_files += list_segments(self.log_file)
         
         try:
-            if not os.path.exists(self.log_file):
-                return operations
-            
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        op = json.loads(line)
-                        if tool_name is None or op.get('tool_name') == tool_name:
-                            operations.append(op)
-                            if len(operations) >= limit:
-                                break
+            for log_file in log_files:
+                if not os.path.exists(log_file):
+                    continue
+                
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            op = json.loads(line)
+                            if tool_name is None or op.get('tool_name') == tool_name:
+                                operations.append(op)
+                                if len(operations) >= limit:
+                                    return operations
         
         except Exception as e:
             self.logger.error(f"Failed to get operations: {e}")
@@ -160,7 +284,9 @@ class ToolOperationsSpecialist(TrackedAgent):
     def __init__(
         self,
         agent_id: str = "tool_ops_001",
-        max_retries: int = 3
+        max_retries: int = 3,
+        log_file: str = "tool_operations.jsonl",
+        per_process_logs: bool = False
     ):
         # 初始化追踪基类
         super().__init__(
@@ -172,7 +298,12 @@ class ToolOperationsSpecialist(TrackedAgent):
         )
         
         self.role = ToolOperationsRole()
-        self.logger = OperationLogger()
+        # per_process_logs: 多进程部署时每个进程写独立分段，之后用 merge_segments 合并
+        self.logger = OperationLogger(
+            log_file,
+            per_process_segments=per_process_logs,
+            response_projector=lambda tool, command, response: self.adapters.project_response(tool, command, response)
+        )
         self.max_retries = max_retries
         
         # 工具配置
@@ -185,8 +316,33 @@ class ToolOperationsSpecialist(TrackedAgent):
             "github": {
                 "base_url": "https://api.github.com",
                 "token": os.getenv("GITHUB_TOKEN", "")
+            },
+            "slack": {
+                "base_url": "https://slack.com/api",
+                "token": os.getenv("SLACK_BOT_TOKEN", "")
+            },
+            "jira": {
+                "base_url": os.getenv("JIRA_BASE_URL", ""),
+                "email": os.getenv("JIRA_EMAIL", ""),
+                "api_token": os.getenv("JIRA_API_TOKEN", "")
+            },
+            "database": {
+                "url": os.getenv("DATABASE_URL", "")
+            },
+            "api_endpoints": {
+                "base_url": os.getenv("API_ENDPOINTS_BASE_URL", ""),
+                "health_path": os.getenv("API_ENDPOINTS_HEALTH_PATH", "/health")
             }
         }
+        
+        # 工具适配器（首次使用时加载）
+        self.adapters = AdapterRegistry(self.tool_configs)
+        
+        # 工具健康检查（带 TTL 缓存，过期时返回旧值并后台刷新；health_monitor.start() 开启定期刷新）
+        self.health_monitor = ToolHealthMonitor(
+            probe=self._probe_tool_status,
+            tools=lambda: list(self.tool_configs)
+        )
     
     @track_agent_action("执行工具操作")
     def execute_operation(
@@ -195,12 +351,14 @@ class ToolOperationsSpecialist(TrackedAgent):
         operation_type: OperationType,
         command: str,
         parameters: Dict[str, Any],
+        queue_wait_ms: Optional[float] = None,
+        metadata: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> OperationRecord:
         """执行工具操作 - 自动追踪到 Langfuse"""
         
         # 生成操作 ID
-        operation_id = f"{tool_name}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        operation_id = new_operation_id(tool_name)
         
         # 创建操作记录
         record = OperationRecord(
@@ -209,7 +367,9 @@ class ToolOperationsSpecialist(TrackedAgent):
             operation_type=operation_type,
             command=command,
             parameters=parameters,
-            status=OperationStatus.PENDING
+            status=OperationStatus.PENDING,
+            queue_wait_ms=queue_wait_ms,
+            metadata=dict(metadata or {})
         )
         
         # 记录开始时间
@@ -219,15 +379,17 @@ class ToolOperationsSpecialist(TrackedAgent):
         retry_count = 0
         last_error = None
         
-        while retry_count <= self.max_retries:
+        # 只有幂等命令才允许重试
+        adapter = self.adapters.get(tool_name)
+        max_retries = self.max_retries if adapter.is_idempotent(command) else 0
+        
+        while retry_count <= max_retries:
             try:
-                # 执行具体操作
-                if tool_name == "langfuse":
-                    result = self._execute_langfuse_operation(command, parameters)
-                elif tool_name == "github":
-                    result = self._execute_github_operation(command, parameters)
-                else:
-                    result = self._execute_generic_operation(tool_name, command, parameters)
+                # 执行具体操作（收集出站请求的分阶段耗时）
+                with collect_http_timings() as http_timings:
+                    result = self._execute_tool_operation(tool_name, command, parameters)
+                if http_timings:
+                    record.metadata["http"] = [_timing_summary(t) for t in http_timings]
                 
                 # 记录成功
                 record.status = OperationStatus.SUCCESS
@@ -245,11 +407,13 @@ class ToolOperationsSpecialist(TrackedAgent):
                 last_error = str(e)
                 retry_count += 1
                 
-                if retry_count <= self.max_retries:
+                if retry_count <= max_retries:
                     record.status = OperationStatus.RETRYING
                 else:
                     record.status = OperationStatus.FAILED
                     record.error_message = last_error
+                    if http_timings:
+                        record.metadata["http"] = [_timing_summary(t) for t in http_timings]
                     record.end_time = datetime.now()
                     record.duration_ms = (record.end_time - record.start_time).total_seconds() * 1000
                     record.retry_count = retry_count - 1
@@ -259,85 +423,90 @@ class ToolOperationsSpecialist(TrackedAgent):
         
         return record
     
+    @track_agent_action("批量获取 GitHub 仓库")
+    def execute_github_repo_batch(
+        self,
+        repos: List[Dict[str, str]],
+        batch_size: Optional[int] = None
+    ) -> List[OperationRecord]:
+        """
+        批量获取 GitHub 仓库 - 自动追踪
+        
+        通过 GraphQL 别名查询合并请求，结果拆分为每个仓库一条 get_repo 操作记录。
+        
+        Args:
+            repos: [{"owner": ..., "repo": ...}, ...]
+            batch_size: 每个 GraphQL 查询合并的仓库数
+        """
+        start_time = datetime.now()
+        parameters: Dict[str, Any] = {"repos": repos}
+        if batch_size:
+            parameters["batch_size"] = batch_size
+        
+        try:
+            batch = self._execute_tool_operation("github", "get_repos", parameters)
+            items = batch["results"]
+            rate_limit = batch.get("rate_limit")
+        except Exception as e:
+            items = [{**repo, "transport": "graphql", "error": str(e)} for repo in repos]
+            rate_limit = None
+        end_time = datetime.now()
+        duration_ms = (end_time - start_time).total_seconds() * 1000
+        
+        records = []
+        for item in items:
+            # 每条记录用它所在分批（或 REST 退回请求）的耗时，而不是整个批量操作的耗时
+            item_duration_ms = item.get("duration_ms", duration_ms)
+            item_start = item.get("started_at", start_time)
+            record = OperationRecord(
+                operation_id=new_operation_id("github"),
+                tool_name="github",
+                operation_type=OperationType.QUERY,
+                command="get_repo",
+                parameters={"owner": item["owner"], "repo": item["repo"]},
+                status=OperationStatus.FAILED if "error" in item else OperationStatus.SUCCESS,
+                response_data=item.get("result"),
+                error_message=item.get("error"),
+                start_time=item_start,
+                end_time=item_start + timedelta(milliseconds=item_duration_ms) if "started_at" in item else end_time,
+                duration_ms=item_duration_ms,
+                metadata={
+                    "batch_size": len(repos),
+                    "transport": item["transport"],
+                    "rate_limit": rate_limit
+                }
+            )
+            self.logger.log_operation(record)
+            records.append(record)
+        
+        return records
+    
     @langfuse_track
+    def _execute_tool_operation(
+        self,
+        tool_name: str,
+        command: str,
+        parameters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """通过适配器执行工具操作"""
+        return self.adapters.get(tool_name).execute(command, parameters)
+    
     def _execute_langfuse_operation(
         self,
         command: str,
         parameters: Dict[str, Any]
     ) -> Dict[str, Any]:
         """执行 Langfuse 操作"""
-        config = self.tool_configs["langfuse"]
-        base_url = config["base_url"]
-        
-        if command == "get_traces":
-            # 获取追踪记录
-            response = requests.get(
-                f"{base_url}/api/public/traces",
-                headers={
-                    "Authorization": f"Bearer {config['public_key']}:{config['secret_key']}"
-                },
-                params=parameters
-            )
-            response.raise_for_status()
-            return response.json()
-        
-        elif command == "create_trace":
-            # 创建追踪
-            response = requests.post(
-                f"{base_url}/api/public/traces",
-                headers={
-                    "Authorization": f"Bearer {config['public_key']}:{config['secret_key']}"
-                },
-                json=parameters
-            )
-            response.raise_for_status()
-            return response.json()
-        
-        else:
-            raise ValueError(f"Unknown Langfuse command: {command}")
+        return self._execute_tool_operation("langfuse", command, parameters)
     
-    @langfuse_track
     def _execute_github_operation(
         self,
         command: str,
         parameters: Dict[str, Any]
     ) -> Dict[str, Any]:
         """执行 GitHub 操作"""
-        config = self.tool_configs["github"]
-        base_url = config["base_url"]
-        
-        headers = {
-            "Authorization": f"token {config['token']}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        if command == "get_repo":
-            # 获取仓库信息
-            owner = parameters.get("owner")
-            repo = parameters.get("repo")
-            response = requests.get(
-                f"{base_url}/repos/{owner}/{repo}",
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()
-        
-        elif command == "create_issue":
-            # 创建 Issue
-            owner = parameters.get("owner")
-            repo = parameters.get("repo")
-            response = requests.post(
-                f"{base_url}/repos/{owner}/{repo}/issues",
-                headers=headers,
-                json=parameters.get("data", {})
-            )
-            response.raise_for_status()
-            return response.json()
-        
-        else:
-            raise ValueError(f"Unknown GitHub command: {command}")
+        return self._execute_tool_operation("github", command, parameters)
     
-    @langfuse_track
     def _execute_generic_operation(
         self,
         tool_name: str,
@@ -345,13 +514,7 @@ class ToolOperationsSpecialist(TrackedAgent):
         parameters: Dict[str, Any]
     ) -> Dict[str, Any]:
         """执行通用工具操作"""
-        return {
-            "status": "executed",
-            "tool": tool_name,
-            "command": command,
-            "parameters": parameters,
-            "timestamp": datetime.now().isoformat()
-        }
+        return self._execute_tool_operation(tool_name, command, parameters)
     
     @track_agent_action("获取操作历史")
     def get_operation_history(
@@ -362,9 +525,35 @@ class ToolOperationsSpecialist(TrackedAgent):
         """获取操作历史 - 自动追踪"""
         return self.logger.get_operations(tool_name, limit)
     
+    @track_agent_action("获取操作统计")
+    def get_operation_stats(
+        self,
+        tool_name: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """获取操作统计（次数、错误率、耗时分位数、重试分布） - 自动追踪"""
+        return self.logger.get_stats(tool_name, command)
+    
+    def close(self):
+        """停止健康检查，落盘操作日志并注销指标回调"""
+        self.health_monitor.stop()
+        self.logger.close()
+    
     @track_agent_action("检查工具状态")
     def check_tool_status(self, tool_name: str) -> Dict[str, Any]:
-        """检查工具状态 - 自动追踪"""
+        """检查工具状态 - 自动追踪（优先读取健康缓存）"""
+        if not self.tool_configs.get(tool_name):
+            return self._probe_tool_status(tool_name)
+        
+        return self.health_monitor.get_status(tool_name)
+    
+    @track_agent_action("检查全部工具状态")
+    def check_all_tool_status(self) -> Dict[str, Dict[str, Any]]:
+        """并发检查所有已配置工具的状态 - 自动追踪"""
+        return self.health_monitor.get_all_statuses()
+    
+    def _probe_tool_status(self, tool_name: str) -> Dict[str, Any]:
+        """实际探测工具状态"""
         config = self.tool_configs.get(tool_name)
         
         if not config:
@@ -375,20 +564,7 @@ class ToolOperationsSpecialist(TrackedAgent):
             }
         
         try:
-            if tool_name == "langfuse":
-                response = requests.get(f"{config['base_url']}/api/public/health")
-                if response.status_code == 200:
-                    return {"tool": tool_name, "status": "healthy"}
-            
-            elif tool_name == "github":
-                response = requests.get(
-                    f"{config['base_url']}/user",
-                    headers={"Authorization": f"token {config['token']}"}
-                )
-                if response.status_code == 200:
-                    return {"tool": tool_name, "status": "healthy", "user": response.json()}
-            
-            return {"tool": tool_name, "status": "unknown"}
+            return self.adapters.get(tool_name).health_check()
         
         except Exception as e:
             return {
@@ -430,6 +606,10 @@ if __name__ == "__main__":
         status = agent.check_tool_status("langfuse")
         print(f"  状态: {status}")
         
+        print("\n   全部工具状态（并发探测）:")
+        for tool, tool_status in agent.check_all_tool_status().items():
+            print(f"  {tool}: {tool_status['status']} ({tool_status['latency_ms']:.1f}ms)")
+        
         # 执行 Langfuse 操作
         print("\n2️⃣ 获取 Langfuse 追踪记录:")
         record = agent.execute_operation(
@@ -0,0 +1,236 @@
+"""
+工具操作调度器
+位于 ToolOperationsSpecialist 之前：按优先级分类，同一优先级内按租户（agent_id）加权公平排队，
+队列有界，超限时立即返回 rejected 记录；每条记录带上排队等待时间
+
+使用方法:
+scheduler = OperationScheduler(agent, workers=8, tenant_weights={"dashboard": 4})
+future = scheduler.submit("github", OperationType.QUERY, "get_repo", {...},
+                          priority=Priority.INTERACTIVE, tenant="dashboard")
+record = future.result()
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from operation_ids import new_operation_id
+from tool_operations_specialist_tracked import (
+    OperationRecord,
+    OperationStatus,
+    OperationType,
+    ToolOperationsSpecialist,
+)
+
+
+# ============= 数据模型 =============
+class Priority(Enum):
+    """优先级（数值越小越先执行）"""
+    INTERACTIVE = 0     # 交互式请求，延迟敏感
+    DEFAULT = 1
+    BATCH = 2           # 批量任务 / 回填
+
+
+DEFAULT_QUEUE_LIMITS = {
+    Priority.INTERACTIVE: 200,
+    Priority.DEFAULT: 1000,
+    Priority.BATCH: 10000,
+}
+
+
+@dataclass(order=True)
+class _QueuedOperation:
+    finish_tag: float
+    sequence: int
+    tenant: str = field(compare=False)
+    priority: Priority = field(compare=False)
+    request: Dict[str, Any] = field(compare=False)
+    future: Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class _FairQueue:
+    """
+    单个优先级内的加权公平队列（WFQ）
+    
+    每个请求的完成标签 = max(虚拟时间, 该租户上一个标签) + 1 / 权重，
+    按标签出队，权重大的租户获得成比例更多的执行机会。
+    """
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.virtual_time = 0.0
+        self._heap: List[_QueuedOperation] = []
+        self._last_finish: Dict[str, float] = {}
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+    
+    def push(self, item: _QueuedOperation, weight: float) -> bool:
+        if len(self._heap) >= self.limit:
+            return False
+        start = max(self.virtual_time, self._last_finish.get(item.tenant, 0.0))
+        item.finish_tag = start + 1.0 / weight
+        self._last_finish[item.tenant] = item.finish_tag
+        heapq.heappush(self._heap, item)
+        return True
+    
+    def pop(self) -> _QueuedOperation:
+        item = heapq.heappop(self._heap)
+        self.virtual_time = item.finish_tag
+        if not self._heap:
+            # 队列清空后重置，避免空闲租户累积的旧标签影响下一轮
+            self._last_finish.clear()
+        return item
+
+
+# ============= 调度器 =============
+class OperationScheduler:
+    """优先级 + 加权公平排队 + 准入控制"""
+    
+    def __init__(
+        self,
+        agent: ToolOperationsSpecialist,
+        workers: int = 8,
+        queue_limits: Optional[Dict[Priority, int]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None
+    ):
+        self.agent = agent
+        self.tenant_weights = dict(tenant_weights or {})
+        limits = {**DEFAULT_QUEUE_LIMITS, **(queue_limits or {})}
+        self._queues = {priority: _FairQueue(limits[priority]) for priority in Priority}
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._rejected = {priority: 0 for priority in Priority}
+        self.logger = logging.getLogger(__name__)
+        self._workers = [
+            threading.Thread(target=self._run, name=f"tool-scheduler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def submit(
+        self,
+        tool_name: str,
+        operation_type: OperationType,
+        command: str,
+        parameters: Dict[str, Any],
+        priority: Priority = Priority.DEFAULT,
+        tenant: Optional[str] = None
+    ) -> "Future[OperationRecord]":
+        """提交操作；队列已满时返回已完成的 rejected 记录"""
+        tenant = tenant or self.agent.agent_id
+        future: Future = Future()
+        request = {
+            "tool_name": tool_name,
+            "operation_type": operation_type,
+            "command": command,
+            "parameters": parameters
+        }
+        item = _QueuedOperation(
+            finish_tag=0.0,
+            sequence=next(self._sequence),
+            tenant=tenant,
+            priority=priority,
+            request=request,
+            future=future,
+            enqueued_at=time.perf_counter()
+        )
+        
+        queue = self._queues[priority]
+        with self._cond:
+            accepted = not self._stopped and queue.push(item, self.tenant_weights.get(tenant, 1.0))
+            depth = len(queue)
+            if accepted:
+                self._cond.notify()
+            else:
+                self._rejected[priority] += 1
+        
+        if not accepted:
+            future.set_result(self._rejected_record(item, depth))
+        return future
+    
+    def execute(self, *args, **kwargs) -> OperationRecord:
+        """同步提交并等待结果"""
+        return self.submit(*args, **kwargs).result()
+    
+    def _rejected_record(self, item: _QueuedOperation, depth: int) -> OperationRecord:
+        request = item.request
+        limit = self._queues[item.priority].limit
+        reason = "调度器已停止" if self._stopped else f"调度队列已满: {item.priority.name.lower()} ({depth}/{limit})"
+        now = datetime.now()
+        record = OperationRecord(
+            operation_id=new_operation_id(request["tool_name"]),
+            tool_name=request["tool_name"],
+            operation_type=request["operation_type"],
+            command=request["command"],
+            parameters=request["parameters"],
+            status=OperationStatus.REJECTED,
+            error_message=reason,
+            start_time=now,
+            end_time=now,
+            duration_ms=0.0,
+            queue_wait_ms=0.0,
+            metadata={"priority": item.priority.name.lower(), "tenant": item.tenant}
+        )
+        self.agent.logger.log_operation(record)
+        return record
+    
+    def _next(self) -> Optional[_QueuedOperation]:
+        with self._cond:
+            while True:
+                for priority in Priority:
+                    queue = self._queues[priority]
+                    if queue:
+                        return queue.pop()
+                if self._stopped:
+                    return None
+                self._cond.wait()
+    
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            
+            queue_wait_ms = (time.perf_counter() - item.enqueued_at) * 1000
+            try:
+                record = self.agent.execute_operation(
+                    **item.request,
+                    queue_wait_ms=queue_wait_ms,
+                    metadata={"priority": item.priority.name.lower(), "tenant": item.tenant}
+                )
+                item.future.set_result(record)
+            except Exception as e:
+                self.logger.error(f"Scheduled operation failed: {e}")
+                item.future.set_exception(e)
+    
+    def queue_depths(self) -> Dict[str, int]:
+        """各优先级当前排队数"""
+        with self._cond:
+            return {priority.name.lower(): len(queue) for priority, queue in self._queues.items()}
+    
+    def rejected_counts(self) -> Dict[str, int]:
+        """各优先级累计拒绝数"""
+        with self._cond:
+            return {priority.name.lower(): count for priority, count in self._rejected.items()}
+    
+    def shutdown(self, wait: bool = True):
+        """停止接收新请求；已排队的请求执行完后工作线程退出"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
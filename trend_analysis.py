@@ -0,0 +1,338 @@
+"""
+指标趋势分析
+基于 MetricsStore 的历史数据：窗口线性回归斜率、EWMA 基线、去季节性变化量与 CUSUM 变点检测。
+所有计算对整段数据向量化；每个 (系统, 指标, 窗口) 保留增量状态，重复调用只处理新到达和移出窗口的点
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics_store import COLUMNS, MetricsStore
+from prometheus_query import parse_duration
+
+
+# analyze_trends 接受的指标别名
+METRIC_ALIASES = {
+    "response_time": "response_time_ms",
+    "latency": "response_time_ms",
+    "errors": "error_rate",
+    "cpu": "cpu_usage",
+    "memory": "memory_usage",
+}
+
+DEFAULT_SEASON_SECONDS = 86400
+DEFAULT_SEASON_BINS = 24
+DEFAULT_EWMA_HALF_LIFE_SECONDS = 3600.0
+DEFAULT_RECENT_SECONDS = 3600.0
+
+# 趋势判定：窗口内相对变化超过阈值且回归斜率显著
+TREND_CHANGE_THRESHOLD = 0.05
+TREND_T_STAT = 2.0
+
+# CUSUM 参数（以基线标准差为单位）
+CUSUM_DRIFT = 1.0
+CUSUM_THRESHOLD = 8.0
+CUSUM_WARMUP_POINTS = 60
+
+_MIN_POINTS = 3
+
+
+def resolve_metric(metric: str) -> str:
+    column = METRIC_ALIASES.get(metric, metric)
+    if column not in COLUMNS or column == "timestamp":
+        raise ValueError(f"Unknown metric: {metric}")
+    return column
+
+
+# ============= 向量化原语 =============
+def ewma_update(
+    mean: float,
+    mean_sq: float,
+    last_ts: Optional[float],
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    half_life: float
+) -> Tuple[float, float]:
+    """
+    用一批新点更新按时间衰减的 EWMA（均值与二阶矩）
+
+    时间间隔不均匀时第 k 个点的权重为 (1 - d_k) * exp(-(t_n - t_k) / tau)，
+    d_k = exp(-(t_k - t_{k-1}) / tau)；整批一次求和，无需逐点递推
+    """
+    tau = half_life / np.log(2)
+    end = timestamps[-1]
+    if last_ts is None:
+        # 第一个点直接作为初始值
+        mean, mean_sq, last_ts = float(values[0]), float(values[0]) ** 2, float(timestamps[0])
+        timestamps, values = timestamps[1:], values[1:]
+        if not len(values):
+            return mean, mean_sq
+
+    previous = np.concatenate(([last_ts], timestamps[:-1]))
+    decay = np.exp(-(timestamps - previous) / tau)
+    weights = (1.0 - decay) * np.exp(-(end - timestamps) / tau)
+    carry = np.exp(-(end - last_ts) / tau)
+    return (
+        carry * mean + float(weights @ values),
+        carry * mean_sq + float(weights @ (values * values))
+    )
+
+
+def cusum_scan(
+    z: np.ndarray,
+    pos: float,
+    neg: float,
+    drift: float = CUSUM_DRIFT
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    双侧 CUSUM 的向量化形式
+
+    S_n = max(0, S_{n-1} + x_n) 等价于 S_n = C_n - min(-S_0, min_{j<=n} C_j)，
+    C 为 x 的前缀和；返回每个点的上、下侧统计量
+    """
+    up = np.cumsum(z - drift)
+    down = np.cumsum(-z - drift)
+    up_stat = up - np.minimum(np.minimum.accumulate(up), -pos)
+    down_stat = down - np.minimum(np.minimum.accumulate(down), -neg)
+    return up_stat, down_stat
+
+
+# ============= 增量状态 =============
+@dataclass
+class TrendState:
+    """单个 (系统, 指标, 窗口) 的增量统计"""
+    window_seconds: float
+    origin: float
+    oldest: Optional[float] = None   # 窗口内最早的点
+    newest: Optional[float] = None   # 已处理的最新点
+    # 回归充分统计量 [n, Σt, Σy, Σt², Σty, Σy²]，t 相对 origin，单位小时
+    sums: np.ndarray = field(default_factory=lambda: np.zeros(6))
+    season_sums: np.ndarray = field(default_factory=lambda: np.zeros(DEFAULT_SEASON_BINS))
+    season_counts: np.ndarray = field(default_factory=lambda: np.zeros(DEFAULT_SEASON_BINS))
+    ewma_mean: float = 0.0
+    ewma_mean_sq: float = 0.0
+    ewma_ts: Optional[float] = None
+    cusum_pos: float = 0.0
+    cusum_neg: float = 0.0
+    reference: Optional[Tuple[float, float]] = None  # CUSUM 基线 (均值, 标准差)
+    warmup: List[float] = field(default_factory=list)  # 建立基线前收集的点
+    change_points: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class TrendAnalyzer:
+    """
+    趋势分析引擎
+
+    store 可以是 MetricsStore，也可以是 metrics_rollup.RollupTier（按汇总桶均值分析长时间范围）
+
+    使用方法:
+    analyzer = TrendAnalyzer(store)
+    result = analyzer.analyze("prometheus", "response_time", "7d")
+    """
+
+    def __init__(
+        self,
+        store: MetricsStore,
+        season_seconds: float = DEFAULT_SEASON_SECONDS,
+        season_bins: int = DEFAULT_SEASON_BINS,
+        ewma_half_life: float = DEFAULT_EWMA_HALF_LIFE_SECONDS,
+        recent_seconds: float = DEFAULT_RECENT_SECONDS
+    ):
+        self.store = store
+        self.season_seconds = season_seconds
+        self.season_bins = season_bins
+        self.ewma_half_life = ewma_half_life
+        self.recent_seconds = recent_seconds
+        self._states: Dict[Tuple[str, str, float], TrendState] = {}
+        self._lock = threading.Lock()
+
+    # ----- 增量更新 -----
+    def _season_bin(self, timestamps: np.ndarray) -> np.ndarray:
+        phase = np.mod(timestamps, self.season_seconds)
+        return (phase * self.season_bins // self.season_seconds).astype(np.int64)
+
+    def _accumulate(self, state: TrendState, timestamps: np.ndarray, values: np.ndarray, sign: float):
+        t = (timestamps - state.origin) / 3600.0
+        state.sums += sign * np.array([
+            len(t), t.sum(), values.sum(), t @ t, t @ values, values @ values
+        ])
+        bins = self._season_bin(timestamps)
+        state.season_sums += sign * np.bincount(bins, weights=values, minlength=self.season_bins)
+        state.season_counts += sign * np.bincount(bins, minlength=self.season_bins)
+
+    def _new_state(self, window_seconds: float, origin: float) -> TrendState:
+        return TrendState(
+            window_seconds=window_seconds,
+            origin=origin,
+            season_sums=np.zeros(self.season_bins),
+            season_counts=np.zeros(self.season_bins)
+        )
+
+    def _seasonal_adjustment(self, state: TrendState, timestamps: np.ndarray) -> np.ndarray:
+        """
+        每个点所在相位的季节性偏移（相位均值 - 总均值）
+
+        历史不足两个周期时季节轮廓不可靠（会把水平变化误当成季节性），不做调整；
+        没有历史的相位同样不做调整
+        """
+        if state.oldest is None or state.newest - state.oldest < 2 * self.season_seconds:
+            return np.zeros(len(timestamps))
+        counts = state.season_counts
+        profile = np.divide(state.season_sums, counts, out=np.zeros_like(counts), where=counts > 0)
+        overall = state.sums[2] / state.sums[0] if state.sums[0] else 0.0
+        bins = self._season_bin(timestamps)
+        return np.where(counts[bins] > 0, profile[bins] - overall, 0.0)
+    
+    def _detect_changes(self, state: TrendState, timestamps: np.ndarray, values: np.ndarray):
+        start = 0
+        while start < len(values):
+            if state.reference is None:
+                # 没有基线时先收集若干点建立基线（可能跨越多次更新）
+                needed = CUSUM_WARMUP_POINTS - len(state.warmup)
+                state.warmup.extend(values[start:start + needed].tolist())
+                start += needed
+                if len(state.warmup) < CUSUM_WARMUP_POINTS:
+                    return
+                warmup = np.asarray(state.warmup)
+                state.reference = (float(warmup.mean()), float(warmup.std()))
+                state.cusum_pos = state.cusum_neg = 0.0
+                state.warmup = []
+                continue
+
+            mean, std = state.reference
+            scale = std if std > 0 else max(abs(mean) * 0.01, 1e-9)
+            z = (values[start:] - mean) / scale
+            up, down = cusum_scan(z, state.cusum_pos, state.cusum_neg)
+            crossed = np.flatnonzero((up > CUSUM_THRESHOLD) | (down > CUSUM_THRESHOLD))
+            if not len(crossed):
+                state.cusum_pos, state.cusum_neg = float(up[-1]), float(down[-1])
+                return
+
+            hit = start + int(crossed[0])
+            state.change_points.append({
+                "timestamp": float(timestamps[hit]),
+                "direction": "increase" if up[crossed[0]] > CUSUM_THRESHOLD else "decrease",
+                "baseline": mean
+            })
+            # 变点之后重新建立基线
+            state.reference = None
+            start = hit + 1
+
+    def _update(self, system: str, column: str, window_seconds: float) -> Optional[TrendState]:
+        key = (system, column, window_seconds)
+        state = self._states.get(key)
+        since = None
+        if state is not None:
+            since = state.oldest if state.oldest is not None else state.newest
+        history = self.store.window(system, since=since)
+        if not len(history):
+            return state
+
+        timestamps = history.timestamps
+        values = history[column]
+        end = float(timestamps[-1])
+        window_start = end - window_seconds
+
+        # 窗口里最早的点已被环形缓冲区覆盖时，无法扣除它们的贡献，只能全量重算
+        if state is not None and state.oldest is not None and timestamps[0] != state.oldest:
+            state = None
+        in_window = int(np.searchsorted(timestamps, window_start, side="left"))
+        if state is None:
+            state = self._new_state(window_seconds, window_start)
+            fresh = slice(in_window, len(timestamps))
+            expired = slice(0, 0)
+        else:
+            unseen = int(np.searchsorted(timestamps, state.newest, side="right"))
+            fresh = slice(max(unseen, in_window), len(timestamps))
+            # 窗口已空时取到的点都已扣除过，不能再次扣除
+            expired = slice(0, min(unseen, in_window) if state.oldest is not None else 0)
+
+        valid = ~np.isnan(values)
+        expired_mask = valid[expired]
+        if expired_mask.any():
+            self._accumulate(state, timestamps[expired][expired_mask], values[expired][expired_mask], -1.0)
+
+        remaining = timestamps[in_window:]
+        state.oldest = float(remaining[0]) if len(remaining) else None
+        state.newest = end
+
+        new_ts, new_values = timestamps[fresh][valid[fresh]], values[fresh][valid[fresh]]
+        if len(new_values):
+            self._accumulate(state, new_ts, new_values, 1.0)
+            state.ewma_mean, state.ewma_mean_sq = ewma_update(
+                state.ewma_mean, state.ewma_mean_sq, state.ewma_ts, new_ts, new_values, self.ewma_half_life
+            )
+            state.ewma_ts = float(new_ts[-1])
+            # 在去季节性后的序列上检测变点，避免把日周期当成水平变化
+            self._detect_changes(state, new_ts, new_values - self._seasonal_adjustment(state, new_ts))
+
+        state.change_points = [cp for cp in state.change_points if cp["timestamp"] >= window_start]
+        self._states[key] = state
+        return state
+
+    # ----- 结果 -----
+    def _recent_deseasonalized(self, system: str, column: str, state: TrendState) -> Optional[float]:
+        """最近一段时间去季节性后的均值"""
+        recent = self.store.window(system, since=state.newest - self.recent_seconds)
+        values = recent[column]
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return None
+        return float(np.mean(values[valid] - self._seasonal_adjustment(state, recent.timestamps[valid])))
+
+    def analyze(self, system: str, metric: str, time_range: str = "7d") -> Dict[str, Any]:
+        column = resolve_metric(metric)
+        window_seconds = float(parse_duration(time_range))
+
+        with self._lock:
+            state = self._update(system, column, window_seconds)
+            if state is None or state.sums[0] < _MIN_POINTS:
+                return {
+                    "trend": "insufficient_data",
+                    "points": int(state.sums[0]) if state else 0,
+                    "change_percentage": 0.0
+                }
+
+            n, st, sy, stt, sty, syy = state.sums
+            mean = sy / n
+            t_var = stt - st * st / n
+            slope = (sty - st * sy / n) / t_var if t_var > 0 else 0.0  # 单位/小时
+            residual = max(syy - sy * sy / n - slope * (sty - st * sy / n), 0.0)
+            stderr = np.sqrt(residual / (n - 2) / t_var) if n > 2 and t_var > 0 else np.inf
+            t_stat = abs(slope) / stderr if stderr > 0 else np.inf
+
+            # 按实际覆盖的时间跨度折算变化量，历史不满窗口时不做外推
+            span_hours = (state.newest - state.oldest) / 3600.0
+            change = slope * span_hours / abs(mean) if mean else 0.0
+            if abs(change) >= TREND_CHANGE_THRESHOLD and t_stat >= TREND_T_STAT:
+                trend = "increasing" if slope > 0 else "decreasing"
+            else:
+                trend = "stable"
+
+            ewma_var = max(state.ewma_mean_sq - state.ewma_mean ** 2, 0.0)
+            recent = self._recent_deseasonalized(system, column, state)
+            seasonal_delta = (recent - mean) / abs(mean) if recent is not None and mean else None
+
+            return {
+                "trend": trend,
+                "points": int(n),
+                "change_percentage": round(float(change) * 100, 2),
+                "slope_per_hour": float(slope),
+                "t_stat": float(t_stat) if np.isfinite(t_stat) else None,
+                "mean": float(mean),
+                "ewma": float(state.ewma_mean),
+                "ewma_std": float(np.sqrt(ewma_var)),
+                "seasonal_delta_percentage": round(float(seasonal_delta) * 100, 2) if seasonal_delta is not None else None,
+                "change_points": list(state.change_points)
+            }
+
+    def reset(self, system: Optional[str] = None):
+        with self._lock:
+            if system is None:
+                self._states.clear()
+            else:
+                for key in [key for key in self._states if key[0] == system]:
+                    del self._states[key]